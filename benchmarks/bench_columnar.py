@@ -0,0 +1,121 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+# Compares the queries of earnapp.columnar.UsageFrame with the pure Python loops they replace, including the time
+# it takes to build the frame, and prints after how many queries the frame has paid for itself
+# Run with: python -m benchmarks.bench_columnar
+
+import argparse
+import json
+import math
+import time
+
+from earnapp import columnar
+from earnapp.models import toTimestamp
+from benchmarks.stubserver import makeUsage
+
+
+def loopPerDevice(usage) -> dict:
+    totals = {}
+    for step in usage["data"]:
+        for uuid, point in step["devices"].items():
+            totals[uuid] = totals.get(uuid, 0.0) + (point.get("earned") or 0.0)
+    return totals
+
+
+def loopPerTimestamp(usage) -> list:
+    totals = {}
+    for step in usage["data"]:
+        timestamp = toTimestamp(step["date"])
+        total = totals.get(timestamp, 0.0)
+        for point in step["devices"].values():
+            total += point.get("earned") or 0.0
+        totals[timestamp] = total
+    return sorted(totals.items())
+
+
+def loopRollup(usage, period: str) -> list:
+    totals = {}
+    for timestamp, total in loopPerTimestamp(usage):
+        start = columnar._periodStart(timestamp, period)
+        totals[start] = totals.get(start, 0.0) + total
+    return sorted(totals.items())
+
+
+def loopRolling(usage, window: int) -> list:
+    perTimestamp = loopPerTimestamp(usage)
+    values = [total for _, total in perTimestamp]
+    return [(perTimestamp[i][0], sum(values[i - window + 1:i + 1])) for i in range(window - 1, len(values))]
+
+
+# (name, loop over the usage response, the same query on a frame)
+queries = [
+    ("perDevice", loopPerDevice, lambda frame: frame.perDevice()),
+    ("rollup daily", lambda usage: loopRollup(usage, "daily"), lambda frame: frame.rollup("daily")),
+    ("rollup weekly", lambda usage: loopRollup(usage, "weekly"), lambda frame: frame.rollup("weekly")),
+    ("rollup monthly", lambda usage: loopRollup(usage, "monthly"), lambda frame: frame.rollup("monthly")),
+    ("rolling(7)", lambda usage: loopRolling(usage, 7), lambda frame: frame.rolling(7)),
+]
+
+
+def best(function, *args, repeat: int) -> float:
+    """
+    :return: the fastest of repeat runs in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare UsageFrame queries, including building the frame, with plain loops")
+    parser.add_argument("--devices", type=int, default=1000, help="devices in the usage response, default 1000")
+    parser.add_argument("--days", type=int, default=30, help="days in the usage response, default 30")
+    parser.add_argument("--repeat", type=int, default=10, help="runs of every measurement, the fastest is kept, default 10")
+    args = parser.parse_args()
+
+    usage = json.loads(json.dumps(makeUsage(args.devices, args.days)))
+    print("%d devices x %d days, fastest of %d runs" % (args.devices, args.days, args.repeat))
+
+    backends = [False, True] if columnar.numpy is not None else [False]
+    for useNumpy in backends:
+        name = "numpy" if useNumpy else "array"
+        build = best(columnar.UsageFrame.fromUsage, usage, useNumpy, repeat=args.repeat)
+        frame = columnar.UsageFrame.fromUsage(usage, useNumpy)
+        print("\n%s backend, building the frame: %.2f ms" % (name, build * 1000))
+        print("%-16s %10s %10s" % ("query", "loops", "frame"))
+        loopTotal = frameTotal = 0.0
+        for queryName, loop, onFrame in queries:
+            loopTime = best(loop, usage, repeat=args.repeat)
+            frameTime = best(onFrame, frame, repeat=args.repeat)
+            loopTotal += loopTime
+            frameTotal += frameTime
+            print("%-16s %8.2f ms %8.2f ms" % (queryName, loopTime * 1000, frameTime * 1000))
+
+        # the whole workflow: every query once, the frame pays for building itself
+        print("%-16s %8.2f ms %8.2f ms (including the build)" % (
+            "all of them", loopTotal * 1000, (build + frameTotal) * 1000
+        ))
+        saved = (loopTotal - frameTotal) / len(queries)  # per query, on average
+        if saved > 0:
+            print("break-even: the frame is faster from %d queries on the same response" % math.ceil(build / saved))
+        else:
+            print("break-even: never, the frame queries are not faster than the loops")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares p50/p99 latency of user.money() with and without hedging against a stub server
+# where 3% of requests take 300 ms longer than the rest
+# Run with: python -m benchmarks.bench_hedge
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from earnapp import earnapp
+from earnapp.hedge import HedgePolicy
+from benchmarks.stubserver import StubServer
+from benchmarks.bench_suite import percentile
+
+CALLS = 600
+THREADS = 8
+
+
+def measure(user) -> list:
+    def call(_):
+        start = time.perf_counter()
+        user.money()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        return sorted(pool.map(call, range(CALLS)))
+
+
+def main():
+    with StubServer(latency=0.01, jitter=0.005, tailLatency=0.3, tailFraction=0.03) as server:
+        for name, hedge in (("no hedging", None), ("hedged", HedgePolicy())):
+            user = earnapp.User(poolSize=THREADS * 2, hedge=hedge)
+            user.login("token")
+            before = server.requests
+            latencies = measure(user)
+            sent = server.requests - before
+            print("%-12s p50 %7.1f ms   p99 %7.1f ms   max %7.1f ms   requests sent %d" % (
+                name, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, latencies[-1] * 1000, sent
+            ))
+            if hedge is not None:
+                stats = hedge.stats()
+                print("%-12s hedged %d of %d, the second copy won %d times" % ("", stats["hedged"], stats["requests"], stats["hedgeWins"]))
+                hedge.close()
+            user.session.close()
+
+
+if __name__ == "__main__":
+    main()
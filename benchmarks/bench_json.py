@@ -0,0 +1,72 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares the time each installed JSON backend takes to decode devices() and usage() payloads
+# Run with: python -m benchmarks.bench_json [payload.json ...]
+# Recorded responses can be passed as files, generated payloads are used otherwise
+
+import argparse
+import time
+
+from earnapp import jsondecoder
+from benchmarks.bench_models import makeDevicesJSON, makeUsageJSON
+
+
+def timeIt(function, *args, repeat: int = 10) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def installedBackends() -> list:
+    names = []
+    for name in jsondecoder.backends:
+        try:
+            jsondecoder.setDecoder(name)
+        except ImportError:
+            continue
+        names.append(name)
+    jsondecoder.setDecoder()
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the time each installed JSON backend takes to decode API responses")
+    parser.add_argument("payloads", nargs="*", help="recorded JSON responses to decode, generated devices and usage payloads by default")
+    parser.add_argument("--repeat", type=int, default=10, help="times each payload is decoded per backend, default 10")
+    args = parser.parse_args()
+
+    if args.payloads:
+        payloads = []
+        for path in args.payloads:
+            with open(path, "rb") as f:
+                payloads.append((path, f.read()))
+    else:
+        payloads = [("devices", makeDevicesJSON().encode()), ("usage", makeUsageJSON().encode())]
+
+    backends = installedBackends()
+    print("default backend: " + jsondecoder.decoderName())
+    for name, payload in payloads:
+        print("%s (%.1f MB)" % (name, len(payload) / 1e6))
+        times = {}
+        for backend in backends:
+            jsondecoder.setDecoder(backend)
+            times[backend] = timeIt(jsondecoder.loads, payload, repeat=args.repeat)
+        for backend, elapsed in times.items():
+            print("  %-8s %8.2f ms  (%.1fx json)" % (backend, elapsed * 1000, times["json"] / elapsed))
+    jsondecoder.setDecoder()
+
+
+if __name__ == "__main__":
+    main()
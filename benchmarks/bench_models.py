@@ -0,0 +1,66 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares the memory used by decoded JSON dictionaries and the earnapp.models classes
+# Run with: python -m benchmarks.bench_models
+
+import json
+import tracemalloc
+
+from earnapp import models
+from benchmarks.stubserver import makeDevices, makeUsage
+
+DEVICES = 50000
+DAYS = 30
+USAGE_DEVICES = 1000
+
+
+def makeDevicesJSON() -> str:
+    return json.dumps(makeDevices(DEVICES))
+
+
+def makeUsageJSON() -> str:
+    return json.dumps(makeUsage(USAGE_DEVICES, DAYS))
+
+
+def measure(function, *args):
+    """
+    :return: tuple of the result and the bytes allocated to keep it alive
+    """
+    tracemalloc.start()
+    result = function(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def report(name: str, dictSize: int, modelSize: int):
+    print("%-12s dicts: %7.1f MB  models: %7.1f MB  (%.1fx smaller)" % (
+        name, dictSize / 1e6, modelSize / 1e6, dictSize / modelSize
+    ))
+
+
+def main():
+    devicesJSON = makeDevicesJSON()
+    _, dictSize = measure(json.loads, devicesJSON)
+    _, modelSize = measure(lambda text: list(models.iterDevices(json.loads(text))), devicesJSON)
+    report("devices", dictSize, modelSize)
+
+    usageJSON = makeUsageJSON()
+    _, dictSize = measure(json.loads, usageJSON)
+    _, modelSize = measure(lambda text: models.UsageSeries.fromUsage(json.loads(text)), usageJSON)
+    report("usage", dictSize, modelSize)
+
+
+if __name__ == "__main__":
+    main()
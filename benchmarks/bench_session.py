@@ -0,0 +1,50 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares per-call latency of a new connection per request against a pooled keep-alive session
+# Run with: python -m benchmarks.bench_session
+
+import time
+
+from earnapp import earnapp
+from benchmarks.stubserver import StubServer
+
+CALLS = 500
+
+
+def timeCalls(session) -> float:
+    """
+    Time CALLS requests to the money endpoint
+    :param session: the session to use, None opens a new connection for every call
+    :return: average seconds per call
+    """
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        earnapp._makeEarnAppRequest("money", "GET", {}, 10, {}, session=session)
+    return (time.perf_counter() - start) / CALLS
+
+
+def main():
+    with StubServer():
+        earnapp._makeEarnAppRequest("money", "GET", {}, 10, {})  # warm up
+
+        unpooled = timeCalls(None)
+        pooled = timeCalls(earnapp.createSession())
+
+    print("new connection per call: %.3f ms/call" % (unpooled * 1000))
+    print("pooled session:          %.3f ms/call" % (pooled * 1000))
+    print("speedup:                 %.2fx" % (unpooled / pooled))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Measures the cold start of a short script: importing earnapp, and logging in and calling money() for the first time
+# Every run is a new Python process, so nothing is cached in memory between runs
+# Run with: python -m benchmarks.bench_startup [--runs 20]
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.stubserver import StubServer
+
+# run in a new process with the stub server URL and the transport as arguments, prints the timings as JSON
+_script = """
+import sys, time, json
+start = time.perf_counter()
+import earnapp
+imported = time.perf_counter()
+user = earnapp.User(transport=sys.argv[2])
+from earnapp import earnapp as module
+module.apiURL = sys.argv[1] + "dashboard/api/"
+ready = time.perf_counter()
+user.login("token")
+user.money()
+done = time.perf_counter()
+print(json.dumps({
+    "import earnapp": imported - start,
+    "import User": ready - imported,
+    "first call": done - ready,
+    "total": done - start,
+    "requests loaded": "requests" in sys.modules,
+}))
+"""
+
+
+def measure(url: str, transport: str, runs: int) -> dict:
+    """
+    :return: the median of every timing over runs new processes
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _script, url, transport], capture_output=True, check=True, text=True
+        ).stdout
+        results.append(json.loads(output))
+    timings = {name: statistics.median(result[name] for result in results) for name in results[0] if name != "requests loaded"}
+    timings["requests loaded"] = results[0]["requests loaded"]
+    return timings
+
+
+def _timeProcess(command: list) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time and first call latency of earnapp in new processes")
+    parser.add_argument("--runs", type=int, default=20, help="processes to start per transport, default 20")
+    args = parser.parse_args()
+
+    empty = statistics.median(_timeProcess([sys.executable, "-c", "pass"]) for _ in range(args.runs))
+    print("python startup without earnapp: %.1f ms" % (empty * 1000))
+    print("%-10s %16s %14s %12s %10s %17s" % ("transport", "import earnapp", "import User", "first call", "total", "requests loaded"))
+    with StubServer(checkXSRF=True) as server:
+        for transport in ("requests", "stdlib"):
+            timings = measure(server.url, transport, args.runs)
+            print("%-10s %13.1f ms %11.1f ms %9.1f ms %7.1f ms %17s" % (
+                transport, timings["import earnapp"] * 1000, timings["import User"] * 1000,
+                timings["first call"] * 1000, timings["total"] * 1000, timings["requests loaded"]
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Measures throughput and p50/p99 latency of User and Client workloads against the local stub server
+# Run with: python -m benchmarks.bench_suite [--json results.json] [--compare baseline.json]
+# Save the results of one commit with --json and pass them to --compare on another to see the difference
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+
+from earnapp import earnapp
+from benchmarks.stubserver import StubServer
+
+
+def _refresh(user):
+    """A dashboard refresh, every endpoint one after another"""
+    user.userData()
+    user.money()
+    user.devices()
+    user.onlineStatus()
+    user.counters()
+    user.transactions()
+
+
+def _login(user):
+    """A cold start, a new user fetching an XSRF token and logging in"""
+    earnapp.User(session=user.session).login("token")
+
+
+# name -> (kind, function called with a logged in User or a Client)
+workloads = {
+    "user.money": ("user", lambda user: user.money()),
+    "user.devices": ("user", lambda user: user.devices()),
+    "user.usage": ("user", lambda user: user.usage("daily")),
+    "user.transactions": ("user", lambda user: user.transactions()),
+    "user.refresh": ("user", _refresh),
+    "user.snapshot": ("user", lambda user: user.snapshot().raiseForErrors()),
+    "user.login": ("user", _login),
+    "client.isLinked": ("client", lambda client: client.isLinked()),
+    "client.getBWStats": ("client", lambda client: client.getBWStats()),
+    "client.isIPBlocked": ("client", lambda client: client.isIPBlocked()),
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    """
+    :param values: sorted values
+    :param fraction: between 0 and 1, for example 0.99
+    :return: the nearest rank percentile
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def runWorkload(name: str, calls: int, threads: int) -> dict:
+    """
+    Call a workload calls times from threads threads, the stub server must be running
+    :return: a dictionary of the results
+    """
+    kind, function = workloads[name]
+    session = earnapp.createSession(poolSize=threads)
+    if kind == "user":
+        target = earnapp.User(session=session)
+        target.login("token")
+    else:
+        target = earnapp.Client("sdk-node-" + "0" * 32, "1.281.185", "x64", "node_earnapp.com", session=session)
+    function(target)  # warm up the connection pool
+
+    def call(_):
+        start = time.perf_counter()
+        try:
+            function(target)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(call, range(calls)))
+    elapsed = time.perf_counter() - start
+    session.close()
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "calls": calls,
+        "errors": sum(1 for _, error in results if error is not None),
+        "throughput": calls / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "mean": sum(latencies) / len(latencies),
+    }
+
+
+def _change(new: float, old: float) -> str:
+    if not old:
+        return ""
+    return "%+.1f%%" % ((new - old) / old * 100)
+
+
+def report(results: dict, baseline: dict = None):
+    """
+    Print a table of the results, with the change from baseline if given
+    """
+    print("%-20s %8s %7s %12s %10s %10s" % ("workload", "calls", "errors", "calls/s", "p50 ms", "p99 ms"))
+    for name, result in results.items():
+        print("%-20s %8d %7d %12.1f %10.3f %10.3f" % (
+            name, result["calls"], result["errors"], result["throughput"], result["p50"] * 1000, result["p99"] * 1000
+        ))
+        old = (baseline or {}).get(name)
+        if old is not None:
+            print("%-20s %8s %7s %12s %10s %10s" % (
+                "  vs baseline", "", "",
+                _change(result["throughput"], old["throughput"]), _change(result["p50"], old["p50"]), _change(result["p99"], old["p99"])
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark User and Client workloads against a local stub of the EarnApp API")
+    parser.add_argument("workloads", nargs="*", help="workloads to run, all by default: " + ", ".join(workloads))
+    parser.add_argument("--calls", type=int, default=500, help="calls per workload, default 500")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent callers, default 8")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the server waits before answering, default 0")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random server latency in seconds, default 0")
+    parser.add_argument("--devices", type=int, default=100, help="devices in devices/usage responses, default 100")
+    parser.add_argument("--transactions", type=int, default=20, help="transactions in the transactions response, default 20")
+    parser.add_argument("--usage-days", type=int, default=30, help="time steps in the usage response, default 30")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="results saved with --json to compare against")
+    args = parser.parse_args()
+
+    names = args.workloads or list(workloads)
+    for name in names:
+        if name not in workloads:
+            parser.error("unknown workload " + name)
+
+    settings = {
+        "calls": args.calls, "threads": args.threads, "latency": args.latency, "jitter": args.jitter,
+        "devices": args.devices, "transactions": args.transactions, "usageDays": args.usage_days,
+    }
+    results = {}
+    with StubServer(
+        latency=args.latency, jitter=args.jitter, devices=args.devices,
+        transactions=args.transactions, usageDays=args.usage_days, checkXSRF=True
+    ):
+        for name in names:
+            results[name] = runWorkload(name, args.calls, args.threads)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        if saved.get("settings") != settings:
+            print("warning: the baseline was run with different settings: " + json.dumps(saved.get("settings")))
+        baseline = saved.get("results")
+
+    report(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Shows the throttle learning the rate limit of a stub server that allows 20 requests per second
+# Run with: python -m benchmarks.bench_throttle
+
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from earnapp import earnapp
+from earnapp.throttle import Throttle
+from benchmarks.stubserver import StubServer
+
+CALLS = 200
+THREADS = 8
+
+
+def main():
+    with StubServer(rateLimit=20):
+        throttle = Throttle(rate=5, maxRate=50, increase=0.5)
+        user = earnapp.User(throttle=throttle, poolSize=THREADS)
+        user.login("token")
+
+        def call(_):
+            try:
+                user.money()
+                return True
+            except earnapp.RatelimitedException:
+                return False
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(THREADS) as pool:
+            results = list(pool.map(call, range(CALLS)))
+        elapsed = time.perf_counter() - start
+
+    stats = throttle.stats()
+    print("succeeded:          %d/%d" % (sum(results), CALLS))
+    print("throughput:         %.1f requests/s" % (CALLS / elapsed))
+    print("429 responses:      %d (%d retried)" % (stats["ratelimited"], stats["retries"]))
+    for (host, proxy), rate in stats["rates"].items():
+        print("learnt rate:        %.1f requests/s for %s" % (rate, host))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A local stub of the EarnApp API used by the benchmarks
+# It serves the /dashboard/api/ endpoints used by User and the client.earnapp.com endpoints used by Client
+
+from collections import OrderedDict
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import hashlib
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+
+from earnapp import earnapp
+
+_dashboardPrefix = "/dashboard/api/"
+
+
+def makeDevices(count: int) -> list:
+    """
+    :return: a devices response with count devices
+    """
+    return [
+        {
+            "uuid": "sdk-node-%032x" % i,
+            "appid": "node_earnapp.com",
+            "title": "device %d" % i,
+            "bw": 123456789 + i,
+            "total_bw": 987654321 + i,
+            "redeem_bw": 12345 + i,
+            "rate": 0.25,
+            "earned": 1.5 + i / 1000,
+            "earned_total": 12.75 + i / 1000,
+            "cn": "gb",
+            "ips": ["10.0.%d.%d" % (i // 256 % 256, i % 256)],
+        }
+        for i in range(count)
+    ]
+
+
+def makeTransactions(count: int) -> list:
+    """
+    :return: a transactions response with count transactions
+    """
+    return [
+        {
+            "uuid": "%032x" % i,
+            "status": "paid" if i else "pending_procedure",
+            "payment_method": "paypal.com",
+            "payment_date": "2022-06-%02dT12:00:00.000Z" % (i % 28 + 1),
+            "date": "2022-06-%02dT00:00:00.000Z" % (i % 28 + 1),
+            "money_amount": 5.0 + i,
+            "email": "user@example.com",
+            "ref_bonuses_amount": 0,
+            "promo_amount": 0,
+        }
+        for i in range(count)
+    ]
+
+
+def makeUsage(devices: int, days: int) -> dict:
+    """
+    :return: a usage response of devices devices over days days
+    """
+    return {"data": [
+        {
+            "date": "2022-%02d-%02dT00:00:00.000Z" % (day // 28 % 12 + 1, day % 28 + 1),
+            "devices": {"sdk-node-%032x" % i: {"bw": 1000000 + i, "earned": 0.01 + i / 1e6} for i in range(devices)},
+        }
+        for day in range(days)
+    ]}
+
+
+def _encode(data) -> tuple:
+    """
+    :return: tuple of the JSON body and its ETag
+    """
+    body = json.dumps(data).encode()
+    return body, '"' + hashlib.md5(body).hexdigest() + '"'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers requests like the EarnApp API.
+    /sec/rotate_xsrf sets a new xsrf-token cookie every time like the real API, GET endpoints send ETags.
+    """
+
+    protocol_version = "HTTP/1.1"  # allow keep-alive connections
+    disable_nagle_algorithm = True
+
+    def _send(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+
+        server = self.server
+        server.count()
+        delay = server.latency + random.uniform(0, server.jitter)
+        if server.tailFraction and random.random() < server.tailFraction:
+            delay += server.tailLatency
+        if delay:
+            time.sleep(delay)
+
+        if not server.allowRequest():
+            self._send(429, b"Too Many Requests", {"Retry-After": "1"})
+            return
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith(_dashboardPrefix):
+            status, body, etag, headers = server.dashboard(self.command, url.path[len(_dashboardPrefix):].lstrip("/"), self.headers)
+        else:
+            status, body, etag, headers = server.client(self.command, url.path.lstrip("/"), query)
+
+        if etag is not None:
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, b"", headers)
+                return
+        self._send(status, body, headers)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default of 5 drops connections under concurrent load
+
+    def __init__(
+        self,
+        address,
+        handler,
+        rateLimit: float = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        devices: int = 10,
+        transactions: int = 5,
+        usageDays: int = 30,
+        validTokens=None,
+        checkXSRF: bool = False,
+        tailLatency: float = 0.0,
+        tailFraction: float = 0.0
+    ):
+        super().__init__(address, handler)
+        self.rateLimit = rateLimit
+        self.latency = latency
+        self.jitter = jitter
+        self.tailLatency = tailLatency
+        self.tailFraction = tailFraction
+        self.validTokens = set(validTokens) if validTokens is not None else None
+        self.checkXSRF = checkXSRF
+        self.requests = 0
+        self._allowance = rateLimit or 0
+        self._lastCheck = time.monotonic()
+        self._rateLock = threading.Lock()
+        self._xsrfTokens = OrderedDict()  # tokens handed out by rotate_xsrf, oldest first
+        self._xsrfCounter = itertools.count()
+
+        deviceList = makeDevices(devices)
+        ok = _encode({"status": "ok"})
+        # GET responses are encoded once so the server is not the bottleneck
+        self._dashboardGET = {
+            "user_data": _encode({"email": "user@example.com", "name": "Stub User", "referral_code": "stub"}),
+            "money": _encode({
+                "multiplier": 1, "balance": 12.34, "earnings_total": 56.78, "redeem_details": None,
+                "ref_bonuses": 0, "ref_bonuses_total": 0, "promo_bonuses": 0, "promo_bonuses_total": 0, "referral_part": "10%",
+            }),
+            "devices": _encode(deviceList),
+            "device_statuses": _encode({"statuses": {device["uuid"]: {"online": i % 2 == 0} for i, device in enumerate(deviceList)}}),
+            "transactions": _encode(makeTransactions(transactions)),
+            "usage": _encode(makeUsage(devices, usageDays)),
+            "counters": _encode({"next_refresh": 3600, "next_withdraw": 86400}),
+            "downloads": _encode({"win": "1.281.185", "mac": "1.281.185", "node": "1.281.185"}),
+            "payment_methods": _encode([{"name": "paypal.com", "min_redeem": 5}]),
+        }
+        self._ok = ok
+        self._clientResponses = {
+            "is_linked": _encode({"email": "user@example.com"}),
+            "is_ip_blocked": _encode({"is_blocked": False}),
+            "get_bw_stats": _encode({"bw": 123456789, "earned": 1.23}),
+            "is_piggybox": _encode({"is_piggybox": False}),
+            "install_device": ok,
+            "app_config_win.json": _encode({"version": "1.281.185", "payment_methods": ["paypal.com"]}),
+            "app_config_node.json": _encode({"version": "1.281.185"}),
+            "app_config.json": _encode([]),
+        }
+
+    def handle_error(self, request, client_address):
+        # clients that time out or lose a hedged race hang up before the answer is written
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self):
+        with self._rateLock:
+            self.requests += 1
+
+    def allowRequest(self) -> bool:
+        """
+        Check the request against the server's rate limit, a token bucket of rateLimit requests per second
+        :return: False if the request should get a 429
+        """
+        if self.rateLimit is None:
+            return True
+        with self._rateLock:
+            now = time.monotonic()
+            self._allowance = min(self.rateLimit, self._allowance + (now - self._lastCheck) * self.rateLimit)
+            self._lastCheck = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+            return True
+
+    def _rotateXSRF(self) -> str:
+        token = "stubtoken%d" % next(self._xsrfCounter)
+        with self._rateLock:
+            self._xsrfTokens[token] = True
+            if len(self._xsrfTokens) > 100000:
+                self._xsrfTokens.popitem(last=False)
+        return token
+
+    def _authorised(self, headers) -> bool:
+        """
+        Check the oauth-refresh-token cookie and xsrf-token header of a dashboard request
+        """
+        if self.validTokens is None and not self.checkXSRF:
+            return True
+        cookie = SimpleCookie()
+        for value in headers.get_all("Cookie") or []:
+            cookie.load(value)
+        if self.validTokens is not None:
+            token = cookie.get("oauth-refresh-token")
+            if token is None or token.value not in self.validTokens:
+                return False
+        if self.checkXSRF and headers.get("xsrf-token") not in self._xsrfTokens:
+            return False
+        return True
+
+    def dashboard(self, method: str, endpoint: str, headers) -> tuple:
+        """
+        Answer a /dashboard/api/ request
+        :return: tuple of status, body, ETag and headers
+        """
+        if endpoint == "sec/rotate_xsrf":
+            body, _ = self._ok
+            return 200, body, None, {"Set-Cookie": "xsrf-token=" + self._rotateXSRF() + "; Path=/"}
+
+        if not self._authorised(headers):
+            return 403, b'{"error": "Forbidden"}', None, {"Content-Type": "application/json"}
+
+        if method == "GET":
+            body, etag = self._dashboardGET.get(endpoint, self._ok)
+            return 200, body, etag, {"Content-Type": "application/json"}
+
+        body, _ = self._ok  # link_device, hide_device, edit_device/<id>, ...
+        return 200, body, None, {"Content-Type": "application/json"}
+
+    def client(self, method: str, endpoint: str, query: dict) -> tuple:
+        """
+        Answer a client.earnapp.com request
+        :return: tuple of status, body, ETag and headers
+        """
+        if endpoint == "ndt7":
+            return 200, b"ndt7", None, {"Content-Type": "text/plain"}
+        if method == "GET" and "uuid" not in query:
+            return 400, b"Invalid arguments", None, {"Content-Type": "text/plain"}
+
+        body, etag = self._clientResponses.get(endpoint, self._ok)
+        return 200, body, etag if method == "GET" else None, {"Content-Type": "application/json"}
+
+
+class StubServer:
+    """
+    A stub EarnApp API server running in a background thread.
+    Use it as a context manager, it points the earnapp module at itself while running.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rateLimit: float = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        devices: int = 10,
+        transactions: int = 5,
+        usageDays: int = 30,
+        validTokens=None,
+        checkXSRF: bool = False,
+        tailLatency: float = 0.0,
+        tailFraction: float = 0.0
+    ):
+        """
+        Initialise the server
+        :param host (optional): the address to listen on
+        :param port (optional): the port to listen on, a free port is chosen by default
+        :param rateLimit (optional): requests per second to allow before answering 429, unlimited by default
+        :param latency (optional): seconds to wait before answering each request
+        :param jitter (optional): up to this many extra seconds are added to the latency at random
+        :param devices (optional): the number of devices in the devices, device_statuses and usage responses
+        :param transactions (optional): the number of transactions in the transactions response
+        :param usageDays (optional): the number of time steps in the usage response
+        :param validTokens (optional): oauth-refresh-tokens to accept, others get 403. Every token is accepted by default
+        :param checkXSRF (optional): answer 403 if the xsrf-token header was not handed out by rotate_xsrf
+        :param tailLatency (optional): extra seconds added to the latency of a tailFraction of requests
+        :param tailFraction (optional): the fraction of requests that are slow, for example 0.02, default 0
+        """
+        self.server = _StubHTTPServer(
+            (host, port), _StubHandler, rateLimit, latency, jitter, devices, transactions, usageDays, validTokens, checkXSRF,
+            tailLatency, tailFraction
+        )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._oldURLs = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server"""
+        host, port = self.server.server_address[:2]
+        return "http://" + host + ":" + str(port) + "/"
+
+    @property
+    def requests(self) -> int:
+        """The number of requests received, including ratelimited ones"""
+        return self.server.requests
+
+    def __enter__(self):
+        self.thread.start()
+        self._oldURLs = (earnapp.apiURL, earnapp.clientAPIURL)
+        earnapp.apiURL = self.url + "dashboard/api/"
+        earnapp.clientAPIURL = self.url
+        return self
+
+    def __exit__(self, *exc):
+        earnapp.apiURL, earnapp.clientAPIURL = self._oldURLs
+        self.server.shutdown()
+        self.server.server_close()
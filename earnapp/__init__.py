@@ -0,0 +1,66 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# The public API, imported from its module the first time it is used (PEP 562),
+# so "import earnapp" is instant and scripts only load the parts they use
+
+import importlib
+
+# name -> the module it is defined in
+_exports = {
+    "User": "earnapp.earnapp",
+    "Client": "earnapp.earnapp",
+    "createSession": "earnapp.earnapp",
+    "getXSRFToken": "earnapp.earnapp",
+    "RatelimitedException": "earnapp.earnapp",
+    "IncorrectTokenException": "earnapp.earnapp",
+    "JSONDecodeErrorException": "earnapp.earnapp",
+    "XSRFErrorException": "earnapp.earnapp",
+    "InvalidTimeframeException": "earnapp.earnapp",
+    "InvalidArgumentsException": "earnapp.earnapp",
+    "DeadlineExceededException": "earnapp.earnapp",
+    "LoginFailedException": "earnapp.earnapp",
+    "AsyncUser": "earnapp.asyncearnapp",
+    "AsyncClient": "earnapp.asyncearnapp",
+    "Fleet": "earnapp.fleet",
+    "ClientFleet": "earnapp.fleet",
+    "Throttle": "earnapp.throttle",
+    "ResponseCache": "earnapp.cache",
+    "XSRFTokenCache": "earnapp.xsrf",
+    "HedgePolicy": "earnapp.hedge",
+    "ProxyPool": "earnapp.proxypool",
+    "Cassette": "earnapp.cassette",
+    "FileSessionStore": "earnapp.sessionstore",
+    "StdlibSession": "earnapp.stdlibsession",
+    "Snapshot": "earnapp.snapshot",
+    "BulkReport": "earnapp.bulk",
+    "ChangePoller": "earnapp.poller",
+    "HistoryStore": "earnapp.store",
+    "UsageFrame": "earnapp.columnar",
+    "Metrics": "earnapp.metrics",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name: str):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError("module 'earnapp' has no attribute " + repr(name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value  # later lookups do not call this function again
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
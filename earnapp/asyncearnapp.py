@@ -0,0 +1,660 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import time
+from http.cookies import SimpleCookie
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp is an optional dependency
+    aiohttp = None
+
+from earnapp import earnapp
+from earnapp import jsondecoder
+from earnapp import models
+from earnapp.snapshot import Snapshot, defaultEndpoints, checkEndpoints, endpointFunction
+from earnapp.earnapp import (
+    RatelimitedException,
+    IncorrectTokenException,
+    JSONDecodeErrorException,
+    XSRFErrorException,
+    InvalidTimeframeException,
+    InvalidArgumentsException,
+    LoginFailedException,
+)
+
+
+def createSession(poolSize: int = 100, keepAlive: bool = True) -> "aiohttp.ClientSession":
+    """
+    Create a pooled aiohttp session that can be shared between AsyncUser and AsyncClient objects.
+    Must be called from inside a running event loop.
+    Cookies set by the server are not stored in the session, so it is safe to share between accounts.
+    :param poolSize (optional): the maximum number of connections kept open per host, default 100
+    :param keepAlive (optional): whether to keep connections open between requests, default True
+    :return: session object
+    """
+    if aiohttp is None:
+        raise ImportError("aiohttp is required for the async API, install it with: pip install earnapp[async]")
+
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=poolSize, force_close=not keepAlive)
+    return aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+
+
+def _proxyURL(proxy: dict):
+    """
+    Convert a requests style proxy dictionary to the single proxy URL aiohttp expects.
+    :param proxy: a dictionary containing the proxy to use
+    :return: the proxy URL or None
+    """
+    if not proxy:
+        return None
+    return proxy.get("https") or proxy.get("http")
+
+
+async def _request(
+    session: "aiohttp.ClientSession",
+    method: str,
+    url: str,
+    timeout: int,
+    proxy: dict = None,
+    **kwargs
+):
+    """
+    Send a request and read the whole response.
+    :param session: the aiohttp session to send the request with
+    :param method: GET, POST, DELETE or PUT
+    :param url: the URL to request
+    :param timeout: the amount of time to wait for a response
+    :param proxy (optional): a dictionary containing the proxy to use
+    :return: tuple of status code, headers and response text
+    """
+    async with session.request(
+        method,
+        url,
+        proxy=_proxyURL(proxy),
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        **kwargs
+    ) as resp:
+        text = await resp.text()
+        return resp.status, resp.headers, text
+
+
+async def getXSRFToken(session: "aiohttp.ClientSession", timeout: int, proxy: dict = None) -> str:
+    """
+    A function to retrieve the XSRF token from the EarnApp API.
+    This token is required for some endpoints to work.
+    :param session: the aiohttp session to send the request with
+    :param timeout: the amount of time to wait for a response from the server
+    :param proxy (optional): a dictionary containing the proxy to use
+    """
+    headers = {
+        "Host": "earnapp.com",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "en-GB,en;q=0.5",
+        "Upgrade-Insecure-Requests": "1",
+        "Sec-Fetch-Dest": "document",
+        "Sec-Fetch-Mode": "navigate",
+        "Sec-Fetch-Site": "none",
+        "Sec-Fetch-User": "?1",
+        "Pragma": "no-cache",
+        "Cache-Control": "no-cache",
+    }
+
+    status, respHeaders, _ = await _request(
+        session,
+        "GET",
+        earnapp.apiURL + "/sec/rotate_xsrf?appid=" + earnapp.appID + "&version=1.281.185",
+        timeout,
+        proxy=proxy,
+        headers=headers
+    )
+
+    if status == 429:  # if the user is ratelimited
+        raise RatelimitedException("You are being ratelimited")
+
+    cookie = SimpleCookie()
+    for setCookie in respHeaders.getall("Set-Cookie", []):
+        cookie.load(setCookie)
+
+    if "xsrf-token" not in cookie:
+        raise XSRFErrorException("Could not get XSRF token")
+
+    return cookie["xsrf-token"].value
+
+
+def _getClientReturnData(endpoint: str, text: str) -> dict:
+    """
+    Get the JSON data from a client API response.
+    This function may also raise an exception if an error is encountered.
+    :param endpoint: the endpoint that was requested
+    :param text: the response text
+    """
+    if endpoint == "ndt7":
+        return text
+
+    if text == "Too Many Requests":
+        raise RatelimitedException(text)
+
+    if text == "Invalid arguments":
+        raise InvalidArgumentsException("Invalid arguments")
+
+    try:
+        return jsondecoder.loads(text)
+    except ValueError:
+        raise JSONDecodeErrorException("Failed to decode JSON data: " + text)
+
+
+def _checkStatus(status: int):
+    """
+    Raise an exception if the response status shows the request failed.
+    :param status: the response status code
+    """
+    if status == 429:  # if the user is ratelimited
+        raise RatelimitedException("You are being ratelimited")
+    if status == 403:  # if the user is unauthorized
+        raise IncorrectTokenException("Token is not correct")
+
+
+def _getReturnData(status: int, text: str) -> dict:
+    """
+    Get the JSON data from a dashboard API response.
+    This function may also raise an exception if an error is encountered.
+    :param status: the response status code
+    :param text: the response text
+    """
+    _checkStatus(status)
+
+    try:
+        return jsondecoder.loads(text)
+    except ValueError:
+        raise JSONDecodeErrorException("Failed to decode JSON data: " + text)
+
+
+class _AsyncSessionOwner:
+    """
+    Shared session handling for AsyncUser and AsyncClient.
+    A session passed in by the caller is never closed by the object.
+    """
+
+    def _initSession(self, session, poolSize: int, keepAlive: bool):
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for the async API, install it with: pip install earnapp[async]")
+        self._session = session
+        self._ownsSession = session is None
+        self._poolSize = poolSize
+        self._keepAlive = keepAlive
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        """The aiohttp session, created on first use so it belongs to the running event loop"""
+        if self._session is None:
+            self._session = createSession(self._poolSize, self._keepAlive)
+        return self._session
+
+    async def close(self):
+        """
+        Close the session if it was created by this object
+        """
+        if self._ownsSession and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class AsyncClient(_AsyncSessionOwner):
+    """
+    An asyncio version of Client.
+    Every method is a coroutine with the same name, arguments and exceptions as on Client.
+    """
+
+    def __init__(
+        self,
+        uuid: str,
+        version: str,
+        arch: str,
+        appid: str,
+        proxy: dict = None,
+        timeout: int = 10,
+        session: "aiohttp.ClientSession" = None,
+        poolSize: int = 100,
+        keepAlive: bool = True
+    ):
+        """
+        Initialise the client
+        :param uuid: the uuid of the client
+        :param version: the version of the client
+        :param arch: the architecture of the client
+        :param appid: the appid of the client
+        :param proxy: the proxy to use, only http(s) proxies are supported by aiohttp
+        :param timeout: the amount of time to wait for a response from the server
+        :param session (optional): a session from createSession to share with other clients/users
+        :param poolSize (optional): connection pool size of the client's own session, ignored if session is given
+        :param keepAlive (optional): whether the client's own session keeps connections open, ignored if session is given
+        """
+        self._initSession(session, poolSize, keepAlive)
+        self.uuid = uuid
+        self.version = version
+        self.arch = arch
+        self.appid = appid
+        if proxy is None:
+            proxy = {}
+        self.proxy = proxy
+        self.timeout = timeout
+
+    def setProxy(self, proxy: dict) -> bool:
+        """
+        Set the proxy for the requests
+        :param proxy: proxy dictionary
+        :return: True
+        """
+        self.proxy = proxy
+        return True
+
+    async def simpleClientRequest(self, endpoint: str, method: str) -> dict:
+        """
+        A function to call a given endpoint. It handles return data, no XSRF for client.
+        :param endpoint: the endpoint to call
+        :param method: the method to use (GET, POST, DELETE or PUT)
+        """
+        identity = {"uuid": self.uuid, "version": self.version, "arch": self.arch, "appid": self.appid}
+
+        if method == "GET":
+            kwargs = {"params": identity}
+        else:
+            kwargs = {"json": identity}
+
+        _, _, text = await _request(
+            self.session,
+            method,
+            earnapp.clientAPIURL + endpoint,
+            self.timeout,
+            proxy=self.proxy,
+            **kwargs
+        )
+
+        return _getClientReturnData(endpoint, text)
+
+    async def appConfigWin(self):
+        """
+        Get many details about the device, see Client.appConfigWin
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("app_config_win.json", "POST")
+
+    async def appConfigNode(self):
+        """
+        Think this returns the latest Linux version, not 100% sure.
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("app_config_node.json", "GET")
+
+    async def appConfig(self):
+        """
+        No idea what this is, it just seems to return an empty array in my tests.
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("app_config.json", "GET")
+
+    async def isPiggybox(self):
+        """
+        Checks if the device is a piggybox.
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("is_piggybox", "GET")
+
+    async def ndt7(self):
+        """
+        Not sure, think it's a speedtest or something for piggybox.
+        :return: String that is just 'OK' in my tests
+        """
+        return await self.simpleClientRequest("ndt7", "POST")
+
+    async def installDevice(self):
+        """
+        Register the device with the server.
+        :return: JSON data showing success or fail
+        """
+        return await self.simpleClientRequest("install_device", "POST")
+
+    async def getBWStats(self):
+        """
+        Shows total bandwidth and total earnt.
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("get_bw_stats", "GET")
+
+    async def isLinked(self):
+        """
+        Shows the email address of the account the device is linked to.
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("is_linked", "GET")
+
+    async def isIPBlocked(self):
+        """
+        Checks if the IP used for the request is blocked.
+        :return: JSON data
+        """
+        return await self.simpleClientRequest("is_ip_blocked", "GET")
+
+
+class AsyncUser(_AsyncSessionOwner):
+    """
+    An asyncio version of User.
+    Every method is a coroutine with the same name, arguments and exceptions as on User.
+    """
+
+    def __init__(
+        self,
+        proxy: dict = None,
+        timeout: int = 10,
+        session: "aiohttp.ClientSession" = None,
+        poolSize: int = 100,
+        keepAlive: bool = True
+    ):
+        """
+        Initialise the user
+        :param proxy (optional): the proxy to use, only http(s) proxies are supported by aiohttp
+        :param timeout (optional): the amount of time to wait for a response from the server
+        :param session (optional): a session from createSession to share with other users/clients
+        :param poolSize (optional): connection pool size of the user's own session, ignored if session is given
+        :param keepAlive (optional): whether the user's own session keeps connections open, ignored if session is given
+        """
+        self._initSession(session, poolSize, keepAlive)
+        self.cookies = {}
+        self.headers = {}
+        if proxy is None:
+            proxy = {}
+        self.proxy = proxy
+        self.timeout = timeout
+        self.xsrfToken = ""
+        self.xsrfTokenTime = 0
+        self._xsrfLock = None  # created on first use in each event loop, a lock cannot be shared between loops
+        self._xsrfLockLoop = None
+
+    def setProxy(self, proxy: dict) -> bool:
+        """
+        Set the proxy for the requests
+        :param proxy: proxy dictionary
+        :return: True
+        """
+        self.proxy = proxy
+        return True
+
+    async def _updateXSRFTokenIfNecessary(self) -> str:
+        """
+        Will update the XSRF token if it is older than 60 seconds.
+        Concurrent callers wait for a single refresh.
+        :return: the XSRF token
+        """
+        loop = asyncio.get_running_loop()
+        if self._xsrfLockLoop is not loop:
+            self._xsrfLock = asyncio.Lock()
+            self._xsrfLockLoop = loop
+        async with self._xsrfLock:
+            currentTime = int(time.time())
+            if currentTime - 60 < self.xsrfTokenTime:  # 60 second token expiration
+                return self.xsrfToken
+
+            xsrfToken = await getXSRFToken(self.session, self.timeout, proxy=self.proxy)
+            self.xsrfTokenTime = currentTime
+            self.xsrfToken = xsrfToken
+            self.cookies["xsrf-token"] = xsrfToken
+            self.headers["xsrf-token"] = xsrfToken
+
+            return self.xsrfToken
+
+    async def _makeEarnAppRequest(
+        self,
+        endpoint: str,
+        method: str,
+        cookies: dict,
+        data: dict = None,
+        queryParams: str = ""
+    ):
+        """
+        Make a request to the EarnApp API to a given endpoint
+        :return: tuple of status code, headers and response text
+        """
+        url = earnapp.apiURL + endpoint + "?appid=" + earnapp.appID + queryParams
+        return await _request(
+            self.session,
+            method,
+            url,
+            self.timeout,
+            proxy=self.proxy,
+            cookies=cookies,
+            headers=self.headers,
+            json=data
+        )
+
+    async def simpleEarnAppRequest(
+        self,
+        endpoint: str,
+        method: str,
+        data: dict = None,
+        queryParams: str = ""
+    ) -> dict:
+        """
+        A function to call a given endpoint. It handles XSRF and return data.
+        :param endpoint: the endpoint to call
+        :param method: the method to use (GET, POST, DELETE or PUT)
+        :param data (optional): JSON data to send
+        :param queryParams (optional): URL query parameters to send
+        """
+        await self._updateXSRFTokenIfNecessary()
+        status, _, text = await self._makeEarnAppRequest(
+            endpoint,
+            method,
+            self.cookies,
+            data=data,
+            queryParams=queryParams
+        )
+
+        return _getReturnData(status, text)
+
+    async def login(self, token: str, method: str = "google") -> bool:
+        """
+        Attempt to log in to the account by requesting /user_data
+        :param token: oauth-refresh-token from the EarnApp dashboard
+        :param method (optional): login method, only current option is google.
+        :return: True on successful login
+        """
+        await self._updateXSRFTokenIfNecessary()
+        cookies = {
+            "auth-method": method,
+            "oauth-refresh-token": token,
+            "xsrf-token": self.xsrfToken
+        }
+        status, _, _ = await self._makeEarnAppRequest("user_data", "GET", cookies)
+
+        if status == 200:
+            self.cookies = cookies
+            return True
+
+        _checkStatus(status)  # 429 and 403
+        raise LoginFailedException("Error when logging in, the server answered " + str(status))
+
+    async def userData(self) -> dict:
+        """
+        Get data about the logged in user
+        :return: a dictionary containing the user data
+        """
+        return await self.simpleEarnAppRequest("user_data", "GET")
+
+    async def money(self, parse: bool = False) -> dict:
+        """
+        Get info such as current balance, payment method, etc.
+        :param parse (optional): return an earnapp.models.MoneyInfo instead of a dictionary
+        :return: a dictionary containing the user's money data
+        """
+        money = await self.simpleEarnAppRequest("money", "GET")
+        if parse:
+            return models.MoneyInfo.fromJSON(money)
+        return money
+
+    async def devices(self, parse: bool = False) -> dict:
+        """
+        Get info such as device IDs, rate, amount earnt, etc.
+        :param parse (optional): return a list of earnapp.models.Device instead of dictionaries
+        :return: a dictionary containing the user's device data
+        """
+        devices = await self.simpleEarnAppRequest("devices", "GET")
+        if parse:
+            return list(models.iterDevices(devices))
+        return devices
+
+    async def appVersions(self) -> dict:
+        """
+        Get the latest app version
+        :return: a dictionary containing the latest version
+        """
+        return await self.simpleEarnAppRequest("downloads", "GET")
+
+    async def paymentMethods(self) -> dict:
+        """
+        Get all available payment methods
+        :return: a dictionary containing all available payment methods
+        """
+        return await self.simpleEarnAppRequest("payment_methods", "GET")
+
+    async def transactions(self, parse: bool = False) -> dict:
+        """
+        Get past transactions and their status
+        :param parse (optional): return a list of earnapp.models.Transaction instead of dictionaries
+        :return: a dictionary containing past transactions
+        """
+        transactions = await self.simpleEarnAppRequest("transactions", "GET")
+        if parse:
+            return list(models.iterTransactions(transactions))
+        return transactions
+
+    async def linkDevice(self, deviceID: str) -> dict:
+        """
+        Link a device to the logged in EarnApp account
+        :param deviceID: EarnApp device ID to link to account
+        :return: a dictionary containing error message/success
+        """
+        return await self.simpleEarnAppRequest("link_device", "POST", data={"uuid": deviceID})
+
+    async def hideDevice(self, deviceID: str) -> dict:
+        """
+        Hide a device from the logged in EarnApp account
+        :param deviceID: EarnApp device ID to hide from account
+        :return: a dictionary containing error message/success
+        """
+        return await self.simpleEarnAppRequest("hide_device", "PUT", data={"uuid": deviceID})
+
+    async def showDevice(self, deviceID: str) -> dict:
+        """
+        Show a device on the logged in EarnApp account
+        :param deviceID: EarnApp device ID to show on account
+        :return: a dictionary containing error message/success
+        """
+        return await self.simpleEarnAppRequest("show_device", "PUT", data={"uuid": deviceID})
+
+    async def deleteDevice(self, deviceID: str) -> dict:
+        """
+        Delete a device from the logged in EarnApp account
+        :param deviceID: EarnApp device ID to delete from account
+        :return: a dictionary containing error message/success
+        """
+        return await self.simpleEarnAppRequest("device/" + deviceID, "DELETE")
+
+    async def renameDevice(self, deviceID: str, name: str) -> dict:
+        """
+        Rename a device
+        :param deviceID: EarnApp device ID to rename
+        :param name: new name for the device
+        :return: a dictionary containing error message/success
+        """
+        return await self.simpleEarnAppRequest("edit_device/" + deviceID, "PUT", data={"name": name})
+
+    async def redeemDetails(self, toEmail: str, paymentMethod: str = "paypal.com") -> dict:
+        """
+        Change the redeem details of the logged in account
+        :param toEmail: The email address to send payment to
+        :param paymentMethod: optional payment method to send via
+        :return: a dictionary containing error message/success
+        """
+        return await self.simpleEarnAppRequest(
+            "redeem_details",
+            "POST",
+            data={
+                "to_email": toEmail,
+                "payment_method": paymentMethod
+            }
+        )
+
+    async def onlineStatus(self) -> dict:
+        """
+        Get the online status of device
+        :return: a dictionary containing any online devices
+        """
+        return await self.simpleEarnAppRequest("device_statuses", "GET")
+
+    async def counters(self) -> dict:
+        """
+        Get some info about next refresh/withdraw
+        :return: a dictionary containing some sort of info about next refresh/withdraw
+        """
+        return await self.simpleEarnAppRequest("counters", "GET")
+
+    async def usage(self, step: str = "daily", parse: bool = False) -> dict:
+        """
+        Get the usage of all devices on the logged in account, including deleted devices
+        :param step: the timeframe of usage (daily, weekly, monthly), default daily
+        :param parse (optional): return a list of earnapp.models.UsageSeries, one per device, instead of a dictionary
+        :return: a dictionary containing the usage
+        """
+        if step not in ["daily", "weekly", "monthly"]:
+            raise InvalidTimeframeException
+
+        usage = await self.simpleEarnAppRequest("usage", "GET", queryParams="&step=" + step)
+        if parse:
+            return models.UsageSeries.fromUsage(usage)
+        return usage
+
+    async def snapshot(self, endpoints=defaultEndpoints, parse: bool = False) -> Snapshot:
+        """
+        Fetch several endpoints at the same time, see User.snapshot
+        :param endpoints (optional): names of the functions to call, a dashboard refresh by default
+        :param parse (optional): return earnapp.models objects for the endpoints that can, like their parse argument
+        :return: an earnapp.snapshot.Snapshot with the data of every endpoint, and the exception of every endpoint that failed
+        """
+        endpoints = checkEndpoints(endpoints)
+        start = time.monotonic()
+        try:
+            await self._updateXSRFTokenIfNecessary()
+        except Exception as e:  # every endpoint needs the token
+            return Snapshot({}, {endpoint: e for endpoint in endpoints}, time.monotonic() - start)
+
+        results = await asyncio.gather(
+            *(endpointFunction(self, endpoint, parse)() for endpoint in endpoints),
+            return_exceptions=True
+        )
+        data = {}
+        errors = {}
+        for endpoint, result in zip(endpoints, results):
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result  # a cancelled request cancels the snapshot, it is not an endpoint error
+            if isinstance(result, Exception):
+                errors[endpoint] = result
+            else:
+                data[endpoint] = result
+        return Snapshot(data, errors, time.monotonic() - start)
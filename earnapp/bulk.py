@@ -0,0 +1,141 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import random
+import sys
+import time
+
+from earnapp.earnapp import RatelimitedException
+
+BulkResult = namedtuple("BulkResult", ["item", "data", "error", "attempts"])
+BulkResult.__doc__ = """
+The result of one item of a bulk operation.
+item is the device id (or (device id, name) pair for renames), data is the response, or None if it failed,
+in which case error holds the last exception. attempts is the number of times the request was sent.
+"""
+
+# exceptions that are worth retrying, the built in ones are raised by the stdlib transport and by deadlines
+transientExceptions = (RatelimitedException, ConnectionError, TimeoutError)
+
+
+def _transientExceptions() -> tuple:
+    """
+    :return: transientExceptions, with the requests connection and timeout errors if requests has been imported.
+    requests is not imported here, with the stdlib transport it never is and its exceptions cannot be raised.
+    """
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return transientExceptions
+    return transientExceptions + (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+
+def _neverSent(error: Exception) -> bool:
+    """
+    Check if an error means the request never reached EarnApp, so even a request that changes something can be
+    sent again without doing it twice: a 429, a refused connection, or a failure to connect through the proxy
+    :param error: the exception the request raised
+    """
+    if isinstance(error, (RatelimitedException, ConnectionRefusedError)):
+        return True
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return False
+    if isinstance(error, (requests.exceptions.ConnectTimeout, requests.exceptions.ProxyError)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        from urllib3.exceptions import NewConnectionError  # loaded by requests already
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class BulkReport:
+    """
+    The results of a bulk operation, in the same order as the items given.
+    """
+
+    def __init__(self, results: list):
+        self.results = results
+
+    @property
+    def succeeded(self) -> list:
+        """The results of the items that succeeded"""
+        return [result for result in self.results if result.error is None]
+
+    @property
+    def failed(self) -> list:
+        """The results of the items that failed"""
+        return [result for result in self.results if result.error is not None]
+
+    @property
+    def ok(self) -> bool:
+        """Whether every item succeeded"""
+        return all(result.error is None for result in self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return "BulkReport(succeeded=" + str(len(self.succeeded)) + ", failed=" + str(len(self.failed)) + ")"
+
+
+def _callWithRetries(function, item, retries: int, backoff: float, idempotent: bool = True) -> BulkResult:
+    """
+    Call function for one item, retrying transient errors with exponential backoff and jitter
+    :param function: the function to call with the item's arguments
+    :param item: the argument, or a tuple of arguments
+    :param retries: the number of times to retry
+    :param backoff: seconds to wait before the first retry
+    :param idempotent (optional): whether sending the request twice does no harm. If not, only errors that mean the
+    request never reached EarnApp are retried, not timeouts, because a request that timed out may have succeeded
+    :return: the item's result
+    """
+    args = item if isinstance(item, tuple) else (item,)
+    transient = _transientExceptions()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return BulkResult(item, function(*args), None, attempt)
+        except transient as e:
+            if attempt > retries or not (idempotent or _neverSent(e)):
+                return BulkResult(item, None, e, attempt)
+            delay = backoff * 2 ** (attempt - 1)
+            time.sleep(random.uniform(delay / 2, delay))
+        except Exception as e:
+            return BulkResult(item, None, e, attempt)
+
+
+def runBulk(function, items, maxWorkers: int = 8, retries: int = 3, backoff: float = 1.0, idempotent: bool = True) -> BulkReport:
+    """
+    Call function for every item in parallel, without stopping at the first error
+    :param function: the function to call, for example user.hideDevice
+    :param items: an iterable of arguments, tuples are passed as multiple arguments
+    :param maxWorkers (optional): the maximum number of requests in flight, default 8
+    :param retries (optional): how many times to retry ratelimited and connection errors, default 3
+    :param backoff (optional): seconds to wait before the first retry, doubled for each retry, default 1
+    :param idempotent (optional): whether calling function twice for an item does no harm, default True.
+    If False, timeouts are not retried, only 429s and errors connecting
+    :return: a BulkReport
+    """
+    items = list(items)
+    if not items:
+        return BulkReport([])
+
+    with ThreadPoolExecutor(max_workers=min(maxWorkers, len(items))) as pool:
+        results = list(pool.map(lambda item: _callWithRetries(function, item, retries, backoff, idempotent), items))
+    return BulkReport(results)
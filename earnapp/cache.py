@@ -0,0 +1,150 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+# seconds to cache each read-only endpoint for
+defaultTTLs = {
+    "downloads": 3600,  # User.appVersions
+    "payment_methods": 3600,  # User.paymentMethods
+    "counters": 60,  # User.counters
+    "app_config_node.json": 3600,  # Client.appConfigNode
+    "app_config.json": 3600,  # Client.appConfig
+}
+
+# endpoints that return the same data for every account/device, so their cache entries are shared
+defaultSharedEndpoints = frozenset(["downloads", "payment_methods", "app_config_node.json", "app_config.json"])
+
+
+class _Entry:
+    """A cached response"""
+
+    __slots__ = ("data", "etag", "expires")
+
+    def __init__(self, data, etag: str, expires: float):
+        self.data = data
+        self.etag = etag
+        self.expires = expires
+
+    def fresh(self) -> bool:
+        """
+        :return: whether the entry can be used without asking the server
+        """
+        return time.monotonic() < self.expires
+
+
+class ResponseCache:
+    """
+    A size limited cache of decoded responses from read-only endpoints, which can be shared between many User and Client objects.
+    Each endpoint has its own time to live, and the least recently used entries are evicted when the cache is full.
+    Expired entries with an ETag are revalidated with If-None-Match, and reused if the server answers 304.
+    Cached data is shared between callers, so it should not be modified.
+    """
+
+    def __init__(self, maxSize: int = 1024, ttls: dict = None, sharedEndpoints=None):
+        """
+        Initialise the cache
+        :param maxSize (optional): the maximum number of responses to keep
+        :param ttls (optional): a dictionary of endpoint to seconds, only these endpoints are cached, defaults to defaultTTLs
+        :param sharedEndpoints (optional): endpoints whose responses are the same for every account, defaults to defaultSharedEndpoints
+        """
+        self.maxSize = maxSize
+        self.ttls = dict(defaultTTLs if ttls is None else ttls)
+        self.sharedEndpoints = frozenset(defaultSharedEndpoints if sharedEndpoints is None else sharedEndpoints)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def key(self, endpoint: str, queryParams: str = "", scope: str = None):
+        """
+        Get the cache key of a request
+        :param endpoint: the endpoint requested
+        :param queryParams (optional): the query parameters of the request
+        :param scope (optional): the account or device the request is for, ignored for shared endpoints
+        :return: a hashable key, or None if the endpoint is not cached
+        """
+        if endpoint not in self.ttls:
+            return None
+        if endpoint in self.sharedEndpoints:
+            scope = None
+        return (endpoint, queryParams, scope)
+
+    def get(self, key):
+        """
+        Look up a cached response, fresh or expired
+        :param key: a key from key()
+        :return: the cache entry, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.fresh():
+                self.misses += 1
+            else:
+                self.hits += 1
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, etag: str = None):
+        """
+        Store a response
+        :param key: a key from key()
+        :param data: the decoded response
+        :param etag (optional): the ETag header of the response
+        """
+        entry = _Entry(data, etag, time.monotonic() + self.ttls[key[0]])
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, key, entry: _Entry):
+        """
+        Mark an expired entry as fresh again after the server answered 304 Not Modified
+        :param key: a key from key()
+        :param entry: the entry that was revalidated
+        :return: the cached data
+        """
+        self.put(key, entry.data, entry.etag)
+        with self._lock:
+            self.revalidated += 1
+        return entry.data
+
+    def clear(self):
+        """
+        Remove every cached response
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters
+        :return: a dictionary of hits, misses, revalidations, evictions and size
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
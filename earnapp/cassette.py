@@ -0,0 +1,239 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Recording API responses to a cassette file and replaying them without touching the network
+# A Cassette is used in place of a session: User(session=Cassette("devices.json.gz"))
+
+import gzip
+import json
+import os
+import re
+import threading
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from earnapp.earnapp import createSession
+
+RECORD = "record"
+REPLAY = "replay"
+AUTO = "auto"
+
+# response headers kept in the cassette, the rest are not needed to replay a response
+recordedHeaders = ("Content-Type", "ETag", "Set-Cookie", "Retry-After")
+
+# the value every cookie in a recorded Set-Cookie header is replaced with, so no token is saved
+scrubbedCookieValue = "scrubbed"
+
+# a cookie name and value at the start of a Set-Cookie header, or after the comma joining two of them
+_cookieValue = re.compile(r"(^|,\s*)([^=;,\s]+)=[^;,]*")
+
+
+class ReplayMissException(Exception):
+    """Raised when replaying a request that is not in the cassette."""
+
+
+def requestKey(method: str, url: str) -> tuple:
+    """
+    Get the key requests are matched by, the method, the path and the query parameters in any order
+    :param method: GET, POST, DELETE or PUT
+    :param url: the URL requested
+    :return: a hashable key
+    """
+    parts = urlsplit(url)
+    path = "/" + "/".join(part for part in parts.path.split("/") if part)
+    return method.upper(), path, tuple(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+
+def scrubCookies(setCookie: str) -> str:
+    """
+    Replace the value of every cookie in a Set-Cookie header, keeping the names and attributes
+    :param setCookie: the header, several cookies may be joined with ", "
+    :return: the header with every value replaced by scrubbedCookieValue
+    """
+    return _cookieValue.sub(lambda match: match.group(1) + match.group(2) + "=" + scrubbedCookieValue, setCookie)
+
+
+def _buildResponse(method: str, url: str, entry: dict, data=None) -> requests.Response:
+    """
+    Make a requests.Response from a recorded response
+    :param method: the method requested
+    :param url: the URL requested
+    :param entry: the recorded response
+    :param data (optional): the JSON data sent with the request
+    :return: the response, with its body already read
+    """
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.headers = CaseInsensitiveDict(entry["headers"])
+    resp._content = entry["body"]
+    resp._content_consumed = True  # iter_content reads the body from memory
+    resp.encoding = "utf-8"
+    resp.url = url
+    resp.request = requests.Request(method, url, json=data).prepare()
+    return resp
+
+
+class Cassette:
+    """
+    Records responses to a file and replays them, used as the session of User, Client, XSRFTokenCache or Fleet.
+    Requests are matched by method, endpoint and query parameters, through a dictionary so replay is O(1).
+    Repeated requests get the recorded responses in the order they were recorded, starting again from the first
+    when they run out, so a replayed load test can make any number of calls.
+    Cookies and request bodies are never saved, only responses, and the values of cookies the server sets are scrubbed.
+
+    Modes:
+    record - send every request to the network and record the responses
+    replay - answer every request from the cassette, raising ReplayMissException for unknown requests
+    auto - answer from the cassette when the request was recorded, otherwise send and record it.
+    Only 2xx and 304 responses are recorded, so a 429 or server error is not replayed from then on
+    """
+
+    def __init__(self, path: str, mode: str = AUTO, session: requests.Session = None):
+        """
+        Open a cassette
+        :param path: the cassette file, compressed with gzip if the name ends in .gz
+        :param mode (optional): record, replay or auto, default auto
+        :param session (optional): the session used to send requests that are not replayed, from createSession by default
+        """
+        if mode not in (RECORD, REPLAY, AUTO):
+            raise ValueError("mode must be one of record, replay or auto")
+        self.path = path
+        self.mode = mode
+        self._session = session
+        self._lock = threading.Lock()
+        self._entries = {}  # request key -> list of recorded responses
+        self._positions = {}  # request key -> index of the next response to replay
+        self._changed = False
+        self.hits = 0
+        self.misses = 0
+
+        if mode != RECORD and os.path.exists(path):
+            self.load()
+
+    @property
+    def session(self) -> requests.Session:
+        """The session requests are sent with when they are not replayed"""
+        if self._session is None:
+            self._session = createSession()
+        return self._session
+
+    def _open(self, path: str, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(path, mode + "t", encoding="utf-8")
+        return open(path, mode, encoding="utf-8")
+
+    def load(self):
+        """
+        Read the cassette file, replacing any responses in memory
+        """
+        with self._open(self.path, "r") as f:
+            data = json.load(f)
+
+        entries = {}
+        for interaction in data["interactions"]:
+            key = (interaction["method"], interaction["path"], tuple(tuple(item) for item in interaction["query"]))
+            response = dict(interaction["response"])
+            response["body"] = response["body"].encode("utf-8")  # encoded once, not on every replay
+            entries.setdefault(key, []).append(response)
+
+        with self._lock:
+            self._entries = entries
+            self._positions = {}
+            self._changed = False
+
+    def save(self):
+        """
+        Write the recorded responses to the cassette file
+        """
+        with self._lock:
+            interactions = [
+                {"method": method, "path": path, "query": list(query), "response": dict(response, body=response["body"].decode("utf-8", "replace"))}
+                for (method, path, query), responses in self._entries.items()
+                for response in responses
+            ]
+            self._changed = False
+
+        temporary = self.path + ".tmp"
+        with self._open(temporary, "w") as f:
+            json.dump({"version": 1, "interactions": interactions}, f, separators=(",", ":"))
+        os.replace(temporary, self.path)
+
+    def __len__(self):
+        return sum(len(responses) for responses in self._entries.values())
+
+    def _replay(self, key: tuple):
+        """
+        :return: the next recorded response for a request key, or None if it was not recorded
+        """
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = (position + 1) % len(responses)
+            return responses[position]
+
+    def _record(self, key: tuple, resp: requests.Response):
+        if self.mode == AUTO and not (200 <= resp.status_code < 300 or resp.status_code == 304):
+            return
+        headers = {name: resp.headers[name] for name in recordedHeaders if name in resp.headers}
+        if "Set-Cookie" in headers:
+            headers["Set-Cookie"] = scrubCookies(headers["Set-Cookie"])
+        entry = {"status": resp.status_code, "headers": headers, "body": resp.content}
+        with self._lock:
+            if self.mode == RECORD or key not in self._entries:
+                self._entries.setdefault(key, []).append(entry)
+                self._changed = True
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Answer a request from the cassette or send it, taking the same arguments as requests.Session.request
+        :return: the response
+        """
+        key = requestKey(method, url)
+        if self.mode != RECORD:
+            entry = self._replay(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return _buildResponse(method, url, entry, kwargs.get("json"))
+            if self.mode == REPLAY:
+                with self._lock:
+                    self.misses += 1
+                raise ReplayMissException("No recorded response for " + method + " " + key[1])
+
+        with self._lock:
+            self.misses += 1
+        resp = self.session.request(method, url, **kwargs)
+        self._record(key, resp)
+        return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        """
+        Save any newly recorded responses and close the session
+        """
+        if self._changed:
+            self.save()
+        if self._session is not None:
+            self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,324 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# The earnapp command line tool
+# earnapp export accounts.txt -o accounts.jsonl exports every account in parallel, writing each one as soon as it finishes
+
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+
+from earnapp import earnapp
+from earnapp import models
+from earnapp.fleet import FleetAccount, _dispatch
+from earnapp.metrics import Metrics
+from earnapp.sessionstore import FileSessionStore, accountKey
+from earnapp.snapshot import checkEndpoints
+
+defaultExportEndpoints = ("money", "devices", "usage", "transactions")
+
+csvColumns = (
+    "line", "account", "ok", "elapsed", "balance", "earnings_total", "devices", "transactions",
+    "usage_bw", "usage_earned", "errors"
+)
+
+
+def readAccounts(lines):
+    """
+    Read an accounts file, one account per line: the oauth-refresh-token, optionally followed by a proxy URL.
+    Blank lines and lines starting with # are skipped.
+    :param lines: an iterable of lines
+    :return: a generator of (line number, token, proxy dictionary) tuples
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        if len(parts) > 2:
+            raise ValueError("Line " + str(number) + " of the accounts file should be a token and an optional proxy")
+        proxy = {"http": parts[1], "https": parts[1]} if len(parts) == 2 else {}
+        yield number, parts[0], proxy
+
+
+def _errorText(error: Exception) -> str:
+    return type(error).__name__ + (": " + str(error) if str(error) else "")
+
+
+def _record(account, line: int, snapshot, error: Exception, elapsed: float) -> dict:
+    """
+    :return: the output record of one account
+    """
+    record = {"line": line, "account": accountKey(account.token), "ok": error is None and snapshot.ok, "elapsed": round(elapsed, 3)}
+    if snapshot is not None:
+        record.update(snapshot.data)
+    errors = {"login": _errorText(error)} if error is not None else {}
+    if snapshot is not None:
+        errors.update((endpoint, _errorText(e)) for endpoint, e in snapshot.errors.items())
+    if errors:
+        record["errors"] = errors
+    return record
+
+
+def _csvRow(record: dict) -> dict:
+    """
+    :return: the CSV row of an output record, a summary of the account
+    """
+    row = {
+        "line": record["line"], "account": record["account"], "ok": record["ok"], "elapsed": record["elapsed"],
+        "errors": "; ".join(endpoint + ": " + text for endpoint, text in record.get("errors", {}).items()),
+    }
+    if "money" in record:
+        money = models.MoneyInfo.fromJSON(record["money"])
+        row["balance"] = money.balance
+        row["earnings_total"] = money.earningsTotal
+    if "devices" in record:
+        row["devices"] = len(record["devices"])
+    if "transactions" in record:
+        row["transactions"] = len(record["transactions"])
+    if "usage" in record:
+        usageBW = 0
+        usageEarned = 0.0
+        for _, _, bw, earned in models.iterUsagePoints(record["usage"]):
+            usageBW += bw
+            usageEarned += earned
+        row["usage_bw"] = usageBW
+        row["usage_earned"] = round(usageEarned, 6)
+    return row
+
+
+class _JSONLWriter:
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, record: dict):
+        self.output.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+        self.output.flush()
+
+
+class _CSVWriter:
+    def __init__(self, output):
+        self.output = output
+        self.writer = csv.DictWriter(output, csvColumns)
+        self.writer.writeheader()
+
+    def write(self, record: dict):
+        self.writer.writerow(_csvRow(record))
+        self.output.flush()
+
+
+class _Reservoir:
+    """A uniform random sample of at most size values, so percentiles of any number of values take fixed memory"""
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self.values = []
+        self.count = 0
+        self.max = None
+
+    def add(self, value: float):
+        self.count += 1
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.values) < self.size:
+            self.values.append(value)
+            return
+        index = random.randrange(self.count)
+        if index < self.size:
+            self.values[index] = value
+
+
+class _Progress:
+    """Prints a progress line to stderr at most a few times a second, and the stats at the end"""
+
+    def __init__(self, total: int, quiet: bool):
+        """
+        :param total: the number of accounts, None if not known in advance
+        :param quiet: whether to print nothing
+        """
+        self.total = total
+        self.quiet = quiet
+        self.done = 0
+        self.failed = 0
+        self.elapsed = _Reservoir()  # seconds per account
+        self.start = time.monotonic()
+        self._lastPrint = 0.0
+
+    def update(self, ok: bool, elapsed: float):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        self.elapsed.add(elapsed)
+        now = time.monotonic()
+        if self.quiet or (now - self._lastPrint < 0.2 and self.done != self.total):
+            return
+        self._lastPrint = now
+        rate = self.done / max(now - self.start, 1e-9)
+        if self.total is None:
+            sys.stderr.write("\r%d accounts, %d failed, %.1f accounts/s " % (self.done, self.failed, rate))
+        else:
+            remaining = (self.total - self.done) / rate if rate else 0.0
+            sys.stderr.write("\r%d/%d accounts, %d failed, %.1f accounts/s, %.0fs left " % (
+                self.done, self.total, self.failed, rate, remaining
+            ))
+        sys.stderr.flush()
+
+    def finish(self, metrics: Metrics):
+        if self.quiet:
+            return
+        total = time.monotonic() - self.start
+        elapsed = sorted(self.elapsed.values)
+        stats = metrics.stats()
+        if self.done:
+            sys.stderr.write("\n")
+        sys.stderr.write("exported %d accounts (%d failed) in %.2fs, %.1f accounts/s\n" % (
+            self.done, self.failed, total, self.done / max(total, 1e-9)
+        ))
+        if elapsed:
+            sys.stderr.write("per account: p50 %.0f ms, p95 %.0f ms, max %.0f ms\n" % (
+                _percentile(elapsed, 0.5) * 1000, _percentile(elapsed, 0.95) * 1000, self.elapsed.max * 1000
+            ))
+        sys.stderr.write("requests: %d, ratelimited: %d, errors: %d, received: %.1f MB\n" % (
+            stats["requests"], stats["ratelimited"], stats["errors"], stats["bytesReceived"] / 1e6
+        ))
+
+
+def _percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def export(args) -> int:
+    """
+    Export every account in the accounts file.
+    Accounts are read from the file as there is room for them, so memory use does not grow with the number of accounts.
+    :return: the exit code, 1 if any account failed
+    """
+    endpoints = checkEndpoints(args.endpoints.split(","))
+    if args.accounts == "-":
+        accountsFile = sys.stdin
+        total = None
+    else:
+        accountsFile = open(args.accounts, encoding="utf-8")
+        try:
+            total = sum(1 for _ in readAccounts(accountsFile))  # also checks every line before anything is sent
+            accountsFile.seek(0)
+        except BaseException:
+            accountsFile.close()
+            raise
+
+    store = FileSessionStore(args.session_dir) if args.session_dir else None
+    session = earnapp.createSession(poolSize=args.concurrency * len(endpoints), transport=args.transport)
+
+    def jobs():
+        for line, token, proxy in readAccounts(accountsFile):
+            account = FleetAccount(token, proxy, None)  # the User is created when the account is started
+            account.line = line
+            yield account, "export"
+
+    def call(account, _):
+        user = account.user = earnapp.User(proxy=account.proxy, timeout=args.timeout, session=session, deadline=args.deadline)
+        if store is not None and user.restoreSession(store, accountKey(account.token), account.token):
+            account.loggedIn = account.restored = True
+        if not account.loggedIn:
+            user.login(account.token)
+            account.loggedIn = True
+        snapshot = user.snapshot(endpoints)
+        if account.restored and snapshot.errors and all(
+            isinstance(error, earnapp.IncorrectTokenException) for error in snapshot.errors.values()
+        ):
+            # the saved session has expired, log in again once with a new XSRF token
+            user.xsrfTokenTime = 0
+            user.login(account.token)
+            snapshot = user.snapshot(endpoints)
+        account.restored = False
+        if store is not None:
+            user.saveSession(store, accountKey(account.token))
+        return snapshot
+
+    output = sys.stdout if args.output in (None, "-") else open(args.output, "w", encoding="utf-8", newline="")
+    fileFormat = args.format or ("csv" if (args.output or "").endswith(".csv") else "jsonl")
+    writer = _CSVWriter(output) if fileFormat == "csv" else _JSONLWriter(output)
+    progress = _Progress(total, args.quiet)
+    metrics = Metrics().install()
+    try:
+        for account, _, snapshot, error, elapsed in _dispatch(jobs(), call, args.concurrency, args.per_proxy):
+            record = _record(account, account.line, snapshot, error, elapsed)
+            writer.write(record)
+            progress.update(record["ok"], elapsed)
+    finally:
+        metrics.uninstall()
+        if output is not sys.stdout:
+            output.close()
+        if accountsFile is not sys.stdin:
+            accountsFile.close()
+        session.close()
+    progress.finish(metrics)
+    return 0 if progress.failed == 0 else 1
+
+
+def buildParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="earnapp", description="Command line tools for the EarnApp API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    exportParser = commands.add_parser(
+        "export",
+        help="export many accounts in parallel to JSON lines or CSV",
+        description="Fetch every account in the accounts file in parallel, writing each one as soon as it finishes. "
+        "The accounts file has one oauth-refresh-token per line, optionally followed by a proxy URL. "
+        "Exits with 1 if any account failed."
+    )
+    exportParser.add_argument("accounts", help="the accounts file, or - to read it from stdin")
+    exportParser.add_argument("-o", "--output", help="the file to write to, stdout by default")
+    exportParser.add_argument(
+        "-f", "--format", choices=("jsonl", "csv"),
+        help="jsonl writes all the data of an account per line, csv a summary. Taken from the output name by default, otherwise jsonl"
+    )
+    exportParser.add_argument(
+        "-e", "--endpoints", default=",".join(defaultExportEndpoints),
+        help="comma separated endpoints to fetch, default " + ",".join(defaultExportEndpoints)
+    )
+    exportParser.add_argument("-c", "--concurrency", type=int, default=16, help="accounts fetched at the same time, default 16")
+    exportParser.add_argument("--per-proxy", type=int, default=4, help="accounts fetched at the same time through one proxy, default 4")
+    exportParser.add_argument("--timeout", type=float, default=10, help="seconds to wait for a response, default 10")
+    exportParser.add_argument("--deadline", type=float, help="seconds every request may take in total, including downloading it")
+    exportParser.add_argument(
+        "--transport", choices=("requests", "stdlib"), default="stdlib",
+        help="the HTTP library to use, default stdlib which starts faster. requests is needed for SOCKS proxies"
+    )
+    exportParser.add_argument("--session-dir", help="a directory to save logins in, so the next run does not log in again")
+    exportParser.add_argument("-q", "--quiet", action="store_true", help="do not print progress and stats to stderr")
+    exportParser.set_defaults(function=export)
+    return parser
+
+
+def main(argv=None) -> int:
+    """
+    Run the earnapp command
+    :param argv (optional): the arguments, sys.argv by default
+    :return: the exit code
+    """
+    parser = buildParser()
+    args = parser.parse_args(argv)
+    if getattr(args, "endpoints", None) is not None:
+        try:
+            checkEndpoints(args.endpoints.split(","))
+        except ValueError as e:
+            parser.error(str(e))
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
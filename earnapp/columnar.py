@@ -0,0 +1,232 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A columnar view of User.usage() responses
+# Uses NumPy when it is installed, and the array module otherwise
+
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+
+try:
+    import numpy
+except ImportError:  # numpy is an optional dependency
+    numpy = None
+
+from earnapp.models import iterUsageSteps
+
+periods = ("daily", "weekly", "monthly")
+
+
+def _periodStart(timestamp: float, period: str) -> float:
+    """
+    Get the start of the UTC day, ISO week or month a timestamp is in
+    :param timestamp: seconds since the epoch
+    :param period: daily, weekly or monthly
+    :return: the start of the period in seconds since the epoch
+    """
+    date = datetime.fromtimestamp(timestamp, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "weekly":
+        date -= timedelta(days=date.weekday())
+    elif period == "monthly":
+        date = date.replace(day=1)
+    elif period != "daily":
+        raise ValueError("period must be one of " + ", ".join(periods))
+    return date.timestamp()
+
+
+class UsageFrame:
+    """
+    The usage of many devices over time as two timestamps x devices matrices, one of bandwidth and one of earnings.
+    Rows are the sorted timestamps and columns are the devices, missing data points are 0.
+    With NumPy the matrices are 2D arrays, otherwise they are flat row-major array('d') objects.
+    """
+
+    def __init__(self, timestamps, devices: list, bw, earned):
+        """
+        Initialise the frame, use fromUsage to make one from a usage response
+        :param timestamps: sorted row timestamps
+        :param devices: device uuids of the columns
+        :param bw: the bandwidth matrix
+        :param earned: the earnings matrix
+        """
+        self.timestamps = timestamps
+        self.devices = devices
+        self.deviceIndex = {uuid: i for i, uuid in enumerate(devices)}
+        self.bw = bw
+        self.earned = earned
+
+    @classmethod
+    def fromUsage(cls, usage, useNumpy: bool = None):
+        """
+        Build a frame from a User.usage() response
+        :param usage: the decoded usage response
+        :param useNumpy (optional): whether to use NumPy, defaults to using it if it is installed
+        :return: the frame
+        """
+        if useNumpy is None:
+            useNumpy = numpy is not None
+
+        steps = list(iterUsageSteps(usage))
+        timestamps = sorted({timestamp for timestamp, _ in steps})
+        rowIndex = {timestamp: i for i, timestamp in enumerate(timestamps)}
+        columnIndex = {}
+        # the rows are filled in a single pass over the data points, a device seen for the first time
+        # is appended to the row, and rows are padded with zeros for devices they do not have
+        bwRows = [[] for _ in timestamps]
+        earnedRows = [[] for _ in timestamps]
+        filled = set()  # rows with at least one data point
+        for timestamp, items in steps:
+            row = rowIndex[timestamp]
+            bwRow = bwRows[row]
+            earnedRow = earnedRows[row]
+            padding = [0.0] * (len(columnIndex) - len(bwRow))
+            bwRow += padding
+            earnedRow += padding
+            point = None
+            for uuid, point in items:
+                column = columnIndex.get(uuid)
+                if column is None:
+                    columnIndex[uuid] = len(bwRow)
+                    bwRow.append(point.get("bw") or 0)
+                    earnedRow.append(point.get("earned") or 0.0)
+                else:
+                    bwRow[column] += point.get("bw") or 0
+                    earnedRow[column] += point.get("earned") or 0.0
+            if point is not None:
+                filled.add(row)
+        if len(filled) < len(timestamps):  # time steps without any devices are left out
+            timestamps = [timestamp for row, timestamp in enumerate(timestamps) if row in filled]
+            bwRows = [bwRow for row, bwRow in enumerate(bwRows) if row in filled]
+            earnedRows = [earnedRow for row, earnedRow in enumerate(earnedRows) if row in filled]
+        devices = list(columnIndex)
+        width = len(devices)
+        for rows in (bwRows, earnedRows):
+            for row in rows:
+                if len(row) < width:
+                    row += [0.0] * (width - len(row))
+
+        if useNumpy:
+            shape = (len(timestamps), width)
+            bw = numpy.array(bwRows, dtype=float).reshape(shape)
+            earned = numpy.array(earnedRows, dtype=float).reshape(shape)
+            return cls(numpy.array(timestamps), devices, bw, earned)
+
+        bw = array("d", chain.from_iterable(bwRows))
+        earned = array("d", chain.from_iterable(earnedRows))
+        return cls(array("d", timestamps), devices, bw, earned)
+
+    @property
+    def usesNumpy(self) -> bool:
+        """Whether the matrices are NumPy arrays"""
+        return numpy is not None and isinstance(self.bw, numpy.ndarray)
+
+    def _timestampList(self) -> list:
+        return self.timestamps.tolist()
+
+    def _matrix(self, column: str):
+        if column == "bw":
+            return self.bw
+        if column == "earned":
+            return self.earned
+        raise ValueError("column must be 'bw' or 'earned'")
+
+    def total(self, column: str = "earned") -> float:
+        """
+        :param column (optional): bw or earned, default earned
+        :return: the total across all devices and timestamps
+        """
+        return float(self._matrix(column).sum()) if self.usesNumpy else sum(self._matrix(column))
+
+    def perTimestamp(self, column: str = "earned") -> list:
+        """
+        Sum across devices
+        :param column (optional): bw or earned, default earned
+        :return: a list of (timestamp, total) tuples
+        """
+        matrix = self._matrix(column)
+        if self.usesNumpy:
+            totals = matrix.sum(axis=1).tolist()
+        else:
+            width = len(self.devices)
+            totals = [sum(matrix[row * width:(row + 1) * width]) for row in range(len(self.timestamps))]
+        return list(zip(self._timestampList(), totals))
+
+    def perDevice(self, column: str = "earned") -> dict:
+        """
+        Sum across timestamps, grouped by device
+        :param column (optional): bw or earned, default earned
+        :return: a dictionary of device uuid to total
+        """
+        matrix = self._matrix(column)
+        if self.usesNumpy:
+            totals = matrix.sum(axis=0).tolist()
+        else:
+            width = len(self.devices)
+            totals = [sum(matrix[i::width]) for i in range(width)]
+        return dict(zip(self.devices, totals))
+
+    def device(self, uuid: str, column: str = "earned") -> list:
+        """
+        Get the time series of one device
+        :param uuid: the device uuid
+        :param column (optional): bw or earned, default earned
+        :return: a list of values, one per timestamp
+        """
+        index = self.deviceIndex[uuid]
+        matrix = self._matrix(column)
+        if self.usesNumpy:
+            return matrix[:, index].tolist()
+        return list(matrix[index::len(self.devices)])
+
+    def rolling(self, window: int, column: str = "earned", uuid: str = None) -> list:
+        """
+        Rolling sums over a number of consecutive timestamps
+        :param window: the number of timestamps in each window
+        :param column (optional): bw or earned, default earned
+        :param uuid (optional): only use this device, all devices are summed by default
+        :return: a list of (timestamp of the last row in the window, sum) tuples
+        """
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        if uuid is None:
+            values = [total for _, total in self.perTimestamp(column)]
+        else:
+            values = self.device(uuid, column)
+
+        if self.usesNumpy:
+            cumulative = numpy.concatenate(([0.0], numpy.cumsum(values)))
+            sums = (cumulative[window:] - cumulative[:-window]).tolist()
+        else:
+            sums = []
+            running = 0.0
+            for i, value in enumerate(values):
+                running += value
+                if i >= window:
+                    running -= values[i - window]
+                if i >= window - 1:
+                    sums.append(running)
+        return list(zip(self._timestampList()[window - 1:], sums))
+
+    def rollup(self, period: str, column: str = "earned") -> list:
+        """
+        Sum across devices and group the timestamps into UTC days, ISO weeks or months
+        :param period: daily, weekly or monthly
+        :param column (optional): bw or earned, default earned
+        :return: a list of (start of period timestamp, total) tuples
+        """
+        totals = {}
+        for timestamp, total in self.perTimestamp(column):
+            start = _periodStart(timestamp, period)
+            totals[start] = totals.get(start, 0.0) + total
+        return sorted(totals.items())
@@ -10,15 +10,25 @@ EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WA
 
 You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
 """
-import requests
-from requests.structures import CaseInsensitiveDict
-from http.cookies import SimpleCookie
+import threading
 import time
-from json.decoder import JSONDecodeError
+from typing import TYPE_CHECKING
+
+from earnapp.singleflight import SingleFlight
+from earnapp import jsondecoder
+from earnapp import metrics
+from earnapp import models
+from earnapp.snapshot import Snapshot, defaultEndpoints, checkEndpoints, endpointFunction
+
+if TYPE_CHECKING:
+    import requests
 
 apiURL = "https://earnapp.com/dashboard/api/"
 clientAPIURL = "https://client.earnapp.com/"
 appID = "earnapp"
+defaultTransport = "requests"  # the transport createSession uses when none is given, requests or stdlib
+
+_singleFlight = SingleFlight()  # shared by every User and Client so the same account/device is coalesced across objects
 
 
 class RatelimitedException(Exception):
@@ -47,30 +57,203 @@ class InvalidArgumentsException(Exception):
     """Raised when the given client arguments are invalid."""
 
 
+class DeadlineExceededException(TimeoutError):
+    """Raised when a call takes longer than its deadline."""
+
+
+class LoginFailedException(Exception):
+    """Raised when logging in fails with a status that is neither a ratelimit nor an incorrect token."""
+
+
+def createSession(poolSize: int = 10, keepAlive: bool = True, throttle=None, transport: str = None) -> "requests.Session":
+    """
+    Create a pooled requests session that can be shared between User and Client objects.
+    Connections are kept alive and reused, so only the first request to a host pays for the TCP/TLS handshake.
+    A separate pool is kept for every proxy used with the session.
+    Cookies set by the server are not stored in the session, so it is safe to share between accounts.
+    :param poolSize (optional): the maximum number of connections kept open per host (and per proxy), default 10
+    :param keepAlive (optional): whether to keep connections open between requests, default True
+    :param throttle (optional): an earnapp.throttle.Throttle to limit the request rate and retry 429 responses
+    :param transport (optional): requests, or stdlib for an earnapp.stdlibsession.StdlibSession that starts faster, defaultTransport by default
+    :return: session object
+    """
+
+    if transport is None:
+        transport = defaultTransport
+    if transport == "stdlib":
+        if throttle is not None:
+            raise ValueError("A throttle can only be used with the requests transport")
+        from earnapp.stdlibsession import StdlibSession
+        return StdlibSession(poolSize, keepAlive)
+    if transport != "requests":
+        raise ValueError("transport must be requests or stdlib")
+
+    # imported on first use, so importing earnapp does not load requests and its dependencies
+    import requests
+    from requests.adapters import HTTPAdapter
+    from http.cookiejar import DefaultCookiePolicy
+    from earnapp.throttle import ThrottledAdapter
+
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))  # never persist response cookies
+
+    if throttle is not None:
+        adapter = ThrottledAdapter(throttle, pool_connections=poolSize, pool_maxsize=poolSize)
+    else:
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not keepAlive:
+        session.headers["Connection"] = "close"
+
+    return session
+
+
+def _proxyKey(proxy: dict) -> tuple:
+    """
+    Get a hashable key for a proxy dictionary, used to group things by proxy.
+    :param proxy: a dictionary containing the proxy, may be empty or None
+    :return: a tuple that is equal for equal proxies
+    """
+    return tuple(sorted((proxy or {}).items()))
+
+
+def _requester(session):
+    """
+    :param session: the session to send a request with, may be None
+    :return: the session, or the requests module to open a new connection if there is none
+    """
+    if session is not None:
+        return session
+    import requests  # imported on first use, see createSession
+    return requests
+
+
+def _deadlineAt(deadline: float = None):
+    """
+    :param deadline: seconds a whole call may take, or None for no deadline
+    :return: the time.monotonic() time the call must finish by, or None
+    """
+    return None if deadline is None else time.monotonic() + deadline
+
+
+def _timeoutFor(timeout, deadlineAt: float = None):
+    """
+    Get the timeout to send a request with, shortened so it cannot run past the deadline
+    :param timeout: seconds, a (connect, read) tuple, or None to wait forever
+    :param deadlineAt (optional): the time.monotonic() time the call must finish by
+    :return: the timeout to give requests
+    """
+    if deadlineAt is None:
+        return timeout
+    remaining = deadlineAt - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceededException("The deadline passed before the request was sent")
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class _ReadResponse:
+    """
+    A response whose body has been downloaded by _readBody, with the parts of requests.Response EarnApp.py uses:
+    status_code, headers, url, request, content, text, iter_content and close
+    """
+
+    __slots__ = ("status_code", "headers", "url", "request", "encoding", "content", "retries")
+
+    def __init__(self, resp: "requests.Response", content: bytes):
+        self.status_code = resp.status_code
+        self.headers = resp.headers
+        self.url = resp.url
+        self.request = resp.request
+        self.encoding = resp.encoding
+        self.content = content
+        self.retries = getattr(resp, "retries", 0)
+
+    @property
+    def text(self) -> str:
+        """The body decoded as text, UTF-8 unless the response says otherwise"""
+        return self.content.decode(self.encoding or "utf-8", "replace")
+
+    def iter_content(self, chunk_size: int = 1, decode_unicode: bool = False):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass  # the connection was released when the body was read
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def _readBody(resp: "requests.Response", deadlineAt: float) -> _ReadResponse:
+    """
+    Download the body of a streamed response, stopping if the deadline passes between reads
+    :param resp: the response, sent with stream=True
+    :param deadlineAt: the time.monotonic() time the body must be downloaded by
+    :return: the response with its body
+    """
+    chunks = []
+    try:
+        for chunk in resp.iter_content(65536):
+            chunks.append(chunk)
+            if time.monotonic() > deadlineAt:
+                raise DeadlineExceededException("The deadline passed while the response was downloaded")
+    except Exception:
+        resp.close()
+        raise
+    return _ReadResponse(resp, b"".join(chunks))
+
+
 def _makeClientRequest(
     endpoint: str,
     method: str,
     data: dict = None,
-    proxy: dict = None
-) -> requests.Response:
+    proxy: dict = None,
+    session: "requests.Session" = None,
+    headers: dict = None,
+    timeout=None,
+    deadline: float = None
+) -> "requests.Response":
     """
     Make a request to the EarnApp Client API to a given endpoint
     :param endpoint: the API endpoint to request
     :param method: GET, POST, DELETE or PUT
     :param data (optional): data to send along with the requst
     :param proxy (optional): a dictionary containing the proxy to use
+    :param session (optional): the session to send the request with, a new connection is opened if not given
+    :param headers (optional): extra headers to send with the request
+    :param timeout (optional): seconds to wait for the server, or a (connect, read) tuple, waits forever by default
+    :param deadline (optional): the time.monotonic() time the response must be downloaded by
     :return: response object
     """
 
     url = clientAPIURL + endpoint
 
-    resp = requests.request(
+    requester = _requester(session)
+
+    resp = metrics.instrumented(
+        "client",
+        method,
+        endpoint,
+        requester.request,
         method,
         url,
         json=data,
-        proxies=proxy
+        proxies=proxy,
+        headers=headers,
+        timeout=_timeoutFor(timeout, deadline),
+        stream=deadline is not None
     )
 
+    if deadline is not None:
+        resp = _readBody(resp, deadline)
+
     return resp
 
 
@@ -82,17 +265,25 @@ def _makeEarnAppRequest(
     headers: dict,
     data: dict = None,
     proxy: dict = None,
-    queryParams: str = ""
-) -> requests.Response:
+    queryParams: str = "",
+    session: "requests.Session" = None,
+    stream: bool = False,
+    operation: str = "dashboard",
+    deadline: float = None
+) -> "requests.Response":
     """
     Make a request to the EarnApp API to a given endpoint
     :param endpoint: the API endpoint to request
     :param method: GET, POST, DELETE or PUT
     :param cookies: authentication cookies to send with the request
-    :param timeout: the amount of time to wait for a response
+    :param timeout: seconds to wait for the server, or a (connect, read) tuple
     :param data (optional): data to send along with the requst
     :param proxy (optional): a dictionary containing the proxy to use
     :param queryParams (optional): query parameters to send along with the request
+    :param session (optional): the session to send the request with, a new connection is opened if not given
+    :param stream (optional): whether to return before the response body is downloaded
+    :param operation (optional): the name the request is reported under to earnapp.metrics hooks
+    :param deadline (optional): the time.monotonic() time the response must be downloaded by, ignored if stream is set
     :return: response object
     """
 
@@ -100,28 +291,39 @@ def _makeEarnAppRequest(
 
     url = apiURL + endpoint + queryParams
 
-    resp = requests.request(
+    requester = _requester(session)
+
+    resp = metrics.instrumented(
+        operation,
+        method,
+        endpoint,
+        requester.request,
         method,
         url,
         cookies=cookies,
         json=data,
         proxies=proxy,
-        timeout=timeout,
-        headers=headers
+        timeout=_timeoutFor(timeout, deadline),
+        headers=headers,
+        stream=stream or deadline is not None
     )
 
+    if deadline is not None and not stream:
+        resp = _readBody(resp, deadline)
+
     return resp
 
 
-def getXSRFToken(timeout: int, proxy: dict = None):
+def getXSRFToken(timeout: int, proxy: dict = None, session: "requests.Session" = None):
     """
     A function to retrieve the XSRF token from the EarnApp API.
     This token is required for some endpoints to work.
-    :param timeout: the amount of time to wait for a response from the server
+    :param timeout: seconds to wait for the server, or a (connect, read) tuple
     :param proxy (optional): a dictionary containing the proxy to use
+    :param session (optional): the session to send the request with, a new connection is opened if not given
     """
 
-    headers = CaseInsensitiveDict()
+    headers = {}
     headers["Host"] = "earnapp.com"
     headers["Accept"] = "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8"
     headers["Accept-Language"] = "en-GB,en;q=0.5"
@@ -136,7 +338,13 @@ def getXSRFToken(timeout: int, proxy: dict = None):
     headers["Cache-Control"] = "no-cache"
     headers["TE"] = "trailers"
 
-    resp = requests.get(
+    requester = _requester(session)
+
+    resp = metrics.instrumented(
+        "xsrf",
+        "GET",
+        "rotate_xsrf",
+        requester.get,
         apiURL + "/sec/rotate_xsrf?appid=" + appID + "&version=1.281.185",
         headers=headers,
         proxies=proxy,
@@ -146,6 +354,8 @@ def getXSRFToken(timeout: int, proxy: dict = None):
     if resp.status_code == 429:  # if the user is ratelimited
         raise RatelimitedException("You are being ratelimited")  # raise an exception
 
+    from http.cookies import SimpleCookie  # imported on first use to keep importing earnapp fast
+
     cookie = SimpleCookie()
     cookie.load(resp.headers['Set-Cookie'])
 
@@ -160,7 +370,7 @@ def getXSRFToken(timeout: int, proxy: dict = None):
 
     return token
 
-def _getClientReturnData(resp: requests.Response) -> dict:
+def _getClientReturnData(resp: "requests.Response") -> dict:
     """
     A function to get the JSON data from the response object from the client API.
     This function may also raise an exception if an error is encountered.
@@ -176,39 +386,120 @@ def _getClientReturnData(resp: requests.Response) -> dict:
         raise InvalidArgumentsException("Invalid arguments")
 
     try:
-        return resp.json()
-    except JSONDecodeError:
+        return jsondecoder.loads(resp.content)
+    except ValueError:
         raise JSONDecodeErrorException("Failed to decode JSON data: " + resp.text)
 
 
-def _getReturnData(resp: requests.Response) -> dict:
+def _checkStatus(resp: "requests.Response"):
     """
-    A function to get the JSON data from the response object.
-    This function may also raise an exception if an error is encountered.
-    :param resp: the response object to get the data from
+    Raise an exception if the response status shows the request failed.
+    :param resp: the response object to check
     """
     if resp.status_code == 429:  # if the user is ratelimited
         raise RatelimitedException("You are being ratelimited")  # raise an exception
     if resp.status_code == 403:  # if the user is unauthorized
         raise IncorrectTokenException("Token is not correct")  # raise an exception
 
+
+def _withoutValidator(headers: dict) -> dict:
+    """
+    Remove If-None-Match from request headers, to send a request again after a 304 response that cannot be used
+    :param headers: the headers of the request, may be None
+    :return: a copy of the headers without If-None-Match
+    """
+    return {name: value for name, value in (headers or {}).items() if name.lower() != "if-none-match"}
+
+
+def _getReturnData(resp: "requests.Response") -> dict:
+    """
+    A function to get the JSON data from the response object.
+    This function may also raise an exception if an error is encountered.
+    :param resp: the response object to get the data from
+    """
+    _checkStatus(resp)
+
     try:
-        jsonData = resp.json()  # attempt to get the JSON data
-    except JSONDecodeError:
+        jsonData = jsondecoder.loads(resp.content)  # attempt to get the JSON data
+    except ValueError:
         raise JSONDecodeErrorException("Failed to decode JSON data: " + resp.text)  # if the JSON data was invalid, raise an exception
     return jsonData
 
 
-class Client:
+_sessionLock = threading.Lock()
+
+
+class _SessionOwner:
+    """
+    Shared session handling for User and Client.
+    Unless a session is given, one is created on first use, so creating users and clients does not load the HTTP library.
+    A session passed in by the caller is never closed by the object.
+    """
+
+    def _initSession(self, session, poolSize: int, keepAlive: bool, throttle, transport: str):
+        self._session = session
+        self._ownsSession = session is None
+        self._sessionArgs = (poolSize, keepAlive, throttle, transport)
+
+    @property
+    def session(self) -> "requests.Session":
+        """The session requests are sent with"""
+        if self._session is None:
+            with _sessionLock:
+                if self._session is None:
+                    self._session = createSession(*self._sessionArgs)
+        return self._session
+
+    @session.setter
+    def session(self, session: "requests.Session"):
+        with _sessionLock:
+            self._session = session
+            self._ownsSession = False
+
+    def close(self):
+        """
+        Close the session if it was created by this object, its connections are closed and no longer kept alive.
+        A new session is created if the object is used again.
+        """
+        with _sessionLock:
+            session = self._session if self._ownsSession else None
+            if session is not None:
+                self._session = None
+        if session is not None:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Client(_SessionOwner):
     """
     A class that represents a EarnApp client session
     This holds the client settings/proxy
+    A client only holds settings, so it can be used from many threads at once.
     """
 
-    proxy = {}
-    timeout = 10
-
-    def __init__(self, uuid: str, version: str, arch: str, appid: str, proxy: dict = None, timeout: int = 10):
+    def __init__(
+        self,
+        uuid: str,
+        version: str,
+        arch: str,
+        appid: str,
+        proxy: dict = None,
+        timeout: int = 10,
+        session: "requests.Session" = None,
+        poolSize: int = 10,
+        keepAlive: bool = True,
+        throttle=None,
+        cache=None,
+        coalesce: bool = False,
+        deadline: float = None,
+        hedge=None,
+        transport: str = None
+    ):
         """
         Initialise the client
         :param uuid: the uuid of the client
@@ -216,7 +507,16 @@ class Client:
         :param arch: the architecture of the client
         :param appid: the appid of the client
         :param proxy: the proxy to use
-        :param timeout: the amount of time to wait for a response from the server
+        :param timeout: seconds to wait for the server, or a (connect, read) tuple
+        :param session (optional): a session from createSession to share with other clients/users
+        :param poolSize (optional): connection pool size of the client's own session, ignored if session is given
+        :param keepAlive (optional): whether the client's own session keeps connections open, ignored if session is given
+        :param throttle (optional): an earnapp.throttle.Throttle for the client's own session, ignored if session is given
+        :param cache (optional): an earnapp.cache.ResponseCache for read-only endpoints, can be shared with other clients/users
+        :param coalesce (optional): whether identical GET requests made at the same time share one request, default False
+        :param deadline (optional): seconds a whole call may take, including downloading the response, no deadline by default
+        :param hedge (optional): an earnapp.hedge.HedgePolicy that sends a second copy of slow GET requests, can be shared
+        :param transport (optional): requests or stdlib for the client's own session, ignored if session is given
         """
         self.uuid = uuid
         self.version = version
@@ -226,6 +526,11 @@ class Client:
             proxy = {}
         self.proxy = proxy
         self.timeout = timeout
+        self._initSession(session, poolSize, keepAlive, throttle, transport)
+        self.cache = cache
+        self.coalesce = coalesce
+        self.deadline = deadline
+        self.hedge = hedge
 
     def setProxy(self, proxy: dict) -> bool:
         """
@@ -243,25 +548,72 @@ class Client:
     ) -> dict:
         """
         A function to call a given endpoint. It handles return data, no XSRF for client.
+        If coalesce is enabled, identical GET requests for the same device that are made at the same time share one request.
         :param endpoint: the endpoint to call
         :param method: the method to use (GET, POST, DELETE or PUT)
-        :param data (optional): JSON data to send
         """
+        if self.coalesce and method == "GET":
+            return _singleFlight.do(("client", self.uuid, endpoint), self._simpleClientRequest, endpoint, method)
+        return self._simpleClientRequest(endpoint, method)
+
+    def _simpleClientRequest(self, endpoint: str, method: str) -> dict:
+        """
+        Call a given endpoint, see simpleClientRequest
+        """
+
+        cacheKey = None
+        entry = None
+        if self.cache is not None and method == "GET":
+            cacheKey = self.cache.key(endpoint, scope=self.uuid)
+            if cacheKey is not None:
+                entry = self.cache.get(cacheKey)
+                if entry is not None and entry.fresh():
+                    return entry.data
+
+        headers = None
+        if entry is not None and entry.etag:
+            headers = {"If-None-Match": entry.etag}
 
         if method == "GET":
-            endpoint += "?uuid=" + self.uuid + "&version=" + self.version + "&arch=" + self.arch + "&appid=" + self.appid
+            url = endpoint + "?uuid=" + self.uuid + "&version=" + self.version + "&arch=" + self.arch + "&appid=" + self.appid
             data = None
         else:
+            url = endpoint
             data = {"uuid": self.uuid, "version": self.version, "arch": self.arch, "appid": self.appid}
 
-        resp = _makeClientRequest(
-            endpoint,
-            method,
-            data=data,
-            proxy=self.proxy
-        )
+        deadlineAt = _deadlineAt(self.deadline)
+
+        def send():
+            return _makeClientRequest(
+                url,
+                method,
+                data=data,
+                proxy=self.proxy,
+                session=self.session,
+                headers=headers,
+                timeout=self.timeout,
+                deadline=deadlineAt
+            )
+
+        if self.hedge is not None and method == "GET":
+            resp = self.hedge.run(("client", endpoint), send)
+        else:
+            resp = send()
+
+        if resp.status_code == 304:
+            if cacheKey is not None and entry is not None and entry.etag:
+                return self.cache.revalidate(cacheKey, entry)
+            # there is no cached response to reuse, so ask for the whole response
+            resp.close()
+            headers = _withoutValidator(headers)
+            resp = send()
 
-        return _getClientReturnData(resp)
+        if cacheKey is None:
+            return _getClientReturnData(resp)
+
+        returnData = _getClientReturnData(resp)
+        self.cache.put(cacheKey, returnData, resp.headers.get("ETag"))
+        return returnData
 
     def appConfigWin(self):
         """
@@ -340,19 +692,62 @@ class Client:
         """
         return self.simpleClientRequest("is_ip_blocked", "GET")
 
-class User:
+class User(_SessionOwner):
     """
     A class that represents an EarnApp user.
     This holds the user's token and settings.
-    """
 
-    cookies = {}
-    proxy = {}
-    headers = {}
-    timeout = 10  # default timeout for requests
+    Every user has its own cookies, headers and XSRF token, so any number of users can be used in one process.
+    A user can also be shared between threads: the XSRF token is refreshed by one thread while the others wait
+    for it, and the cookies and headers are replaced together rather than changed in place,
+    so every request is sent with a matching pair.
+    """
 
-    xsrfToken = ""
-    xsrfTokenTime = 0
+    def __init__(
+        self,
+        proxy: dict = None,
+        timeout: int = 10,
+        session: "requests.Session" = None,
+        poolSize: int = 10,
+        keepAlive: bool = True,
+        xsrfCache=None,
+        throttle=None,
+        cache=None,
+        coalesce: bool = False,
+        deadline: float = None,
+        hedge=None,
+        transport: str = None
+    ):
+        """
+        Initialise the user
+        :param proxy (optional): the proxy to use
+        :param timeout (optional): seconds to wait for the server, or a (connect, read) tuple, default 10
+        :param session (optional): a session from createSession to share with other users/clients
+        :param poolSize (optional): connection pool size of the user's own session, ignored if session is given
+        :param keepAlive (optional): whether the user's own session keeps connections open, ignored if session is given
+        :param xsrfCache (optional): an earnapp.xsrf.XSRFTokenCache to share XSRF tokens with other users on the same proxy
+        :param throttle (optional): an earnapp.throttle.Throttle for the user's own session, ignored if session is given
+        :param cache (optional): an earnapp.cache.ResponseCache for read-only endpoints, can be shared with other users/clients
+        :param coalesce (optional): whether identical GET requests made at the same time share one request, default False
+        :param deadline (optional): seconds a whole call may take, including refreshing the XSRF token, no deadline by default
+        :param hedge (optional): an earnapp.hedge.HedgePolicy that sends a second copy of slow GET requests, can be shared
+        :param transport (optional): requests or stdlib for the user's own session, ignored if session is given
+        """
+        self._auth = ({}, {})  # (cookies, headers), always replaced as a whole
+        self._lock = threading.RLock()  # held while the XSRF token or login cookies are being updated
+        self.xsrfToken = ""
+        self.xsrfTokenTime = 0
+        self._xsrfProxy = None  # the proxy the XSRF token was fetched through, None if not known
+        if proxy is None:
+            proxy = {}
+        self.proxy = proxy
+        self.timeout = timeout
+        self._initSession(session, poolSize, keepAlive, throttle, transport)
+        self.xsrfCache = xsrfCache
+        self.cache = cache
+        self.coalesce = coalesce
+        self.deadline = deadline
+        self.hedge = hedge
 
     def setProxy(self, proxy: dict) -> bool:
         """
@@ -363,22 +758,99 @@ class User:
         self.proxy = proxy  # set the proxy
         return True
 
-    def _updateXSRFTokenIfNecessary(self):
+    @property
+    def cookies(self) -> dict:
+        """The cookies sent with every request, replaced rather than changed when the XSRF token changes"""
+        return self._auth[0]
+
+    @cookies.setter
+    def cookies(self, cookies: dict):
+        with self._lock:
+            self._auth = (cookies, self._auth[1])
+
+    @property
+    def headers(self) -> dict:
+        """The headers sent with every request, replaced rather than changed when the XSRF token changes"""
+        return self._auth[1]
+
+    @headers.setter
+    def headers(self, headers: dict):
+        with self._lock:
+            self._auth = (self._auth[0], headers)
+
+    def _setXSRFToken(self, xsrfToken: str, fetchedAt: float, proxy: dict):
+        """
+        Use a new XSRF token, must be called with the lock held
+        :param xsrfToken: the token
+        :param fetchedAt: when the token was fetched
+        :param proxy: the proxy the token was fetched through
+        """
+        cookies, headers = self._auth
+        self._auth = (dict(cookies, **{"xsrf-token": xsrfToken}), dict(headers, **{"xsrf-token": xsrfToken}))
+        self.xsrfToken = xsrfToken
+        self._xsrfProxy = proxy
+        self.xsrfTokenTime = fetchedAt  # set last, so a thread that sees the new time also sees the new token
+
+    def _tokenValidFor(self, proxy: dict) -> bool:
+        """
+        :return: whether the user's XSRF token is less than 60 seconds old and was fetched through proxy
+        """
+        if int(time.time()) - 60 >= self.xsrfTokenTime:  # 60 second token expiration
+            return False
+        return self._xsrfProxy is None or _proxyKey(self._xsrfProxy) == _proxyKey(proxy)
+
+    def _requestProxy(self) -> dict:
+        """
+        Get the proxy the next request is sent through: the user's proxy, or the one picked by a ProxyPool session.
+        The pool is asked to keep the proxy the XSRF token was fetched through while the token is valid.
+        :return: a dictionary containing the proxy
         """
-        Will update the XSRF token if it is older than 60 seconds.
+        pick = getattr(self.session, "pick", None)
+        if pick is None:
+            return self.proxy
+        prefer = self._xsrfProxy if self.xsrfCache is None and int(time.time()) - 60 < self.xsrfTokenTime else None
+        return pick(prefer)
+
+    def _authFor(self, xsrfToken: str) -> tuple:
+        """
+        :param xsrfToken: the XSRF token the request is sent with
+        :return: tuple of the cookies and headers to send
+        """
+        cookies, headers = self._auth
+        if headers.get("xsrf-token") != xsrfToken:  # another thread switched to a token for another proxy
+            cookies = dict(cookies, **{"xsrf-token": xsrfToken})
+            headers = dict(headers, **{"xsrf-token": xsrfToken})
+        return cookies, headers
+
+    def _updateXSRFTokenIfNecessary(self, deadlineAt: float = None, proxy: dict = None):
+        """
+        Will update the XSRF token if it is older than 60 seconds or was fetched through another proxy.
+        If the user has an xsrfCache, the token is taken from the cache instead.
+        Only one thread fetches a new token, others calling at the same time wait for it.
+        :param deadlineAt (optional): the time.monotonic() time the call must finish by
+        :param proxy (optional): the proxy the request will be sent through, from _requestProxy, the user's proxy by default
         :return: the XSRF token
         """
-        currentTime = int(time.time())
-        if currentTime - 60 < self.xsrfTokenTime:  # 60 second token expiration
+        if proxy is None:
+            proxy = self.proxy
+        if self.xsrfCache is not None:
+            xsrfToken, fetchedAt = self.xsrfCache.get(proxy)
+            if xsrfToken != self.xsrfToken:
+                with self._lock:
+                    self._setXSRFToken(xsrfToken, fetchedAt, proxy)
+            return xsrfToken
+
+        if self._tokenValidFor(proxy):
             return self.xsrfToken
 
-        xsrfToken = getXSRFToken(self.timeout, proxy=self.proxy)
-        self.xsrfTokenTime = currentTime  # set the update time
-        self.xsrfToken = xsrfToken
-        self.cookies["xsrf-token"] = xsrfToken
-        self.headers["xsrf-token"] = xsrfToken
+        with self._lock:
+            if self._tokenValidFor(proxy):  # another thread updated it while this one waited
+                return self.xsrfToken
 
-        return self.xsrfToken
+            currentTime = int(time.time())
+            xsrfToken = getXSRFToken(_timeoutFor(self.timeout, deadlineAt), proxy=proxy, session=self.session)
+            self._setXSRFToken(xsrfToken, currentTime, proxy)
+            return xsrfToken
 
     def simpleEarnAppRequest(
         self,
@@ -386,28 +858,109 @@ class User:
         method: str,
         data: dict = None,
         queryParams: str = ""
-    ) -> requests.Response:
+    ) -> dict:
         """
         A function to call a given endpoint. It handles XSRF and return data.
+        If coalesce is enabled, identical GET requests for the same account that are made at the same time share one request.
         :param endpoint: the endpoint to call
         :param method: the method to use (GET, POST, DELETE or PUT)
         :param data (optional): JSON data to send
         :param queryParams (optional): URL query parameters to send
         """
-        self._updateXSRFTokenIfNecessary()
+        if self.coalesce and method == "GET":
+            key = ("user", self.cookies.get("oauth-refresh-token"), endpoint, method, queryParams)
+            return _singleFlight.do(key, self._simpleEarnAppRequest, endpoint, method, data, queryParams)
+        return self._simpleEarnAppRequest(endpoint, method, data, queryParams)
+
+    def _simpleEarnAppRequest(
+        self,
+        endpoint: str,
+        method: str,
+        data: dict = None,
+        queryParams: str = ""
+    ) -> dict:
+        """
+        Call a given endpoint, see simpleEarnAppRequest
+        """
+        cacheKey = None
+        entry = None
+        if self.cache is not None and method == "GET":
+            cacheKey = self.cache.key(endpoint, queryParams, scope=self.cookies.get("oauth-refresh-token"))
+            if cacheKey is not None:
+                entry = self.cache.get(cacheKey)
+                if entry is not None and entry.fresh():
+                    return entry.data
+
+        deadlineAt = _deadlineAt(self.deadline)
+        proxy = self._requestProxy()
+        cookies, headers = self._authFor(self._updateXSRFTokenIfNecessary(deadlineAt, proxy))
+        if entry is not None and entry.etag:
+            headers = dict(headers, **{"If-None-Match": entry.etag})
+
+        def send():
+            return _makeEarnAppRequest(
+                endpoint,
+                method,
+                cookies,
+                self.timeout,
+                headers,
+                data=data,
+                proxy=proxy,
+                queryParams=queryParams,
+                session=self.session,
+                deadline=deadlineAt
+            )
+
+        if self.hedge is not None and method == "GET":
+            resp = self.hedge.run(("user", endpoint), send)
+        else:
+            resp = send()
+
+        if resp.status_code == 304:
+            if cacheKey is not None and entry is not None and entry.etag:
+                return self.cache.revalidate(cacheKey, entry)
+            # there is no cached response to reuse, so ask for the whole response
+            resp.close()
+            headers = _withoutValidator(headers)
+            resp = send()
+
+        if cacheKey is None:
+            return _getReturnData(resp)
+
+        returnData = _getReturnData(resp)
+        self.cache.put(cacheKey, returnData, resp.headers.get("ETag"))
+        return returnData
+
+
+    def streamEarnAppRequest(self, endpoint: str, key: str = None, queryParams: str = "", chunkSize: int = 65536):
+        """
+        A function to GET a given endpoint that returns a JSON array, decoding the array items as they are downloaded.
+        Only one item is held in memory at a time, so memory use stays flat however large the response is.
+        :param endpoint: the endpoint to call
+        :param key (optional): if the response is an object, the key of the array inside it
+        :param queryParams (optional): URL query parameters to send
+        :param chunkSize (optional): the number of bytes to read from the connection at a time
+        :return: a generator of the array items
+        """
+        from earnapp.jsonstream import iterArrayItems  # imported here because earnapp.jsonstream imports this module
+
+        proxy = self._requestProxy()
+        cookies, headers = self._authFor(self._updateXSRFTokenIfNecessary(proxy=proxy))
         resp = _makeEarnAppRequest(
             endpoint,
-            method,
-            self.cookies,
+            "GET",
+            cookies,
             self.timeout,
-            self.headers,
-            data=data,
-            proxy=self.proxy,
-            queryParams=queryParams
+            headers,
+            proxy=proxy,
+            queryParams=queryParams,
+            session=self.session,
+            stream=True
         )
 
-        return _getReturnData(resp)
-
+        with resp:
+            _checkStatus(resp)
+            yield from iterArrayItems(resp.iter_content(chunkSize), key)
 
     def login(self, token: str, method: str="google") -> bool:
         """
@@ -417,32 +970,97 @@ class User:
         :param method (optional): login method, only current option is google.
         :return: True on successful login, False otherwise
         """
-        self._updateXSRFTokenIfNecessary()
+        deadlineAt = _deadlineAt(self.deadline)
+        proxy = self._requestProxy()
+        xsrfToken = self._updateXSRFTokenIfNecessary(deadlineAt, proxy)
         resp = _makeEarnAppRequest(
             "user_data",
             "GET",
             {
                 "auth-method": method,
                 "oauth-refresh-token": token,
-                "xsrf-token": self.xsrfToken
+                "xsrf-token": xsrfToken
             },
             self.timeout,
-            self.headers,
-            proxy=self.proxy
+            self._authFor(xsrfToken)[1],
+            proxy=proxy,
+            session=self.session,
+            operation="login",
+            deadline=deadlineAt
         )
 
         if resp.status_code == 200:  # if the cookies were valid
-            self.cookies = {  # save the cookies to the variable
-                "auth-method": method,
-                "oauth-refresh-token": token,
-                "xsrf-token": self.xsrfToken
-            }
+            with self._lock:  # the token may have been refreshed by another thread in the meantime
+                self.cookies = {  # save the cookies to the variable
+                    "auth-method": method,
+                    "oauth-refresh-token": token,
+                    "xsrf-token": self.xsrfToken
+                }
             # return the right value depending on succeeding/failing
             return True
-        if resp.status_code == 403:
-            raise IncorrectTokenException("Token is not correct")
 
-        raise RatelimitedException("Error when logging in, probably ratelimited.")
+        _checkStatus(resp)  # 429 and 403
+        raise LoginFailedException("Error when logging in, the server answered " + str(resp.status_code))
+
+    def exportSession(self) -> dict:
+        """
+        Get the logged in state of the user, to restore with importSession after a restart
+        The state contains the oauth-refresh-token, so keep it as safe as the token itself.
+        :return: a dictionary of the cookies and the XSRF token and when it was fetched, which can be saved as JSON
+        """
+        with self._lock:
+            return {
+                "version": 1,
+                "cookies": dict(self.cookies),
+                "xsrfToken": self.xsrfToken,
+                "xsrfTokenTime": self.xsrfTokenTime,
+                "savedAt": time.time()
+            }
+
+    def importSession(self, state: dict):
+        """
+        Restore a state from exportSession without making any requests.
+        The state is not checked until the next request, which raises IncorrectTokenException if it is no longer valid.
+        The XSRF token is reused if it is less than 60 seconds old.
+        :param state: the state from exportSession
+        """
+        cookies = state.get("cookies") or {}
+        if "oauth-refresh-token" not in cookies:
+            raise ValueError("The state does not contain an oauth-refresh-token")
+
+        with self._lock:
+            xsrfToken = state.get("xsrfToken") or ""
+            headers = dict(self.headers)
+            if xsrfToken:
+                headers["xsrf-token"] = xsrfToken
+            self._auth = (dict(cookies), headers)
+            self.xsrfToken = xsrfToken
+            self._xsrfProxy = None
+            self.xsrfTokenTime = state.get("xsrfTokenTime", 0) if xsrfToken else 0
+
+    def saveSession(self, store, key: str):
+        """
+        Save the logged in state of the user to a store
+        :param store: an earnapp.sessionstore.FileSessionStore, or any object with a save(key, state) function
+        :param key: the name to save the state under, for example earnapp.sessionstore.accountKey(token)
+        """
+        store.save(key, self.exportSession())
+
+    def restoreSession(self, store, key: str, token: str = None) -> bool:
+        """
+        Restore the logged in state of the user from a store without making any requests, see importSession
+        :param store: an earnapp.sessionstore.FileSessionStore, or any object with a load(key) function
+        :param key: the name the state was saved under
+        :param token (optional): only restore a state that was logged in with this oauth-refresh-token
+        :return: True if a state was restored, False if there was none and login must be called instead
+        """
+        state = store.load(key)
+        if not state or "oauth-refresh-token" not in (state.get("cookies") or {}):
+            return False
+        if token is not None and state["cookies"]["oauth-refresh-token"] != token:
+            return False
+        self.importSession(state)
+        return True
 
     def userData(self) -> dict:
         """
@@ -451,19 +1069,36 @@ class User:
         """
         return self.simpleEarnAppRequest("user_data", "GET")
 
-    def money(self) -> dict:
+    def money(self, parse: bool = False) -> dict:
         """
         Get info such as current balance, payment method, etc.
+        :param parse (optional): return an earnapp.models.MoneyInfo instead of a dictionary
         :return: a dictionary containing the user's money data
         """
-        return self.simpleEarnAppRequest("money", "GET")
+        money = self.simpleEarnAppRequest("money", "GET")
+        if parse:
+            return models.MoneyInfo.fromJSON(money)
+        return money
 
-    def devices(self) -> dict:
+    def devices(self, parse: bool = False) -> dict:
         """
         Get info such as device IDs, rate, amount earnt, etc.
+        :param parse (optional): return a list of earnapp.models.Device instead of dictionaries
         :return: a dictionary containing the user's device data
         """
-        return self.simpleEarnAppRequest("devices", "GET")
+        devices = self.simpleEarnAppRequest("devices", "GET")
+        if parse:
+            return list(models.iterDevices(devices))
+        return devices
+
+    def iterDevices(self, parse: bool = False):
+        """
+        Like devices(), but yields the devices one by one while the response is downloaded
+        :param parse (optional): yield earnapp.models.Device instead of dictionaries
+        :return: a generator of devices
+        """
+        devices = self.streamEarnAppRequest("devices")
+        return models.iterDevices(devices) if parse else devices
 
     def appVersions(self) -> dict:
         """
@@ -479,12 +1114,25 @@ class User:
         """
         return self.simpleEarnAppRequest("payment_methods", "GET")
 
-    def transactions(self) -> dict:
+    def transactions(self, parse: bool = False) -> dict:
         """
         Get past transactions and their status
+        :param parse (optional): return a list of earnapp.models.Transaction instead of dictionaries
         :return: a dictionary containing past transactions
         """
-        return self.simpleEarnAppRequest("transactions", "GET")
+        transactions = self.simpleEarnAppRequest("transactions", "GET")
+        if parse:
+            return list(models.iterTransactions(transactions))
+        return transactions
+
+    def iterTransactions(self, parse: bool = False):
+        """
+        Like transactions(), but yields the transactions one by one while the response is downloaded
+        :param parse (optional): yield earnapp.models.Transaction instead of dictionaries
+        :return: a generator of transactions
+        """
+        transactions = self.streamEarnAppRequest("transactions")
+        return models.iterTransactions(transactions) if parse else transactions
 
     def linkDevice(self, deviceID: str) -> dict:
         """
@@ -543,6 +1191,68 @@ class User:
             data={"name": name}
         )
 
+    def _bulk(self, function, items, maxWorkers: int, retries: int, idempotent: bool = True):
+        """
+        Run a device function for many items, see earnapp.bulk.runBulk
+        """
+        from earnapp.bulk import runBulk  # imported here because earnapp.bulk imports this module
+        return runBulk(function, items, maxWorkers=maxWorkers, retries=retries, idempotent=idempotent)
+
+    def linkDevices(self, deviceIDs, maxWorkers: int = 8, retries: int = 3):
+        """
+        Link many devices to the logged in EarnApp account in parallel
+        :param deviceIDs: an iterable of EarnApp device IDs
+        :param maxWorkers (optional): the maximum number of requests in flight, default 8
+        :param retries (optional): how many times to retry ratelimited requests and failed connections, default 3.
+        Timeouts are not retried, the request may have succeeded
+        :return: an earnapp.bulk.BulkReport with a result per device, no exception is raised for failed devices
+        """
+        return self._bulk(self.linkDevice, deviceIDs, maxWorkers, retries, idempotent=False)
+
+    def hideDevices(self, deviceIDs, maxWorkers: int = 8, retries: int = 3):
+        """
+        Hide many devices from the logged in EarnApp account in parallel
+        :param deviceIDs: an iterable of EarnApp device IDs
+        :param maxWorkers (optional): the maximum number of requests in flight, default 8
+        :param retries (optional): how many times to retry ratelimited and connection errors, default 3
+        :return: an earnapp.bulk.BulkReport with a result per device, no exception is raised for failed devices
+        """
+        return self._bulk(self.hideDevice, deviceIDs, maxWorkers, retries)
+
+    def showDevices(self, deviceIDs, maxWorkers: int = 8, retries: int = 3):
+        """
+        Show many devices on the logged in EarnApp account in parallel
+        :param deviceIDs: an iterable of EarnApp device IDs
+        :param maxWorkers (optional): the maximum number of requests in flight, default 8
+        :param retries (optional): how many times to retry ratelimited and connection errors, default 3
+        :return: an earnapp.bulk.BulkReport with a result per device, no exception is raised for failed devices
+        """
+        return self._bulk(self.showDevice, deviceIDs, maxWorkers, retries)
+
+    def deleteDevices(self, deviceIDs, maxWorkers: int = 8, retries: int = 3):
+        """
+        Delete many devices from the logged in EarnApp account in parallel
+        :param deviceIDs: an iterable of EarnApp device IDs
+        :param maxWorkers (optional): the maximum number of requests in flight, default 8
+        :param retries (optional): how many times to retry ratelimited requests and failed connections, default 3.
+        Timeouts are not retried, the request may have succeeded
+        :return: an earnapp.bulk.BulkReport with a result per device, no exception is raised for failed devices
+        """
+        return self._bulk(self.deleteDevice, deviceIDs, maxWorkers, retries, idempotent=False)
+
+    def renameDevices(self, renames, maxWorkers: int = 8, retries: int = 3):
+        """
+        Rename many devices in parallel
+        :param renames: an iterable of (device ID, new name) pairs, or a dictionary of device ID to new name
+        :param maxWorkers (optional): the maximum number of requests in flight, default 8
+        :param retries (optional): how many times to retry ratelimited requests and failed connections, default 3.
+        Timeouts are not retried, the request may have succeeded
+        :return: an earnapp.bulk.BulkReport with a result per device, no exception is raised for failed devices
+        """
+        if isinstance(renames, dict):
+            renames = renames.items()
+        return self._bulk(self.renameDevice, (tuple(rename) for rename in renames), maxWorkers, retries, idempotent=False)
+
     def redeemDetails(self, toEmail: str, paymentMethod: str="paypal.com") -> dict:
         """
         Change the redeem details of the logged in account
@@ -573,17 +1283,64 @@ class User:
         """
         return self.simpleEarnAppRequest("counters", "GET")
 
-    def usage(self, step: str = "daily") -> dict:
+    def usage(self, step: str = "daily", parse: bool = False) -> dict:
         """
         Get the usage of all devices on the logged in account, including deleted devices
         :param step: the timeframe of usage (daily, weekly, monthly), default daily
+        :param parse (optional): return a list of earnapp.models.UsageSeries, one per device, instead of a dictionary
         :return: a dictionary containing the usage
         """
         if step not in ["daily", "weekly", "monthly"]:
             raise InvalidTimeframeException
 
-        return self.simpleEarnAppRequest(
+        usage = self.simpleEarnAppRequest(
             "usage",
             "GET",
             queryParams="&step=" + step
         )
+        if parse:
+            return models.UsageSeries.fromUsage(usage)
+        return usage
+
+    def iterUsage(self, step: str = "daily"):
+        """
+        Like usage(), but yields the time steps one by one while the response is downloaded.
+        Each step holds the usage of every device at one date, earnapp.models.iterUsagePoints can flatten them.
+        :param step: the timeframe of usage (daily, weekly, monthly), default daily
+        :return: a generator of time steps
+        """
+        if step not in ["daily", "weekly", "monthly"]:
+            raise InvalidTimeframeException
+
+        return self.streamEarnAppRequest("usage", key="data", queryParams="&step=" + step)
+
+    def snapshot(self, endpoints=defaultEndpoints, parse: bool = False, maxWorkers: int = None) -> Snapshot:
+        """
+        Fetch several endpoints at the same time, taking about as long as the slowest one instead of all of them added up.
+        The XSRF token is checked once for all of them, and an endpoint that fails does not fail the others.
+        :param endpoints (optional): names of the functions to call, such as "money" and "devices", a dashboard refresh by default:
+        userData, money, devices, onlineStatus, counters and transactions. appVersions, paymentMethods and usage (daily) can also be given
+        :param parse (optional): return earnapp.models objects for the endpoints that can, like their parse argument
+        :param maxWorkers (optional): the maximum number of requests in flight, one per endpoint by default
+        :return: an earnapp.snapshot.Snapshot with the data of every endpoint, and the exception of every endpoint that failed
+        """
+        endpoints = checkEndpoints(endpoints)
+        start = time.monotonic()
+        try:
+            self._updateXSRFTokenIfNecessary(_deadlineAt(self.deadline), self._requestProxy())
+        except Exception as e:  # every endpoint needs the token
+            return Snapshot({}, {endpoint: e for endpoint in endpoints}, time.monotonic() - start)
+
+        data = {}
+        errors = {}
+        if not endpoints:
+            return Snapshot(data, errors, time.monotonic() - start)
+        from concurrent.futures import ThreadPoolExecutor  # imported on first use to keep importing earnapp fast
+        with ThreadPoolExecutor(max_workers=min(maxWorkers or len(endpoints), len(endpoints))) as pool:
+            futures = {endpoint: pool.submit(endpointFunction(self, endpoint, parse)) for endpoint in endpoints}
+            for endpoint, future in futures.items():
+                try:
+                    data[endpoint] = future.result()
+                except Exception as e:
+                    errors[endpoint] = e
+        return Snapshot(data, errors, time.monotonic() - start)
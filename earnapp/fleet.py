@@ -0,0 +1,386 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+
+from earnapp.earnapp import User, Client, createSession, _proxyKey, IncorrectTokenException
+from earnapp.sessionstore import accountKey
+
+FleetResult = namedtuple("FleetResult", ["account", "method", "data", "error", "elapsed"])
+FleetResult.__doc__ = """
+The result of one call made by a Fleet.
+account is the FleetAccount the call was made for, method is the User method name that was called.
+data is the return value of the call, or None if it raised, in which case error holds the exception.
+elapsed is the time the call took in seconds.
+"""
+
+
+def _checkLimits(maxConcurrency: int, maxPerProxy: int):
+    """
+    Raise ValueError if a concurrency limit would never let a call start
+    """
+    if maxConcurrency < 1:
+        raise ValueError("maxConcurrency must be at least 1")
+    if maxPerProxy < 1:
+        raise ValueError("maxPerProxy must be at least 1")
+
+
+def _dispatch(jobs, call, maxConcurrency: int, maxPerProxy: int, followUp=None, maxQueued: int = None):
+    """
+    Run (target, method) jobs on a thread pool, never exceeding the global and per proxy limits.
+    Jobs are taken from the proxies in turn so one busy proxy does not hold up the others.
+    jobs is only read while there is room for more, so a generator of jobs is never held in memory whole:
+    at most maxConcurrency jobs are running and maxQueued are waiting for their proxy at any time.
+    :param jobs: an iterable of (target, method) pairs, every target has a proxyKey attribute
+    :param call: a function taking (target, method) that makes the call
+    :param maxConcurrency: the maximum number of calls in flight
+    :param maxPerProxy: the maximum number of calls in flight through one proxy
+    :param followUp (optional): a function taking (target, method, error) that returns more jobs to queue
+    :param maxQueued (optional): the maximum number of jobs read from jobs but not started yet, maxConcurrency by default.
+    Jobs queued by followUp are not limited
+    :return: a generator of (target, method, data, error, elapsed) tuples in the order the calls finish
+    """
+    _checkLimits(maxConcurrency, maxPerProxy)
+    jobs = iter(jobs)
+    if maxQueued is None:
+        maxQueued = maxConcurrency
+    queues = {}  # proxy key -> deque of jobs waiting for that proxy
+    queued = 0  # jobs in queues
+    exhausted = False  # whether every job has been read
+    inFlight = {}  # proxy key -> number of calls in flight through that proxy
+    running = {}  # future -> (target, method, start time)
+
+    def submit() -> bool:
+        """Start the queued jobs whose proxy has room, return whether any was started"""
+        nonlocal queued
+        started = False
+        for key in list(queues):
+            if len(running) >= maxConcurrency:
+                break
+            queue = queues[key]
+            while queue and inFlight.get(key, 0) < maxPerProxy and len(running) < maxConcurrency:
+                target, method = queue.popleft()
+                future = pool.submit(call, target, method)
+                running[future] = (target, method, time.perf_counter())
+                inFlight[key] = inFlight.get(key, 0) + 1
+                queued -= 1
+                started = True
+            if not queue:
+                del queues[key]
+        return started
+
+    with ThreadPoolExecutor(max_workers=maxConcurrency) as pool:
+        while True:
+            started = True
+            while started:
+                while not exhausted and queued < maxQueued:
+                    try:
+                        target, method = next(jobs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    queues.setdefault(target.proxyKey, deque()).append((target, method))
+                    queued += 1
+                started = submit()
+            if not running:
+                break  # a queued job would have been started, so every job is done
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                target, method, start = running.pop(future)
+                inFlight[target.proxyKey] -= 1
+                elapsed = time.perf_counter() - start
+
+                error = future.exception()
+                data = None if error is not None else future.result()
+
+                if followUp is not None:
+                    for job in followUp(target, method, error):
+                        queues.setdefault(job[0].proxyKey, deque()).append(job)
+                        queued += 1
+
+                yield target, method, data, error, elapsed
+
+
+class FleetAccount:
+    """
+    One account in a Fleet.
+    Holds the token, proxy and the User object used for the account.
+    """
+
+    def __init__(self, token: str, proxy: dict, user: User):
+        """
+        Initialise the account
+        :param token: oauth-refresh-token of the account
+        :param proxy: the proxy the account uses
+        :param user: the User object for the account, may be None until the account is first used
+        """
+        self.token = token
+        self.proxy = proxy
+        self.user = user
+        self.loggedIn = False
+        self.restored = False  # logged in from a saved session, not checked by a request yet
+        self.proxyKey = _proxyKey(proxy)
+
+    def __repr__(self):
+        return "FleetAccount(token=..." + self.token[-4:] + ", proxy=" + repr(self.proxy) + ")"
+
+
+class Fleet:
+    """
+    Polls many EarnApp accounts using a bounded pool of worker threads.
+    Concurrency is limited globally and per proxy, and results are yielded as soon as each call finishes.
+    """
+
+    def __init__(
+        self,
+        accounts,
+        methods=("money", "devices", "onlineStatus"),
+        maxConcurrency: int = 32,
+        maxPerProxy: int = 4,
+        timeout: int = 10,
+        session=None,
+        xsrfCache=None,
+        sessionStore=None
+    ):
+        """
+        Initialise the fleet
+        :param accounts: an iterable of (token, proxy) pairs, proxy may be None
+        :param methods (optional): names of the User methods to call on every poll
+        :param maxConcurrency (optional): the maximum number of calls in flight across the whole fleet, at least 1
+        :param maxPerProxy (optional): the maximum number of calls in flight through a single proxy, at least 1
+        :param timeout (optional): the timeout for every request
+        :param session (optional): a session from createSession shared by every account, one is created if not given
+        :param xsrfCache (optional): an earnapp.xsrf.XSRFTokenCache shared by every account
+        :param sessionStore (optional): an earnapp.sessionstore.FileSessionStore to restore logins from and save them to,
+        accounts with a saved session are not logged in again
+        """
+        _checkLimits(maxConcurrency, maxPerProxy)
+        self._ownsSession = session is None
+        if session is None:
+            session = createSession(poolSize=maxConcurrency)
+        self.session = session
+        self.methods = tuple(methods)
+        self.maxConcurrency = maxConcurrency
+        self.maxPerProxy = maxPerProxy
+        self.sessionStore = sessionStore
+
+        self.accounts = []
+        for token, proxy in accounts:
+            user = User(proxy=proxy, timeout=timeout, session=session, xsrfCache=xsrfCache)
+            account = FleetAccount(token, proxy or {}, user)
+            if sessionStore is not None and user.restoreSession(sessionStore, accountKey(token), token):
+                account.loggedIn = account.restored = True
+            self.accounts.append(account)
+
+    def _run(self, jobs, pollAfterLogin: bool = True):
+        """
+        Run (account, method) jobs, never exceeding the global and per proxy limits.
+        :param jobs: an iterable of (account, method) pairs
+        :param pollAfterLogin (optional): whether a successful login job queues the account's poll methods
+        :return: a generator of FleetResult
+        """
+        def call(account, method):
+            if method == "login":
+                return account.user.login(account.token)
+            return getattr(account.user, method)()
+
+        def followUp(account, method, error):
+            if method != "login":
+                if account.restored and isinstance(error, IncorrectTokenException):
+                    # the saved session has expired, log in again once with a new XSRF token
+                    account.loggedIn = account.restored = False
+                    account.user.xsrfTokenTime = 0
+                    return [(account, "login")]
+                if error is None:
+                    account.restored = False
+                return ()
+            if error is not None:
+                return ()
+            account.loggedIn = True
+            if self.sessionStore is not None:
+                account.user.saveSession(self.sessionStore, accountKey(account.token))
+            if not pollAfterLogin:
+                return ()
+            return [(account, pollMethod) for pollMethod in self.methods]
+
+        for account, method, data, error, elapsed in _dispatch(jobs, call, self.maxConcurrency, self.maxPerProxy, followUp):
+            yield FleetResult(account, method, data, error, elapsed)
+
+    def login(self):
+        """
+        Log in every account that is not logged in yet, without polling them: call pollOnce or poll for that
+        :return: a generator of FleetResult for the login calls only
+        """
+        return self._run(
+            ((account, "login") for account in self.accounts if not account.loggedIn),
+            pollAfterLogin=False
+        )
+
+    def saveSessions(self):
+        """
+        Save the session of every logged in account to the session store, for example before exiting,
+        so the XSRF tokens saved are as fresh as possible
+        """
+        if self.sessionStore is None:
+            raise ValueError("The fleet has no session store")
+        for account in self.accounts:
+            if account.loggedIn:
+                account.user.saveSession(self.sessionStore, accountKey(account.token))
+
+    def pollOnce(self):
+        """
+        Call every poll method once on every account.
+        Accounts that are not logged in are logged in first, and only polled if that succeeds.
+        :return: a generator of FleetResult
+        """
+        jobs = []
+        for account in self.accounts:
+            if account.loggedIn:
+                jobs.extend((account, method) for method in self.methods)
+            else:
+                jobs.append((account, "login"))
+        return self._run(jobs)
+
+    def poll(self, interval: float = 60, rounds: int = None):
+        """
+        Poll the fleet repeatedly, starting a new round every interval seconds.
+        :param interval (optional): seconds between the start of each round, default 60
+        :param rounds (optional): the number of rounds to run, runs forever by default
+        :return: a generator of FleetResult
+        """
+        count = 0
+        while rounds is None or count < rounds:
+            start = time.monotonic()
+            yield from self.pollOnce()
+            count += 1
+            if rounds is not None and count >= rounds:
+                break
+            time.sleep(max(0, interval - (time.monotonic() - start)))
+
+    def close(self):
+        """
+        Close the session if it was created by the fleet, a session passed in is left open
+        """
+        if self._ownsSession:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+ClientFleetResult = namedtuple("ClientFleetResult", ["device", "method", "data", "error", "elapsed"])
+ClientFleetResult.__doc__ = """
+The result of one call made by a ClientFleet.
+device is the FleetDevice the call was made for, method is the Client method name that was called.
+data is the return value of the call, or None if it raised, in which case error holds the exception.
+elapsed is the time the call took in seconds.
+"""
+
+
+class FleetDevice:
+    """
+    One device in a ClientFleet.
+    Holds the proxy and the Client object used for the device.
+    """
+
+    def __init__(self, client: Client, proxy: dict):
+        """
+        Initialise the device
+        :param client: the Client object for the device
+        :param proxy: the proxy the device uses
+        """
+        self.client = client
+        self.proxy = proxy
+        self.proxyKey = _proxyKey(proxy)
+
+    @property
+    def uuid(self) -> str:
+        """The device uuid"""
+        return self.client.uuid
+
+    def __repr__(self):
+        return "FleetDevice(uuid=" + repr(self.uuid) + ", proxy=" + repr(self.proxy) + ")"
+
+
+class ClientFleet:
+    """
+    Runs client API checks such as isLinked and isIPBlocked for many devices over one pooled session.
+    Concurrency is limited globally and per proxy, and results are yielded as soon as each call finishes.
+    """
+
+    def __init__(
+        self,
+        devices,
+        checks=("isLinked", "isIPBlocked"),
+        maxConcurrency: int = 32,
+        maxPerProxy: int = 4,
+        timeout: int = 10,
+        session=None
+    ):
+        """
+        Initialise the fleet
+        :param devices: an iterable of (uuid, version, arch, appid) or (uuid, version, arch, appid, proxy) tuples
+        :param checks (optional): names of the Client methods to call for every device
+        :param maxConcurrency (optional): the maximum number of calls in flight across the whole fleet, at least 1
+        :param maxPerProxy (optional): the maximum number of calls in flight through a single proxy, at least 1
+        :param timeout (optional): the timeout for every request
+        :param session (optional): a session from createSession shared by every device, one is created if not given
+        """
+        _checkLimits(maxConcurrency, maxPerProxy)
+        self._ownsSession = session is None
+        if session is None:
+            session = createSession(poolSize=maxConcurrency)
+        self.session = session
+        self.checks = tuple(checks)
+        self.maxConcurrency = maxConcurrency
+        self.maxPerProxy = maxPerProxy
+
+        self.devices = []
+        for device in devices:
+            uuid, version, arch, appid = device[:4]
+            proxy = (device[4] if len(device) > 4 else None) or {}
+            client = Client(uuid, version, arch, appid, proxy=proxy, timeout=timeout, session=session)
+            self.devices.append(FleetDevice(client, proxy))
+
+    def check(self, checks=None):
+        """
+        Call every check once for every device
+        :param checks (optional): names of the Client methods to call, defaults to the fleet's checks
+        :return: a generator of ClientFleetResult
+        """
+        checks = self.checks if checks is None else tuple(checks)
+        jobs = [(device, method) for device in self.devices for method in checks]
+
+        def call(device, method):
+            return getattr(device.client, method)()
+
+        for device, method, data, error, elapsed in _dispatch(jobs, call, self.maxConcurrency, self.maxPerProxy):
+            yield ClientFleetResult(device, method, data, error, elapsed)
+
+    def close(self):
+        """
+        Close the session if it was created by the fleet, a session passed in is left open
+        """
+        if self._ownsSession:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,159 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Hedged requests: if a GET has not been answered after the usual (p95) latency of its endpoint,
+# a second copy is sent and whichever answers first is used
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import time
+
+
+def _closeResponse(future):
+    """Close the response of a hedged request that lost the race"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class HedgePolicy:
+    """
+    Sends a second copy of a slow GET request and uses whichever copy answers first.
+    The delay before the second copy is the given percentile of the recent latencies of the endpoint,
+    so only the slowest few percent of requests are hedged and the extra load stays small.
+    The second copy is sent on another pooled connection, or through another proxy if the session is a ProxyPool and the request is not pinned to one.
+    Can be shared between users and clients, latencies are kept per endpoint.
+    """
+
+    def __init__(
+        self,
+        delay: float = None,
+        percentile: float = 0.95,
+        window: int = 200,
+        minSamples: int = 20,
+        defaultDelay: float = 1.0,
+        minDelay: float = 0.005,
+        maxWorkers: int = 128
+    ):
+        """
+        Initialise the policy
+        :param delay (optional): a fixed delay in seconds before the second copy, measured per endpoint by default
+        :param percentile (optional): the latency percentile to use as the delay, default 0.95
+        :param window (optional): the number of recent latencies kept per endpoint, default 200
+        :param minSamples (optional): latencies needed before the percentile is used, default 20
+        :param defaultDelay (optional): the delay used until there are enough latencies, default 1 second
+        :param minDelay (optional): the shortest delay used, default 5 milliseconds
+        :param maxWorkers (optional): the most requests that can be in flight through the policy at once, default 128
+        """
+        self.delay = delay
+        self.percentile = percentile
+        self.window = window
+        self.minSamples = minSamples
+        self.defaultDelay = defaultDelay
+        self.minDelay = minDelay
+        self._executor = ThreadPoolExecutor(maxWorkers, thread_name_prefix="earnapp-hedge")
+        self._lock = threading.Lock()
+        self._latencies = {}  # endpoint key -> deque of recent latencies
+        self._counts = {}  # endpoint key -> number of latencies ever measured
+        self._delays = {}  # endpoint key -> (number of latencies when computed, delay)
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedgeWins = 0
+
+    def delayFor(self, key) -> float:
+        """
+        :param key: the endpoint key
+        :return: seconds to wait before sending the second copy of a request
+        """
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None or len(latencies) < self.minSamples:
+                return self.defaultDelay
+            count = self._counts.get(key, 0)
+            cached = self._delays.get(key)
+            if cached is not None and count - cached[0] < 10:  # recomputed every 10 requests
+                return cached[1]
+            ordered = sorted(latencies)
+            delay = max(self.minDelay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+            self._delays[key] = (count, delay)
+            return delay
+
+    def _timed(self, key, send):
+        start = time.monotonic()
+        result = send()
+        elapsed = time.monotonic() - start
+        with self._lock:
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = deque(maxlen=self.window)
+                self._counts[key] = 0
+            latencies.append(elapsed)
+            self._counts[key] += 1
+        return result
+
+    def run(self, key, send):
+        """
+        Call send, and call it again if it takes longer than the hedge delay
+        :param key: the endpoint key latencies are kept under
+        :param send: a function that sends the request and returns the response, it must be safe to call twice
+        :return: the first response, the other one is closed when it arrives
+        """
+        with self._lock:
+            self.requests += 1
+        delay = self.delayFor(key)
+
+        first = self._executor.submit(self._timed, key, send)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.hedged += 1
+        second = self._executor.submit(self._timed, key, send)
+
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.add_done_callback(_closeResponse)
+                    if future is second:
+                        with self._lock:
+                            self.hedgeWins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self) -> dict:
+        """
+        :return: a dictionary of the number of requests, how many were hedged, how often the second copy won,
+        and the current delay of every endpoint
+        """
+        keys = list(self._latencies)
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedgeWins": self.hedgeWins,
+            "delays": {key: self.delayFor(key) for key in keys},
+        }
+
+    def close(self):
+        """
+        Stop the worker threads once the requests in flight have finished
+        """
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,80 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# The JSON decoder used for every API response
+# orjson or ujson are used when installed, the standard library json module otherwise
+
+import importlib
+
+# backends tried in order when no decoder has been set
+backends = ("orjson", "ujson", "json")
+
+_loads = None
+_name = None
+
+
+def _importBackend(name: str):
+    """
+    Import a JSON module by name
+    :param name: orjson, ujson or json
+    :return: its loads function
+    """
+    if name not in backends:
+        raise ValueError("JSON backend must be one of " + ", ".join(backends))
+    return importlib.import_module(name).loads
+
+
+def setDecoder(decoder=None):
+    """
+    Set the function used to decode API responses.
+    A custom decoder is called with the response body as bytes and must raise ValueError on invalid JSON,
+    which every backend's decode error is a subclass of.
+    :param decoder (optional): a backend name (orjson, ujson or json), a function, or None to pick the fastest installed backend
+    """
+    global _loads, _name
+
+    if callable(decoder):
+        _loads, _name = decoder, getattr(decoder, "__module__", None) or repr(decoder)
+        return
+
+    if decoder is not None:
+        _loads, _name = _importBackend(decoder), decoder
+        return
+
+    for name in backends:
+        try:
+            _loads, _name = _importBackend(name), name
+            return
+        except ImportError:
+            continue
+
+
+def decoderName() -> str:
+    """
+    :return: the name of the decoder in use, for example orjson
+    """
+    if _loads is None:
+        setDecoder()
+    return _name
+
+
+def loads(data):
+    """
+    Decode JSON with the current decoder, picking one on first use
+    :param data: the JSON document as bytes or str
+    :return: the decoded data
+    :raises ValueError: if the data is not valid JSON
+    """
+    if _loads is None:
+        setDecoder()
+    return _loads(data)
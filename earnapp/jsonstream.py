@@ -0,0 +1,137 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Incremental decoding of large JSON arrays, one item at a time
+
+import codecs
+import json
+
+from earnapp.earnapp import JSONDecodeErrorException
+
+_whitespace = " \t\n\r"
+_numberCharacters = "0123456789.eE+-"
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """
+    A text buffer filled from an iterable of byte chunks.
+    Text that has been parsed is dropped so the buffer only holds the item being decoded.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """
+        Read the next chunk into the buffer
+        :return: False if there was nothing left to read
+        """
+        if self.eof:
+            return False
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        self.buffer = self.buffer[self.pos:] + self._utf8.decode(b"", final=True)
+        self.pos = 0
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and get the next character without consuming it
+        :return: the character, or an empty string at the end of the input
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, characters: str) -> str:
+        """
+        Consume the next character, which must be one of characters
+        :return: the character
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise JSONDecodeErrorException("Failed to decode JSON data: expected one of " + repr(characters) + " at " + repr(self.buffer[self.pos:self.pos + 20]))
+        self.pos += 1
+        return character
+
+    def value(self):
+        """
+        Decode the next complete JSON value, reading more chunks until it is complete
+        :return: the decoded value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise JSONDecodeErrorException("Failed to decode JSON data: " + self.buffer[self.pos:self.pos + 100])
+            # a number at the end of the buffer may continue in the next chunk
+            if isinstance(value, (int, float)) and not self.eof:
+                if end == len(self.buffer) or self.buffer[end] in _numberCharacters:
+                    if self.fill():
+                        continue
+            self.pos = end
+            return value
+
+
+def iterArrayItems(chunks, key: str = None):
+    """
+    Decode a JSON array from byte chunks, yielding its items one by one.
+    Only one item is held in memory at a time, whatever the size of the array.
+    :param chunks: an iterable of bytes, for example response.iter_content()
+    :param key (optional): if the document is an object, the key of the array inside it
+    :return: a generator of decoded items, raises JSONDecodeErrorException if the body is not valid JSON,
+    is cut short, or is an object without the key
+    """
+    reader = _Reader(chunks)
+
+    if reader.peek() == "{":
+        reader.expect("{")
+        found = False
+        if reader.peek() != "}":
+            while not found:
+                name = reader.value()
+                reader.expect(":")
+                found = key is not None and name == key
+                if not found:
+                    reader.value()  # skip other keys
+                    if reader.expect(",}") == "}":
+                        break
+        if not found:
+            if key is None:
+                raise JSONDecodeErrorException("Failed to decode JSON data: expected an array, got an object")
+            raise JSONDecodeErrorException("Failed to decode JSON data: the object has no " + repr(key) + " key")
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(",]") == "]":
+            return
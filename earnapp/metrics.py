@@ -0,0 +1,377 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Hooks called around every HTTP request made by User, Client and getXSRFToken,
+# and a Metrics hook that keeps latency histograms and counters for Prometheus
+
+from bisect import bisect_left
+import threading
+import time
+
+# upper bounds in seconds of the latency histogram buckets
+defaultBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+hooks = []  # the registered hooks, requests are not instrumented while this is empty
+
+
+class RequestInfo:
+    """
+    Describes one HTTP request, passed to the before and after functions of every hook.
+    operation is "dashboard", "login", "xsrf" or "client". endpoint has device IDs replaced with {id}.
+    status, bytesReceived and retries are set once a response arrives, error if the request raised instead.
+    retries is the number of 429 responses retried by an earnapp.throttle.ThrottledAdapter.
+    Hooks can keep their own state for the request in context.
+    """
+
+    __slots__ = (
+        "operation", "method", "endpoint", "start", "elapsed", "status",
+        "bytesSent", "bytesReceived", "retries", "error", "context"
+    )
+
+    def __init__(self, operation: str, method: str, endpoint: str):
+        self.operation = operation
+        self.method = method
+        self.endpoint = endpoint
+        self.start = None
+        self.elapsed = None
+        self.status = None
+        self.bytesSent = 0
+        self.bytesReceived = 0
+        self.retries = 0
+        self.error = None
+        self.context = {}
+
+    def __repr__(self):
+        return "RequestInfo(" + self.operation + " " + self.method + " " + self.endpoint + ", status=" + str(self.status) + ")"
+
+
+def addHook(hook):
+    """
+    Register a hook to be called around every request.
+    A hook is any object with a before(info) and/or an after(info) function, which are given a RequestInfo.
+    after is called even if the request raised an exception. Exceptions raised by hooks are not caught.
+    :param hook: the hook to add
+    :return: the hook
+    """
+    if hook not in hooks:
+        hooks.append(hook)
+    return hook
+
+
+def removeHook(hook):
+    """
+    Unregister a hook
+    :param hook: the hook to remove
+    """
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def _endpointLabel(endpoint: str) -> str:
+    """
+    Get the endpoint name used in metrics, without query parameters or device IDs
+    :param endpoint: the endpoint, for example edit_device/sdk-node-1234?appid=earnapp
+    :return: the name, for example edit_device/{id}
+    """
+    endpoint = endpoint.split("?", 1)[0]
+    if "/" in endpoint:
+        return endpoint.split("/", 1)[0] + "/{id}"
+    return endpoint
+
+
+def instrumented(operation: str, method: str, endpoint: str, function, *args, **kwargs):
+    """
+    Send a request with function(*args, **kwargs), calling the registered hooks around it
+    :param operation: dashboard, login, xsrf or client
+    :param method: GET, POST, DELETE or PUT
+    :param endpoint: the endpoint requested
+    :param function: the function that sends the request and returns a requests.Response
+    :return: the response
+    """
+    if not hooks:
+        return function(*args, **kwargs)
+
+    current = list(hooks)
+    info = RequestInfo(operation, method, _endpointLabel(endpoint))
+    for hook in current:
+        before = getattr(hook, "before", None)
+        if before is not None:
+            before(info)
+
+    info.start = time.perf_counter()
+    try:
+        resp = function(*args, **kwargs)
+        info.status = resp.status_code
+        if resp.request is not None and resp.request.body:
+            info.bytesSent = len(resp.request.body)
+        if kwargs.get("stream"):  # reading the body here would download all of it
+            info.bytesReceived = int(resp.headers.get("Content-Length", 0))
+        else:
+            info.bytesReceived = len(resp.content)
+        info.retries = getattr(resp, "retries", 0)
+        return resp
+    except Exception as e:
+        info.error = e
+        raise
+    finally:
+        info.elapsed = time.perf_counter() - info.start
+        for hook in reversed(current):
+            after = getattr(hook, "after", None)
+            if after is not None:
+                after(info)
+
+
+class _Histogram:
+    """
+    Cumulative latency buckets, a sum and a count, like a Prometheus histogram
+    """
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets: tuple, value: float):
+        index = bisect_left(buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    """
+    Escape a Prometheus label value
+    """
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(name + "=\"" + _escape(value) + "\"" for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """
+    A hook that collects per-endpoint latency histograms, status codes, errors, 429s, XSRF refreshes,
+    retries and bytes transferred. Register it with install() or earnapp.metrics.addHook.
+    """
+
+    def __init__(self, buckets: tuple = defaultBuckets):
+        """
+        Initialise the metrics
+        :param buckets (optional): the upper bounds in seconds of the latency histogram buckets
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Set every metric back to zero
+        """
+        with self._lock:
+            self._latency = {}  # (operation, endpoint) -> _Histogram
+            self._statuses = {}  # (operation, endpoint, status) -> count
+            self._errors = {}  # (operation, endpoint, exception name) -> count
+            self._retries = {}  # operation -> count
+            self._bytesSent = {}  # operation -> bytes
+            self._bytesReceived = {}  # operation -> bytes
+
+    def install(self):
+        """
+        Start collecting metrics for every request
+        :return: self
+        """
+        addHook(self)
+        return self
+
+    def uninstall(self):
+        """
+        Stop collecting metrics
+        """
+        removeHook(self)
+
+    def after(self, info: RequestInfo):
+        key = (info.operation, info.endpoint)
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = _Histogram(len(self.buckets))
+            histogram.observe(self.buckets, info.elapsed)
+
+            if info.error is not None:
+                errorKey = key + (type(info.error).__name__,)
+                self._errors[errorKey] = self._errors.get(errorKey, 0) + 1
+            else:
+                statusKey = key + (info.status,)
+                self._statuses[statusKey] = self._statuses.get(statusKey, 0) + 1
+
+            operation = info.operation
+            self._retries[operation] = self._retries.get(operation, 0) + info.retries
+            self._bytesSent[operation] = self._bytesSent.get(operation, 0) + info.bytesSent
+            self._bytesReceived[operation] = self._bytesReceived.get(operation, 0) + info.bytesReceived
+
+    def _ratelimited(self) -> dict:
+        """
+        Count ratelimited responses per operation, call with the lock held
+        :return: a dictionary of operation to count
+        """
+        ratelimited = dict(self._retries)
+        for (operation, _, status), count in self._statuses.items():
+            if status == 429:
+                ratelimited[operation] = ratelimited.get(operation, 0) + count
+        return ratelimited
+
+    def stats(self) -> dict:
+        """
+        :return: a dictionary of request, status, 429, error, XSRF refresh, retry and byte counts, and latency per endpoint
+        """
+        with self._lock:
+            requests = sum(histogram.count for histogram in self._latency.values())
+            # a retried 429 is not the final status of a request, but was still ratelimited
+            ratelimited = sum(self._ratelimited().values())
+            statuses = {}
+            for (_, _, status), count in self._statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+            return {
+                "requests": requests,
+                "statuses": statuses,
+                "ratelimited": ratelimited,
+                "ratelimitRate": ratelimited / (requests + sum(self._retries.values())) if requests else 0.0,
+                "errors": sum(self._errors.values()),
+                "xsrfRefreshes": sum(h.count for (operation, _), h in self._latency.items() if operation == "xsrf"),
+                "retries": sum(self._retries.values()),
+                "bytesSent": sum(self._bytesSent.values()),
+                "bytesReceived": sum(self._bytesReceived.values()),
+                "endpoints": {
+                    operation + " " + endpoint: {"count": h.count, "meanLatency": h.sum / h.count if h.count else 0.0}
+                    for (operation, endpoint), h in self._latency.items()
+                },
+            }
+
+    def prometheus(self, prefix: str = "earnapp") -> str:
+        """
+        Export the metrics in the Prometheus text exposition format
+        :param prefix (optional): the prefix of every metric name, default earnapp
+        :return: the metrics text, for example to serve on a /metrics endpoint
+        """
+        lines = []
+
+        def header(name: str, kind: str, description: str):
+            lines.append("# HELP " + prefix + "_" + name + " " + description)
+            lines.append("# TYPE " + prefix + "_" + name + " " + kind)
+
+        with self._lock:
+            header("request_duration_seconds", "histogram", "Time taken by requests to the EarnApp API.")
+            name = prefix + "_request_duration_seconds"
+            for (operation, endpoint), histogram in sorted(self._latency.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(name + "_bucket" + _labels(operation=operation, endpoint=endpoint, le=repr(bound)) + " " + str(cumulative))
+                lines.append(name + "_bucket" + _labels(operation=operation, endpoint=endpoint, le="+Inf") + " " + str(histogram.count))
+                lines.append(name + "_sum" + _labels(operation=operation, endpoint=endpoint) + " " + repr(histogram.sum))
+                lines.append(name + "_count" + _labels(operation=operation, endpoint=endpoint) + " " + str(histogram.count))
+
+            header("responses_total", "counter", "Responses received, by status code.")
+            for (operation, endpoint, status), count in sorted(self._statuses.items()):
+                lines.append(prefix + "_responses_total" + _labels(operation=operation, endpoint=endpoint, status=status) + " " + str(count))
+
+            header("ratelimited_total", "counter", "Responses with status 429, including retried ones.")
+            for operation, count in sorted(self._ratelimited().items()):
+                lines.append(prefix + "_ratelimited_total" + _labels(operation=operation) + " " + str(count))
+
+            header("request_errors_total", "counter", "Requests that raised an exception instead of returning a response.")
+            for (operation, endpoint, error), count in sorted(self._errors.items()):
+                lines.append(prefix + "_request_errors_total" + _labels(operation=operation, endpoint=endpoint, error=error) + " " + str(count))
+
+            header("xsrf_refreshes_total", "counter", "XSRF tokens fetched from /sec/rotate_xsrf.")
+            xsrf = sum(h.count for (operation, _), h in self._latency.items() if operation == "xsrf")
+            lines.append(prefix + "_xsrf_refreshes_total " + str(xsrf))
+
+            for name, description, values in (
+                ("retries_total", "Ratelimited requests retried by a ThrottledAdapter.", self._retries),
+                ("sent_bytes_total", "Request body bytes sent.", self._bytesSent),
+                ("received_bytes_total", "Response body bytes received.", self._bytesReceived),
+            ):
+                header(name, "counter", description)
+                for operation, value in sorted(values.items()):
+                    lines.append(prefix + "_" + name + _labels(operation=operation) + " " + str(value))
+
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryHook:
+    """
+    A hook that records every request as an OpenTelemetry span, and its duration in a histogram if a meter is given.
+    Requires the opentelemetry-api package.
+    """
+
+    def __init__(self, tracer=None, meter=None):
+        """
+        Initialise the hook
+        :param tracer (optional): the tracer to create spans with, defaults to the global tracer provider's
+        :param meter (optional): a meter to record a earnapp.request.duration histogram with
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError("opentelemetry-api is required for OpenTelemetryHook, install it with: pip install earnapp[opentelemetry]")
+
+        self._trace = trace
+        self.tracer = tracer if tracer is not None else trace.get_tracer("earnapp")
+        self.duration = None
+        if meter is not None:
+            self.duration = meter.create_histogram("earnapp.request.duration", unit="s", description="Time taken by requests to the EarnApp API")
+
+    def install(self):
+        """
+        Start tracing every request
+        :return: self
+        """
+        addHook(self)
+        return self
+
+    def uninstall(self):
+        """
+        Stop tracing requests
+        """
+        removeHook(self)
+
+    def before(self, info: RequestInfo):
+        info.context["span"] = self.tracer.start_span(
+            "earnapp " + info.operation + " " + info.endpoint,
+            kind=self._trace.SpanKind.CLIENT,
+            attributes={"http.method": info.method, "earnapp.operation": info.operation, "earnapp.endpoint": info.endpoint}
+        )
+
+    def after(self, info: RequestInfo):
+        span = info.context.pop("span", None)
+        if span is not None:
+            if info.error is not None:
+                span.record_exception(info.error)
+                span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+            else:
+                span.set_attribute("http.status_code", info.status)
+                span.set_attribute("earnapp.retries", info.retries)
+                if info.status >= 400:
+                    span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+            span.end()
+
+        if self.duration is not None:
+            attributes = {"earnapp.operation": info.operation, "earnapp.endpoint": info.endpoint}
+            if info.status is not None:
+                attributes["http.status_code"] = info.status
+            self.duration.record(info.elapsed, attributes)
@@ -0,0 +1,281 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compact classes for the data returned by the EarnApp API
+# They use __slots__ so each object is much smaller than the dictionary it is made from
+
+from array import array
+import sys
+from datetime import datetime, timezone
+
+
+def toTimestamp(value) -> float:
+    """
+    Convert a date from the EarnApp API to a unix timestamp
+    :param value: an ISO 8601 string, or a unix timestamp in seconds or milliseconds
+    :return: seconds since the epoch, or 0.0 if the value is missing
+    """
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    date = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+class _Model:
+    """
+    Base class for the models.
+    _fields lists (attribute name, JSON key) pairs, any other keys in the JSON are kept in extra.
+    Strings in the attributes listed in _interned repeat a lot between objects, so only one copy of each is kept.
+    Models are equal when their data is, and can be kept in sets or used as dictionary keys.
+    The hash is made from the first field, such as the uuid of a device, so do not change it while the model is in a set.
+    """
+
+    __slots__ = ("extra",)
+    _fields = ()
+    _interned = ()
+
+    def __init__(self, **kwargs):
+        for name, _ in self._fields:
+            setattr(self, name, kwargs.get(name))
+        self.extra = kwargs.get("extra")
+
+    @classmethod
+    def fromJSON(cls, data: dict):
+        """
+        Create the model from a decoded JSON object
+        :param data: the JSON object
+        :return: the model
+        """
+        model = cls.__new__(cls)
+        remaining = dict(data)
+        for name, key in cls._fields:
+            setattr(model, name, remaining.pop(key, None))
+        for name in cls._interned:
+            value = getattr(model, name)
+            if isinstance(value, str):
+                setattr(model, name, sys.intern(value))
+        model.extra = remaining or None
+        return model
+
+    def toDict(self) -> dict:
+        """
+        Convert the model back to the JSON object it was made from
+        :return: the JSON object
+        """
+        data = {key: getattr(self, name) for name, key in self._fields}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.toDict() == other.toDict()
+
+    def __hash__(self):
+        # equal models have equal first fields, the other fields may hold lists and dictionaries which cannot be hashed
+        value = getattr(self, self._fields[0][0]) if self._fields else None
+        try:
+            return hash((type(self), value))
+        except TypeError:
+            return hash(type(self))
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(
+            name + "=" + repr(getattr(self, name)) for name, _ in self._fields
+        ) + ")"
+
+
+class Device(_Model):
+    """A device from User.devices()"""
+
+    __slots__ = ("uuid", "title", "appid", "bw", "totalBW", "redeemBW", "rate", "earned", "earnedTotal", "country", "ips")
+    _fields = (
+        ("uuid", "uuid"),
+        ("title", "title"),
+        ("appid", "appid"),
+        ("bw", "bw"),
+        ("totalBW", "total_bw"),
+        ("redeemBW", "redeem_bw"),
+        ("rate", "rate"),
+        ("earned", "earned"),
+        ("earnedTotal", "earned_total"),
+        ("country", "cn"),
+        ("ips", "ips"),
+    )
+    _interned = ("appid", "country")
+
+
+class MoneyInfo(_Model):
+    """The balance and earnings from User.money()"""
+
+    __slots__ = (
+        "balance", "earningsTotal", "multiplier", "redeemDetails", "refBonuses", "refBonusesTotal",
+        "promoBonuses", "promoBonusesTotal", "referralPart"
+    )
+    _fields = (
+        ("balance", "balance"),
+        ("earningsTotal", "earnings_total"),
+        ("multiplier", "multiplier"),
+        ("redeemDetails", "redeem_details"),
+        ("refBonuses", "ref_bonuses"),
+        ("refBonusesTotal", "ref_bonuses_total"),
+        ("promoBonuses", "promo_bonuses"),
+        ("promoBonusesTotal", "promo_bonuses_total"),
+        ("referralPart", "referral_part"),
+    )
+
+
+class Transaction(_Model):
+    """A payout from User.transactions()"""
+
+    __slots__ = (
+        "uuid", "status", "paymentMethod", "paymentDate", "date", "moneyAmount", "email",
+        "refBonusesAmount", "promoAmount"
+    )
+    _fields = (
+        ("uuid", "uuid"),
+        ("status", "status"),
+        ("paymentMethod", "payment_method"),
+        ("paymentDate", "payment_date"),
+        ("date", "date"),
+        ("moneyAmount", "money_amount"),
+        ("email", "email"),
+        ("refBonusesAmount", "ref_bonuses_amount"),
+        ("promoAmount", "promo_amount"),
+    )
+    _interned = ("status", "paymentMethod", "email")
+
+
+def iterUsageSteps(usage):
+    """
+    Iterate over the time steps of a User.usage() response.
+    The response is a list of time steps, optionally wrapped in a {"data": [...]} object.
+    Each step has a "date" and a "devices" object of device uuid to {"bw": bytes, "earned": dollars},
+    "devices" may also be a list of objects with a "uuid" key.
+    :param usage: the decoded usage response
+    :return: a generator of (timestamp, iterable of (device uuid, data point dictionary)) tuples
+    """
+    steps = usage.get("data", []) if isinstance(usage, dict) else usage
+    for step in steps:
+        timestamp = toTimestamp(step.get("date", step.get("ts")))
+        devices = step.get("devices") or {}
+        if isinstance(devices, dict):
+            yield timestamp, devices.items()
+        else:
+            yield timestamp, ((device.get("uuid"), device) for device in devices)
+
+
+def iterUsagePoints(usage):
+    """
+    Iterate over the data points of a User.usage() response, see iterUsageSteps
+    :param usage: the decoded usage response
+    :return: a generator of (timestamp, device uuid, bandwidth, earned) tuples
+    """
+    for timestamp, items in iterUsageSteps(usage):
+        for uuid, point in items:
+            yield timestamp, uuid, point.get("bw") or 0, point.get("earned") or 0.0
+
+
+class UsageSeries:
+    """
+    The usage of one device over time from User.usage().
+    timestamps, bw and earned are arrays of the same length, sorted by time in series made by fromUsage.
+    """
+
+    __slots__ = ("uuid", "timestamps", "bw", "earned")
+
+    def __init__(self, uuid: str):
+        self.uuid = uuid
+        self.timestamps = array("d")
+        self.bw = array("q")
+        self.earned = array("d")
+
+    def append(self, timestamp: float, bw: int, earned: float):
+        """
+        Add a data point to the end of the series
+        """
+        self.timestamps.append(timestamp)
+        self.bw.append(int(bw))
+        self.earned.append(float(earned))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _sortByTime(self):
+        """
+        Sort the data points by time, keeping points with the same time in the order they were added
+        """
+        timestamps = self.timestamps
+        if all(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)):
+            return  # the API sends the days in order, so this is the usual case
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        self.timestamps = array("d", (timestamps[i] for i in order))
+        self.bw = array("q", (self.bw[i] for i in order))
+        self.earned = array("d", (self.earned[i] for i in order))
+
+    def totalBW(self) -> int:
+        """
+        :return: the total bandwidth of the device in bytes
+        """
+        return sum(self.bw)
+
+    def totalEarned(self) -> float:
+        """
+        :return: the total earned by the device
+        """
+        return sum(self.earned)
+
+    def __repr__(self):
+        return "UsageSeries(uuid=" + repr(self.uuid) + ", points=" + str(len(self)) + ")"
+
+    @classmethod
+    def fromUsage(cls, usage) -> list:
+        """
+        Split a User.usage() response into one series per device, each sorted by time
+        :param usage: the decoded usage response
+        :return: a list of UsageSeries
+        """
+        series = {}
+        for timestamp, uuid, bw, earned in iterUsagePoints(usage):
+            deviceSeries = series.get(uuid)
+            if deviceSeries is None:
+                deviceSeries = series[uuid] = cls(uuid)
+            deviceSeries.append(timestamp, bw, earned)
+        for deviceSeries in series.values():
+            deviceSeries._sortByTime()
+        return list(series.values())
+
+
+def iterDevices(devices):
+    """
+    Lazily create Device objects from a User.devices() response
+    :param devices: the decoded devices response, a list of devices
+    :return: a generator of Device
+    """
+    for device in devices:
+        yield Device.fromJSON(device)
+
+
+def iterTransactions(transactions):
+    """
+    Lazily create Transaction objects from a User.transactions() response
+    :param transactions: the decoded transactions response, a list of transactions
+    :return: a generator of Transaction
+    """
+    for transaction in transactions:
+        yield Transaction.fromJSON(transaction)
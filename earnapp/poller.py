@@ -0,0 +1,199 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+from collections import namedtuple
+import time
+
+ChangeEvent = namedtuple("ChangeEvent", ["kind", "uuid", "old", "new", "delta"])
+ChangeEvent.__doc__ = """
+A change found by ChangePoller.
+kind is one of the *_ADDED, *_REMOVED, ... constants in this module.
+uuid is the device or transaction uuid, or None for balance changes.
+old and new are the values before and after the change, delta is new - old for numeric changes and None otherwise.
+"""
+
+DEVICE_ADDED = "device_added"
+DEVICE_REMOVED = "device_removed"
+DEVICE_RENAMED = "device_renamed"
+DEVICE_EARNINGS = "device_earnings"
+DEVICE_ONLINE = "device_online"
+DEVICE_OFFLINE = "device_offline"
+BALANCE_CHANGED = "balance_changed"
+EARNINGS_TOTAL_CHANGED = "earnings_total_changed"
+TRANSACTION_ADDED = "transaction_added"
+TRANSACTION_STATUS = "transaction_status"
+
+
+def _indexByUUID(items) -> dict:
+    """
+    Index a list of devices or transactions by uuid
+    :param items: a list of dictionaries with a uuid key
+    :return: a dictionary of uuid to item
+    """
+    return {item["uuid"]: item for item in items if "uuid" in item}
+
+
+def _onlineByUUID(statuses) -> dict:
+    """
+    Get the online state of every device from a User.onlineStatus() response.
+    The response maps device uuids to {"online": bool, ...}, optionally wrapped in a {"statuses": {...}} object.
+    :param statuses: the decoded online status response
+    :return: a dictionary of uuid to True/False
+    """
+    statuses = statuses.get("statuses", statuses)
+    online = {}
+    for uuid, status in statuses.items():
+        online[uuid] = bool(status.get("online")) if isinstance(status, dict) else bool(status)
+    return online
+
+
+def _delta(old, new):
+    """
+    :return: new - old if both are numbers, None otherwise
+    """
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return new - old
+    return None
+
+
+class ChangePoller:
+    """
+    Polls a logged in User and reports only what changed since the last poll.
+    The first poll records a snapshot and reports nothing.
+    Snapshots are indexed by device/transaction uuid so each poll is compared in one pass.
+    """
+
+    def __init__(
+        self,
+        user,
+        devices: bool = True,
+        onlineStatus: bool = True,
+        money: bool = True,
+        transactions: bool = True
+    ):
+        """
+        Initialise the poller
+        :param user: the logged in User to poll
+        :param devices (optional): whether to watch devices for added, removed, renamed and earnings changes
+        :param onlineStatus (optional): whether to watch devices going online and offline
+        :param money (optional): whether to watch the balance and total earnings
+        :param transactions (optional): whether to watch for new transactions and status changes
+        """
+        self.user = user
+        self.watchDevices = devices
+        self.watchOnlineStatus = onlineStatus
+        self.watchMoney = money
+        self.watchTransactions = transactions
+
+        self.devices = None  # uuid -> device
+        self.online = None  # uuid -> bool
+        self.money = None
+        self.transactions = None  # uuid -> transaction
+
+    def _diffDevices(self, devices: dict, events: list):
+        """Add device added, removed, renamed and earnings events"""
+        old = self.devices
+        for uuid, device in devices.items():
+            previous = old.get(uuid)
+            if previous is None:
+                events.append(ChangeEvent(DEVICE_ADDED, uuid, None, device, None))
+                continue
+            if previous.get("title") != device.get("title"):
+                events.append(ChangeEvent(DEVICE_RENAMED, uuid, previous.get("title"), device.get("title"), None))
+            oldEarned, newEarned = previous.get("earned_total"), device.get("earned_total")
+            if oldEarned != newEarned:
+                events.append(ChangeEvent(DEVICE_EARNINGS, uuid, oldEarned, newEarned, _delta(oldEarned, newEarned)))
+        for uuid in old.keys() - devices.keys():
+            events.append(ChangeEvent(DEVICE_REMOVED, uuid, old[uuid], None, None))
+
+    def _diffOnline(self, online: dict, events: list):
+        """Add device online and offline events"""
+        old = self.online
+        for uuid, isOnline in online.items():
+            wasOnline = old.get(uuid)
+            if wasOnline is None or wasOnline == isOnline:
+                continue
+            events.append(ChangeEvent(DEVICE_ONLINE if isOnline else DEVICE_OFFLINE, uuid, wasOnline, isOnline, None))
+        for uuid in old.keys() - online.keys():
+            if old[uuid]:  # a device that was online and is no longer listed has gone offline
+                events.append(ChangeEvent(DEVICE_OFFLINE, uuid, True, False, None))
+
+    def _diffMoney(self, money: dict, events: list):
+        """Add balance and total earnings events"""
+        for key, kind in (("balance", BALANCE_CHANGED), ("earnings_total", EARNINGS_TOTAL_CHANGED)):
+            old, new = self.money.get(key), money.get(key)
+            if old != new:
+                events.append(ChangeEvent(kind, None, old, new, _delta(old, new)))
+
+    def _diffTransactions(self, transactions: dict, events: list):
+        """Add new transaction and transaction status events"""
+        old = self.transactions
+        for uuid, transaction in transactions.items():
+            previous = old.get(uuid)
+            if previous is None:
+                events.append(ChangeEvent(TRANSACTION_ADDED, uuid, None, transaction, None))
+            elif previous.get("status") != transaction.get("status"):
+                events.append(ChangeEvent(TRANSACTION_STATUS, uuid, previous.get("status"), transaction.get("status"), None))
+
+    def poll(self) -> list:
+        """
+        Fetch the watched data and compare it with the last snapshot.
+        Everything is fetched before anything is compared, and the snapshots are only replaced when every fetch
+        succeeded, so a failed poll raises without losing any change: the next poll reports it.
+        :return: a list of ChangeEvent, empty on the first poll
+        """
+        devices = _indexByUUID(self.user.devices()) if self.watchDevices else None
+        online = _onlineByUUID(self.user.onlineStatus()) if self.watchOnlineStatus else None
+        money = self.user.money() if self.watchMoney else None
+        transactions = _indexByUUID(self.user.transactions()) if self.watchTransactions else None
+
+        events = []
+        if devices is not None:
+            if self.devices is not None:
+                self._diffDevices(devices, events)
+            self.devices = devices
+
+        if online is not None:
+            if self.online is not None:
+                self._diffOnline(online, events)
+            self.online = online
+
+        if money is not None:
+            if self.money is not None:
+                self._diffMoney(money, events)
+            self.money = money
+
+        if transactions is not None:
+            if self.transactions is not None:
+                self._diffTransactions(transactions, events)
+            self.transactions = transactions
+
+        return events
+
+    def watch(self, interval: float = 60, onError=None):
+        """
+        Poll forever, yielding changes as they are found.
+        A poll that raises is skipped and tried again after the interval, the changes it missed are reported then.
+        :param interval (optional): seconds between the start of each poll, default 60
+        :param onError (optional): a function called with the exception of every failed poll
+        :return: a generator of ChangeEvent
+        """
+        while True:
+            start = time.monotonic()
+            try:
+                events = self.poll()
+            except Exception as e:
+                events = []
+                if onError is not None:
+                    onError(e)
+            yield from events
+            time.sleep(max(0, interval - (time.monotonic() - start)))
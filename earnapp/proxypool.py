@@ -0,0 +1,280 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A pool of proxies that sends every request through the healthiest one and fails over to the next
+# A ProxyPool is used in place of a session: User(session=ProxyPool([...]))
+
+import threading
+import time
+
+import requests
+
+from earnapp.earnapp import createSession, _proxyKey
+from earnapp.throttle import _isRatelimited, _parseRetryAfter
+
+# errors that mean the request never reached EarnApp, so any request can be sent again through another proxy
+_connectErrors = (
+    requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout, requests.exceptions.SSLError, ConnectionRefusedError
+)
+
+
+class NoProxyAvailableException(requests.exceptions.ConnectionError):
+    """Raised when every proxy in a pool is cooling down."""
+
+    def __init__(self, message: str, retryAfter: float):
+        super().__init__(message)
+        self.retryAfter = retryAfter  # seconds until the first proxy comes out of its cooldown
+
+
+class _ProxyHealth:
+    """The health of one proxy in a pool"""
+
+    __slots__ = (
+        "proxy", "latency", "successRate", "consecutiveFailures", "cooldownUntil", "inFlight",
+        "requests", "failures", "ratelimited", "cooldowns"
+    )
+
+    def __init__(self, proxy: dict):
+        self.proxy = proxy
+        self.latency = None  # moving average in seconds, None until the first response
+        self.successRate = 1.0  # moving average of successful requests
+        self.consecutiveFailures = 0
+        self.cooldownUntil = 0.0
+        self.inFlight = 0
+        self.requests = 0
+        self.failures = 0
+        self.ratelimited = 0
+        self.cooldowns = 0
+
+    def score(self) -> float:
+        """
+        :return: the expected cost of sending a request through the proxy, lower is better
+        """
+        latency = self.latency if self.latency is not None else 0.0  # try new proxies first
+        return latency * (1 + self.inFlight) / max(self.successRate, 0.05) + self.inFlight * 1e-6
+
+
+class ProxyPool:
+    """
+    Sends every request through the healthiest of several proxies, used as the session of User, Client,
+    XSRFTokenCache or Fleet. The latency and success rate of every proxy are measured, and a request goes
+    to the proxy with the lowest latency per success, taking the requests already in flight into account.
+    A proxy that answers 429 or fails several times in a row is taken out of rotation for a cooldown.
+    Failed requests are sent again through the next best proxy, so a bad proxy costs one attempt, not the call.
+    User picks the proxy with pick before fetching its XSRF token and pins the request to it, since the token
+    is only valid through the proxy it was fetched through: pinned requests are not failed over.
+    A request is never sent through a proxy that is cooling down: if every proxy is, NoProxyAvailableException is raised
+    straight away, and if the proxies left for a retry are, the last 429 response or error is given back instead.
+    """
+
+    def __init__(
+        self,
+        proxies,
+        session: requests.Session = None,
+        cooldown: float = 60,
+        maxFailures: int = 3,
+        maxAttempts: int = 3,
+        smoothing: float = 0.2
+    ):
+        """
+        Initialise the pool
+        :param proxies: an iterable of proxy dictionaries like the ones given to User.setProxy
+        :param session (optional): the session to send requests with, from createSession by default
+        :param cooldown (optional): seconds a proxy is left out after a 429 without Retry-After or after maxFailures failures, default 60
+        :param maxFailures (optional): consecutive timeouts or connection errors before a proxy cools down, default 3
+        :param maxAttempts (optional): the number of proxies a request is tried through before giving up, default 3
+        :param smoothing (optional): the weight of the newest request in the latency and success averages, default 0.2
+        """
+        self._proxies = [_ProxyHealth(dict(proxy)) for proxy in proxies]
+        if not self._proxies:
+            raise ValueError("A proxy pool needs at least one proxy")
+        self._byKey = {_proxyKey(health.proxy): health for health in self._proxies}
+        if session is None:
+            session = createSession(poolSize=max(10, len(self._proxies)))
+        self.session = session
+        self.cooldown = cooldown
+        self.maxFailures = maxFailures
+        self.maxAttempts = maxAttempts
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def _noProxyAvailable(self, proxies: list) -> NoProxyAvailableException:
+        """
+        :param proxies: the proxies that are all cooling down
+        :return: the exception to raise
+        """
+        retryAfter = min(health.cooldownUntil for health in proxies) - time.monotonic()
+        if len(proxies) == 1 and len(self._proxies) > 1:
+            message = "The proxy the request is pinned to is cooling down, it is available again in %.1f seconds"
+        else:
+            message = "Every proxy is cooling down, the first is available again in %.1f seconds"
+        return NoProxyAvailableException(message % retryAfter, max(0.0, retryAfter))
+
+    def pick(self, prefer: dict = None) -> dict:
+        """
+        Pick the proxy for a request without sending it, for callers that must fetch something through the same proxy
+        first, such as an XSRF token. Passing the result as the proxies argument of request pins the request to it.
+        :param prefer (optional): a proxy to keep using while it is not cooling down and its last request did not fail
+        :return: a dictionary containing the proxy
+        """
+        with self._lock:
+            now = time.monotonic()
+            health = self._byKey.get(_proxyKey(prefer)) if prefer else None
+            if health is not None and health.cooldownUntil <= now and not health.consecutiveFailures:
+                return health.proxy
+            available = [health for health in self._proxies if health.cooldownUntil <= now]
+            if not available:
+                raise self._noProxyAvailable(self._proxies)
+            return min(available, key=_ProxyHealth.score).proxy
+
+    def _choose(self, exclude: list, pinned: _ProxyHealth = None):
+        """
+        Pick the proxy for the next attempt and count it as in flight
+        :param exclude: proxies already tried for this request
+        :param pinned (optional): the only proxy the request may be sent through
+        :return: the healthiest available proxy, or None if all of them are cooling down
+        """
+        with self._lock:
+            now = time.monotonic()
+            if pinned is not None:
+                candidates = [pinned]
+            else:
+                candidates = [health for health in self._proxies if health not in exclude] or self._proxies
+            available = [health for health in candidates if health.cooldownUntil <= now]
+            if not available:
+                return None
+            best = min(available, key=_ProxyHealth.score)
+            if best.cooldownUntil:
+                # back from a cooldown, give it a trial without trusting its old record
+                best.cooldownUntil = 0.0
+                best.consecutiveFailures = 0
+                best.successRate = max(best.successRate, 0.5)
+            best.inFlight += 1
+            best.requests += 1
+            return best
+
+    def _report(self, health: _ProxyHealth, elapsed: float, success: bool, cooldown: float = None):
+        """
+        Update the health of a proxy after an attempt
+        :param health: the proxy
+        :param elapsed: seconds the attempt took
+        :param success: whether the proxy gave a usable response, None if the attempt was interrupted
+        and says nothing about the proxy
+        :param cooldown (optional): seconds to take the proxy out of rotation for
+        """
+        with self._lock:
+            health.inFlight -= 1
+            if success is None:
+                return
+            alpha = self.smoothing
+            health.successRate += alpha * ((1.0 if success else 0.0) - health.successRate)
+            if success:
+                health.latency = elapsed if health.latency is None else health.latency + alpha * (elapsed - health.latency)
+                health.consecutiveFailures = 0
+                return
+
+            health.failures += 1
+            health.consecutiveFailures += 1
+            if cooldown is None and health.consecutiveFailures >= self.maxFailures:
+                cooldown = self.cooldown
+            if cooldown is not None:
+                health.cooldownUntil = time.monotonic() + cooldown
+                health.cooldowns += 1
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the healthiest proxy, taking the same arguments as requests.Session.request.
+        If the proxies argument is one of the pool's proxies, for example from pick, the request is only sent through it,
+        otherwise it is replaced by the pool's choice.
+        :return: the response
+        """
+        pinned = self._byKey.get(_proxyKey(kwargs.get("proxies"))) if kwargs.get("proxies") else None
+        tried = []
+        lastResp = None  # the 429 response of the previous attempt
+        lastError = None  # the exception of the previous attempt
+        while True:
+            health = self._choose(tried, pinned)
+            if health is None:
+                if lastResp is not None:
+                    return lastResp
+                if lastError is not None:
+                    raise lastError
+                raise self._noProxyAvailable(self._proxies if pinned is None else [pinned])
+            if lastResp is not None:
+                lastResp.close()
+            lastResp = lastError = None
+
+            tried.append(health)
+            kwargs["proxies"] = health.proxy
+            lastAttempt = pinned is not None or len(tried) >= min(self.maxAttempts, len(self._proxies))
+            start = time.monotonic()
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError, TimeoutError) as e:
+                self._report(health, time.monotonic() - start, False)
+                # a read timeout may have reached EarnApp, so only GETs are sent again after one
+                if lastAttempt or (method.upper() != "GET" and not isinstance(e, _connectErrors)):
+                    raise
+                lastError = e
+                continue
+            except Exception:
+                # other errors, such as a broken chunked body or a proxy the session cannot use, are not retried
+                self._report(health, time.monotonic() - start, False)
+                raise
+            except BaseException:
+                self._report(health, time.monotonic() - start, None)
+                raise
+
+            if _isRatelimited(resp):
+                with self._lock:
+                    health.ratelimited += 1
+                retryAfter = _parseRetryAfter(resp.headers.get("Retry-After"))
+                self._report(health, time.monotonic() - start, False, self.cooldown if retryAfter is None else retryAfter)
+                if lastAttempt:
+                    return resp
+                lastResp = resp
+                continue
+
+            self._report(health, time.monotonic() - start, True)
+            return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def stats(self) -> list:
+        """
+        :return: a list with a dictionary of the health of every proxy, healthiest first
+        """
+        with self._lock:
+            now = time.monotonic()
+            proxies = sorted(self._proxies, key=lambda health: (health.cooldownUntil > now, health.score()))
+            return [
+                {
+                    "proxy": health.proxy,
+                    "latency": health.latency,
+                    "successRate": health.successRate,
+                    "coolingDown": max(0.0, health.cooldownUntil - now),
+                    "inFlight": health.inFlight,
+                    "requests": health.requests,
+                    "failures": health.failures,
+                    "ratelimited": health.ratelimited,
+                    "cooldowns": health.cooldowns,
+                }
+                for health in proxies
+            ]
+
+    def close(self):
+        """
+        Close the session
+        """
+        self.session.close()
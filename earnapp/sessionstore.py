@@ -0,0 +1,89 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Stores for the logged in state of User objects, so a restarted process can skip logging in again
+# A store is any object with load(key) and save(key, state) functions, for example one backed by Redis
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+_safeKey = re.compile(r"^[A-Za-z0-9._-]{1,100}$")
+
+
+def accountKey(token: str) -> str:
+    """
+    Get a store key for an account that does not reveal its token
+    :param token: the oauth-refresh-token of the account
+    :return: the key
+    """
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+class FileSessionStore:
+    """
+    Stores every session in its own JSON file in a directory, readable only by the current user.
+    Saving one session never rewrites the others, so it stays fast with thousands of accounts,
+    and several processes can share the directory.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Open the store, creating the directory if it does not exist
+        :param directory: the directory to keep the sessions in
+        """
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        if not _safeKey.match(key):
+            key = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, key + ".json")
+
+    def load(self, key: str):
+        """
+        :param key: the account key
+        :return: the saved state, or None if there is none
+        """
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, key: str, state: dict):
+        """
+        Save a state, replacing the file atomically
+        :param key: the account key
+        :param state: the state from User.exportSession()
+        """
+        path = self._path(key)
+        temporary = path + "." + str(threading.get_ident()) + ".tmp"
+        with self._lock:
+            fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(temporary, path)
+
+    def delete(self, key: str):
+        """
+        Forget the state of an account
+        :param key: the account key
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,101 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Fetching several dashboard endpoints of one account at once, see User.snapshot
+
+# the endpoints of a dashboard refresh, fetched by default
+defaultEndpoints = ("userData", "money", "devices", "onlineStatus", "counters", "transactions")
+
+# endpoints that can be part of a snapshot, and whether their function takes parse
+snapshotEndpoints = {
+    "userData": False,
+    "money": True,
+    "devices": True,
+    "onlineStatus": False,
+    "counters": False,
+    "transactions": True,
+    "appVersions": False,
+    "paymentMethods": False,
+    "usage": True,
+}
+
+
+def checkEndpoints(endpoints) -> tuple:
+    """
+    :param endpoints: an iterable of endpoint names
+    :return: the names as a tuple without duplicates, raises ValueError for unknown names
+    """
+    endpoints = tuple(dict.fromkeys(endpoints))
+    for endpoint in endpoints:
+        if endpoint not in snapshotEndpoints:
+            raise ValueError("Unknown snapshot endpoint " + repr(endpoint) + ", expected one of " + ", ".join(snapshotEndpoints))
+    return endpoints
+
+
+def endpointFunction(user, endpoint: str, parse: bool):
+    """
+    :return: a function fetching the endpoint from the user, a coroutine function for an AsyncUser
+    """
+    function = getattr(user, endpoint)
+    if parse and snapshotEndpoints[endpoint]:
+        return lambda: function(parse=True)
+    return function
+
+
+class Snapshot:
+    """
+    The data of several endpoints of one account fetched at the same time.
+    An endpoint that failed does not fail the others, its exception is kept in errors.
+    """
+
+    def __init__(self, data: dict, errors: dict, elapsed: float):
+        """
+        :param data: endpoint name -> data of the endpoints that succeeded
+        :param errors: endpoint name -> exception of the endpoints that failed
+        :param elapsed: seconds the snapshot took
+        """
+        self.data = data
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        """Whether every endpoint succeeded"""
+        return not self.errors
+
+    def __getitem__(self, endpoint: str):
+        """
+        :return: the data of an endpoint, raising its exception if it failed
+        """
+        if endpoint in self.errors:
+            raise self.errors[endpoint]
+        return self.data[endpoint]
+
+    def get(self, endpoint: str, default=None):
+        """
+        :return: the data of an endpoint, or default if it failed or was not fetched
+        """
+        return self.data.get(endpoint, default)
+
+    def __contains__(self, endpoint: str):
+        return endpoint in self.data
+
+    def raiseForErrors(self):
+        """
+        Raise the exception of the first endpoint that failed, if any did
+        """
+        for error in self.errors.values():
+            raise error
+
+    def __repr__(self):
+        return "Snapshot(succeeded=" + repr(list(self.data)) + ", failed=" + repr(list(self.errors)) + ")"
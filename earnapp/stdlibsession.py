@@ -0,0 +1,359 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# A small HTTP transport that only uses the standard library, for short scripts and cron jobs that should start fast
+# Used in place of a session: User(session=createSession(transport="stdlib")) or User(transport="stdlib")
+
+import base64
+import http.client
+import json
+import select
+import threading
+from urllib.parse import urlsplit, unquote
+import zlib
+
+# errors from a kept alive connection that the server closed while it was idle, the request is sent again on a new one
+_staleConnectionErrors = (ConnectionResetError, BrokenPipeError)  # includes http.client.RemoteDisconnected
+
+# methods that are sent again after a stale connection error, like urllib3 others may have reached the server
+_idempotentMethods = frozenset(("GET", "HEAD", "OPTIONS"))
+
+
+def _isDropped(conn) -> bool:
+    """
+    :return: whether an idle connection has been closed by the server, which makes it readable
+    """
+    if conn.sock is None:
+        return True
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class _Headers(dict):
+    """Response headers looked up without regard to case, repeated headers are joined with ", " like requests does"""
+
+    def __init__(self, items):
+        super().__init__()
+        for name, value in items:
+            name = name.lower()
+            if dict.__contains__(self, name):
+                value = dict.__getitem__(self, name) + ", " + value
+            dict.__setitem__(self, name, value)
+
+    def __getitem__(self, name: str):
+        return dict.__getitem__(self, name.lower())
+
+    def __contains__(self, name: str):
+        return dict.__contains__(self, name.lower())
+
+    def get(self, name: str, default=None):
+        return dict.get(self, name.lower(), default)
+
+
+class _SentRequest:
+    """The request a response answers, like requests.PreparedRequest"""
+
+    __slots__ = ("method", "url", "body")
+
+    def __init__(self, method: str, url: str, body: bytes):
+        self.method = method
+        self.url = url
+        self.body = body
+
+
+class StdlibResponse:
+    """
+    A response from a StdlibSession, with the parts of requests.Response used by EarnApp.py:
+    status_code, headers, content, text, iter_content, request and close
+    """
+
+    def __init__(self, session, key: tuple, conn, raw, sent: _SentRequest):
+        self.status_code = raw.status
+        self.reason = raw.reason
+        self.headers = _Headers(raw.getheaders())
+        self.url = sent.url
+        self.request = sent
+        self.encoding = None
+        contentType = self.headers.get("Content-Type", "")
+        if "charset=" in contentType:
+            self.encoding = contentType.split("charset=", 1)[1].split(";", 1)[0].strip().strip('"')
+        self._content = None
+        self._content_consumed = False
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._raw = raw
+
+    def _decoder(self):
+        if self.headers.get("Content-Encoding", "").lower() in ("gzip", "x-gzip", "deflate"):
+            return zlib.decompressobj(32 + zlib.MAX_WBITS)  # detects gzip and zlib headers
+        return None
+
+    def iter_content(self, chunk_size: int = 1, decode_unicode: bool = False):
+        """
+        Yield the body in chunks as it is downloaded, decompressed
+        :param chunk_size (optional): the most bytes to read from the connection at a time
+        """
+        if self._content is not None:
+            for start in range(0, len(self._content), chunk_size):
+                yield self._content[start:start + chunk_size]
+            return
+        if self._content_consumed:
+            raise RuntimeError("The response body has already been read")
+
+        self._content_consumed = True
+        decoder = self._decoder()
+        try:
+            while True:
+                chunk = self._raw.read1(chunk_size)
+                if not chunk:
+                    break
+                if decoder is not None:
+                    chunk = decoder.decompress(chunk)
+                if chunk:
+                    yield chunk
+            if decoder is not None:
+                chunk = decoder.flush()
+                if chunk:
+                    yield chunk
+            self._raw.read()  # read1 does not mark the response finished when it stops at Content-Length
+        except BaseException:
+            self.close()
+            raise
+        self._release()
+
+    @property
+    def content(self) -> bytes:
+        """The whole body, downloaded on first use"""
+        if self._content is None:
+            self._content = b"".join(self.iter_content(65536))
+        return self._content
+
+    @property
+    def text(self) -> str:
+        """The body decoded as text"""
+        return self.content.decode(self.encoding or "utf-8", "replace")
+
+    def _release(self):
+        """Give the connection back to the session once the body has been read"""
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._raw.will_close:
+            conn.close()
+        else:
+            self._session._put(self._key, conn)
+
+    def close(self):
+        """
+        Close the connection if the body was not read to the end, otherwise it is kept for the next request
+        """
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _proxyFor(proxies: dict, scheme: str):
+    """
+    :param proxies: a proxy dictionary like the ones given to requests
+    :param scheme: http or https
+    :return: the proxy URL to use, or None
+    """
+    if not proxies:
+        return None
+    return proxies.get(scheme) or proxies.get("all")
+
+
+class StdlibSession:
+    """
+    Sends requests with http.client instead of requests, keeping connections alive between requests.
+    Importing it takes a fraction of the time requests takes, which matters for scripts that make a few calls and exit.
+    It understands the arguments EarnApp.py sends: json, cookies, headers, proxies, timeout and stream.
+    Only HTTP proxies are supported, redirects are not followed, and timeouts and connection errors raise the
+    built in TimeoutError and ConnectionError (both OSError) instead of the requests exceptions.
+    Idle connections the server has closed are not used, and if one is closed just as a request is sent, only GET, HEAD
+    and OPTIONS requests are sent again on a new connection: other requests raise, as they may have reached the server.
+    """
+
+    def __init__(self, poolSize: int = 10, keepAlive: bool = True):
+        """
+        Initialise the session
+        :param poolSize (optional): the maximum number of idle connections kept per host (and per proxy), default 10
+        :param keepAlive (optional): whether to keep connections open between requests, default True
+        """
+        self.poolSize = poolSize
+        self.keepAlive = keepAlive
+        self.headers = {"User-Agent": "earnapp.py", "Accept-Encoding": "gzip, deflate", "Accept": "*/*"}
+        if not keepAlive:
+            self.headers["Connection"] = "close"
+        self._idle = {}  # (scheme, host, port, proxy) -> idle connections, most recently used last
+        self._lock = threading.Lock()
+
+    def _get(self, key: tuple):
+        """
+        :return: an idle connection for the key that the server has not closed, or None
+        """
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None or not _isDropped(conn):
+                return conn
+            conn.close()
+
+    def _put(self, key: tuple, conn):
+        if not self.keepAlive:
+            conn.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.poolSize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _newConnection(self, scheme: str, host: str, port: int, proxy: str, proxyHeaders: dict):
+        """
+        :return: an unconnected http.client connection to the host, through the proxy if given
+        """
+        connection = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        if proxy is None:
+            return connection(host, port)
+
+        proxyParts = urlsplit(proxy)
+        if scheme == "https":  # tunnel through the proxy with CONNECT
+            conn = connection(proxyParts.hostname, proxyParts.port or 8080)
+            conn.set_tunnel(host, port, headers=proxyHeaders)
+            return conn
+        return connection(proxyParts.hostname, proxyParts.port or 8080)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        data=None,
+        headers: dict = None,
+        cookies: dict = None,
+        timeout=None,
+        proxies: dict = None,
+        stream: bool = False,
+        json=None
+    ) -> StdlibResponse:
+        """
+        Send a request, taking the arguments of requests.Session.request that EarnApp.py uses
+        :return: the response, with its body already read unless stream is set
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise ValueError("Unsupported URL scheme " + repr(parts.scheme))
+        host = parts.hostname
+        port = parts.port or (443 if scheme == "https" else 80)
+        proxy = _proxyFor(proxies, scheme)
+        proxyHeaders = _proxyHeaders(proxy)
+        key = (scheme, host, port, proxy)
+
+        if proxy is not None and scheme == "http":
+            path = url  # plain HTTP requests go to the proxy with the whole URL
+        else:
+            path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+        body = data
+        sendHeaders = {name.lower(): (name, value) for name, value in self.headers.items()}
+        if json is not None:
+            body = _dumps(json)
+            sendHeaders["content-type"] = ("Content-Type", "application/json")
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        for name, value in (headers or {}).items():
+            if value is None:
+                sendHeaders.pop(name.lower(), None)
+            else:
+                sendHeaders[name.lower()] = (name, value)
+        if cookies:
+            sendHeaders["cookie"] = ("Cookie", "; ".join(name + "=" + str(value) for name, value in cookies.items() if value is not None))
+        if proxy is not None and scheme == "http":
+            sendHeaders.update((name.lower(), (name, value)) for name, value in proxyHeaders.items())
+        requestHeaders = dict(sendHeaders.values())
+
+        if isinstance(timeout, tuple):
+            connectTimeout, readTimeout = timeout
+        else:
+            connectTimeout = readTimeout = timeout
+
+        for attempt in range(2):
+            conn = self._get(key) if attempt == 0 else None
+            reused = conn is not None
+            try:
+                if conn is None:
+                    conn = self._newConnection(scheme, host, port, proxy, proxyHeaders)
+                    conn.timeout = connectTimeout
+                    conn.connect()
+                conn.sock.settimeout(readTimeout)
+                conn.request(method, path, body=body, headers=requestHeaders)
+                raw = conn.getresponse()
+                break
+            except _staleConnectionErrors:
+                conn.close()
+                if not reused or method.upper() not in _idempotentMethods:
+                    raise
+            except BaseException:
+                if conn is not None:
+                    conn.close()
+                raise
+
+        resp = StdlibResponse(self, key, conn, raw, _SentRequest(method, url, body))
+        if not stream:
+            resp._content = b"".join(resp.iter_content(65536))  # download the body now, like requests does
+        return resp
+
+    def get(self, url: str, **kwargs) -> StdlibResponse:
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        """
+        Close the idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+def _proxyHeaders(proxy: str) -> dict:
+    """
+    :param proxy: the proxy URL, or None
+    :return: the headers that authenticate with the proxy
+    """
+    if proxy is None:
+        return {}
+    parts = urlsplit(proxy)
+    if parts.scheme != "http":
+        raise ValueError("The stdlib transport only supports http:// proxies, not " + proxy)
+    if parts.username is None:
+        return {}
+    credentials = unquote(parts.username) + ":" + unquote(parts.password or "")
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(credentials.encode()).decode()}
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,238 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+import sqlite3
+import threading
+import time
+
+from earnapp.models import iterUsagePoints
+
+# numeric fields recorded from User.money()
+moneyMetrics = ("balance", "earnings_total", "ref_bonuses", "ref_bonuses_total", "promo_bonuses", "promo_bonuses_total")
+
+# numeric fields recorded for every device from User.devices()
+deviceMetrics = ("bw", "total_bw", "redeem_bw", "rate", "earned", "earned_total")
+
+_schema = """
+CREATE TABLE IF NOT EXISTS samples (
+    account TEXT NOT NULL,
+    device TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_lookup ON samples (account, device, metric, ts);
+CREATE TABLE IF NOT EXISTS usage (
+    account TEXT NOT NULL,
+    device TEXT NOT NULL,
+    ts REAL NOT NULL,
+    bw REAL NOT NULL,
+    earned REAL NOT NULL,
+    PRIMARY KEY (account, device, ts)
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    """
+    A local SQLite store of polled account and device metrics.
+    A metric is only written when it differs from the last value stored for it, so polling data that has not
+    changed uses no disk space. Series are indexed by account, device and metric for fast range queries.
+    The account name is any string you use to tell accounts apart, for example the account email.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Open or create the store
+        :param path (optional): the SQLite database file, in memory by default
+        """
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_schema)
+        self._lock = threading.Lock()
+
+        # (account, device, metric) -> the last stored value, so unchanged values are skipped without a query
+        self._last = {}
+        rows = self._db.execute(
+            "SELECT account, device, metric, value FROM samples AS s WHERE ts = "
+            "(SELECT MAX(ts) FROM samples WHERE account = s.account AND device = s.device AND metric = s.metric)"
+        )
+        for account, device, metric, value in rows:
+            self._last[(account, device, metric)] = value
+
+    def recordValues(self, account: str, values: dict, device: str = "", timestamp: float = None) -> int:
+        """
+        Record metric values, skipping the ones that did not change
+        :param account: the account name
+        :param values: a dictionary of metric name to number
+        :param device (optional): the device uuid, empty for account metrics
+        :param timestamp (optional): the time of the values, defaults to now
+        :return: the number of values written
+        """
+        return self._recordMany(account, [(device, values)], timestamp)
+
+    def _recordMany(self, account: str, items, timestamp: float = None) -> int:
+        """
+        Record the metric values of many devices in one transaction
+        :param account: the account name
+        :param items: an iterable of (device, {metric: value}) pairs
+        :param timestamp (optional): the time of the values, defaults to now
+        :return: the number of values written
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            rows = []
+            for device, values in items:
+                for metric, value in values.items():
+                    if not isinstance(value, (int, float)) or isinstance(value, bool):
+                        continue
+                    key = (account, device, metric)
+                    if key in self._last and self._last[key] == value:
+                        continue
+                    self._last[key] = value
+                    rows.append((account, device, metric, timestamp, value))
+
+            if rows:
+                with self._db:
+                    self._db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", rows)
+            return len(rows)
+
+    def recordMoney(self, account: str, money: dict, timestamp: float = None) -> int:
+        """
+        Record a User.money() response
+        :param account: the account name
+        :param money: the decoded money response
+        :param timestamp (optional): the time it was polled, defaults to now
+        :return: the number of values written
+        """
+        values = {metric: money.get(metric) for metric in moneyMetrics}
+        return self.recordValues(account, values, timestamp=timestamp)
+
+    def recordDevices(self, account: str, devices: list, timestamp: float = None) -> int:
+        """
+        Record a User.devices() response
+        :param account: the account name
+        :param devices: the decoded devices response
+        :param timestamp (optional): the time it was polled, defaults to now
+        :return: the number of values written
+        """
+        items = (
+            (device["uuid"], {metric: device.get(metric) for metric in deviceMetrics})
+            for device in devices if "uuid" in device
+        )
+        return self._recordMany(account, items, timestamp)
+
+    def recordUsage(self, account: str, usage) -> int:
+        """
+        Record a User.usage() response.
+        Usage data points have their own timestamps, so recording overlapping responses replaces the old points.
+        :param account: the account name
+        :param usage: the decoded usage response
+        :return: the number of points written
+        """
+        rows = [(account, uuid, timestamp, bw, earned) for timestamp, uuid, bw, earned in iterUsagePoints(usage)]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def series(self, account: str, metric: str, device: str = "", start: float = None, end: float = None) -> list:
+        """
+        Get the values of a metric over a time range.
+        Only changes are stored, so the first item is the value the metric had at start.
+        :param account: the account name
+        :param metric: the metric name, for example balance or earned_total
+        :param device (optional): the device uuid, empty for account metrics
+        :param start (optional): the start of the range as a unix timestamp, from the first value by default
+        :param end (optional): the end of the range as a unix timestamp, to the last value by default
+        :return: a list of (timestamp, value) tuples
+        """
+        with self._lock:
+            points = []
+            if start is not None:
+                before = self._db.execute(
+                    "SELECT ts, value FROM samples WHERE account = ? AND device = ? AND metric = ? AND ts <= ? "
+                    "ORDER BY ts DESC LIMIT 1",
+                    (account, device, metric, start)
+                ).fetchone()
+                if before is not None:
+                    points.append((start, before[1]))
+
+            points.extend(self._db.execute(
+                "SELECT ts, value FROM samples WHERE account = ? AND device = ? AND metric = ? AND ts > ? AND ts <= ? "
+                "ORDER BY ts",
+                (account, device, metric, float("-inf") if start is None else start, float("inf") if end is None else end)
+            ))
+            return points
+
+    def valueAt(self, account: str, metric: str, timestamp: float, device: str = ""):
+        """
+        Get the value a metric had at a point in time
+        :param account: the account name
+        :param metric: the metric name
+        :param timestamp: the unix timestamp
+        :param device (optional): the device uuid, empty for account metrics
+        :return: the value, or None if nothing was recorded before then
+        """
+        points = self.series(account, metric, device, start=timestamp, end=timestamp)
+        return points[0][1] if points else None
+
+    def change(self, account: str, metric: str, start: float, end: float = None, device: str = ""):
+        """
+        Get how much a metric changed over a time range, for example the earnings of a device over 30 days:
+        store.change(account, "earned_total", time.time() - 30 * 86400, device=uuid)
+        :param account: the account name
+        :param metric: the metric name
+        :param start: the start of the range as a unix timestamp
+        :param end (optional): the end of the range, defaults to now
+        :param device (optional): the device uuid, empty for account metrics
+        :return: the difference, or None if there is no data in the range
+        """
+        points = self.series(account, metric, device, start=start, end=time.time() if end is None else end)
+        if not points:
+            return None
+        return points[-1][1] - points[0][1]
+
+    def usageRange(self, account: str, device: str, start: float = None, end: float = None) -> list:
+        """
+        Get the recorded usage of a device over a time range
+        :param account: the account name
+        :param device: the device uuid
+        :param start (optional): the start of the range as a unix timestamp
+        :param end (optional): the end of the range as a unix timestamp
+        :return: a list of (timestamp, bandwidth, earned) tuples
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT ts, bw, earned FROM usage WHERE account = ? AND device = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                (account, device, float("-inf") if start is None else start, float("inf") if end is None else end)
+            ).fetchall()
+
+    def devices(self, account: str) -> list:
+        """
+        :param account: the account name
+        :return: the uuids of every device with recorded data
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT device FROM samples WHERE account = ? AND device != '' "
+                "UNION SELECT DISTINCT device FROM usage WHERE account = ?",
+                (account, account)
+            )
+            return sorted(row[0] for row in rows)
+
+    def close(self):
+        """
+        Close the database
+        """
+        with self._lock:
+            self._db.close()
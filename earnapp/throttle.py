@@ -0,0 +1,278 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import random
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+
+
+def _parseRetryAfter(value: str):
+    """
+    Parse a Retry-After header, which is either a number of seconds or a HTTP date
+    :param value: the header value, may be None
+    :return: seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """A token bucket with a rate that can change"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "blockedUntil", "failures", "threshold")
+
+    def __init__(self, rate: float, burst: float, threshold: float = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blockedUntil = 0.0
+        self.failures = 0
+        self.threshold = threshold  # the rate grows quickly up to this, slowly above it
+
+    def delay(self, now: float) -> float:
+        """
+        Refill the bucket and get how long until a token is available
+        :param now: the current monotonic time
+        :return: seconds to wait, 0 if a token is available now
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blockedUntil:
+            return self.blockedUntil - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Throttle:
+    """
+    Limits the request rate to EarnApp and learns the rate the server allows.
+    Every (host, proxy) pair has a token bucket. Like TCP slow start, its rate is multiplied by growth after every
+    request that succeeds until the first 429, and after that only goes up by increase per success. A 429 halves the
+    rate and pauses the pair for the Retry-After time, or for an exponential backoff with jitter if the server did
+    not send one. Pauses never last longer than backoffMax. Below the starting rate the rate always grows quickly,
+    so a pair that was slowed down a lot gets back to it after a few successes, not hundreds.
+    An optional fixed limit can be set for each host across all proxies.
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: float = 5,
+        minRate: float = 0.05,
+        maxRate: float = 20.0,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        growth: float = 1.5,
+        hostRate: float = None,
+        maxRetries: int = 4,
+        backoffBase: float = 1.0,
+        backoffMax: float = 60.0
+    ):
+        """
+        Initialise the throttle
+        :param rate (optional): starting requests per second for each (host, proxy) pair
+        :param burst (optional): the number of requests that can be sent at once after being idle
+        :param minRate (optional): the lowest rate a pair can be slowed down to
+        :param maxRate (optional): the highest rate a pair can be sped up to
+        :param increase (optional): requests per second added to the rate after every successful request once the
+        pair has been ratelimited and the rate is above the starting rate
+        :param decrease (optional): the rate is multiplied by this after every 429
+        :param growth (optional): the rate is multiplied by this after every successful request until the pair is first
+        ratelimited, and whenever it is below the starting rate
+        :param hostRate (optional): a fixed limit of requests per second to each host across all proxies
+        :param maxRetries (optional): how many times a request that got a 429 is sent again before giving up
+        :param backoffBase (optional): seconds to wait after the first 429 when there is no Retry-After
+        :param backoffMax (optional): the longest time a pair is paused for, a 429 asking for a longer wait is not retried
+        """
+        self.rate = rate
+        self.burst = burst
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.increase = increase
+        self.decrease = decrease
+        self.growth = growth
+        self.hostRate = hostRate
+        self.maxRetries = maxRetries
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+
+        self._lock = threading.Lock()
+        self._buckets = {}  # (host, proxy) -> _Bucket
+        self._hostBuckets = {}  # host -> _Bucket
+
+        self.requests = 0
+        self.ratelimited = 0
+        self.retries = 0
+        self.waited = 0.0  # total seconds spent waiting for the throttle
+
+    def _getBuckets(self, host: str, proxy: str) -> list:
+        """
+        Get the buckets a request has to pass, creating them if needed.
+        Must be called with the lock held.
+        """
+        bucket = self._buckets.get((host, proxy))
+        if bucket is None:
+            bucket = self._buckets[(host, proxy)] = _Bucket(self.rate, self.burst, self.maxRate)
+        if self.hostRate is None:
+            return [bucket]
+
+        hostBucket = self._hostBuckets.get(host)
+        if hostBucket is None:
+            hostBucket = self._hostBuckets[host] = _Bucket(self.hostRate, max(1, self.hostRate))
+        return [bucket, hostBucket]
+
+    def acquire(self, host: str, proxy: str = None):
+        """
+        Block until a request to host through proxy is allowed
+        :param host: the host name the request is sent to
+        :param proxy (optional): the proxy URL the request is sent through
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                buckets = self._getBuckets(host, proxy)
+                delay = max(bucket.delay(now) for bucket in buckets)
+                if delay <= 0:
+                    for bucket in buckets:
+                        bucket.tokens -= 1
+                    self.requests += 1
+                    return
+                self.waited += delay
+            time.sleep(delay)
+
+    def success(self, host: str, proxy: str = None):
+        """
+        Record a request that was not ratelimited, speeding the pair up
+        :param host: the host name the request was sent to
+        :param proxy (optional): the proxy URL the request was sent through
+        """
+        with self._lock:
+            bucket = self._getBuckets(host, proxy)[0]
+            if bucket.rate < bucket.threshold:
+                rate = min(bucket.threshold, bucket.rate * self.growth)
+            else:
+                rate = bucket.rate + self.increase
+            bucket.rate = min(self.maxRate, rate)
+            bucket.failures = 0
+
+    def ratelimit(self, host: str, proxy: str = None, retryAfter: str = None, retrying: bool = False) -> float:
+        """
+        Record a 429 response, slowing the pair down and pausing it
+        :param host: the host name the request was sent to
+        :param proxy (optional): the proxy URL the request was sent through
+        :param retryAfter (optional): the Retry-After header of the response
+        :param retrying (optional): whether the request will be sent again
+        :return: seconds until the pair may be used again, at most backoffMax
+        """
+        delay = _parseRetryAfter(retryAfter)
+        with self._lock:
+            self.ratelimited += 1
+            if retrying:
+                self.retries += 1
+            bucket = self._getBuckets(host, proxy)[0]
+            bucket.rate = max(self.minRate, bucket.rate * self.decrease)
+            bucket.threshold = max(self.rate, bucket.rate)
+            bucket.failures += 1
+            bucket.tokens = 0
+            if delay is None:
+                backoff = min(self.backoffMax, self.backoffBase * 2 ** (bucket.failures - 1))
+                delay = random.uniform(backoff / 2, backoff)
+            delay = min(delay, self.backoffMax)
+            bucket.blockedUntil = max(bucket.blockedUntil, time.monotonic() + delay)
+            return delay
+
+    def currentRate(self, host: str, proxy: str = None) -> float:
+        """
+        :param host: the host name
+        :param proxy (optional): the proxy URL
+        :return: the learnt requests per second for the pair
+        """
+        with self._lock:
+            return self._getBuckets(host, proxy)[0].rate
+
+    def stats(self) -> dict:
+        """
+        Get the throttle counters
+        :return: a dictionary of requests, 429s, retries, time spent waiting and the learnt rates
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "ratelimited": self.ratelimited,
+                "retries": self.retries,
+                "waited": self.waited,
+                "rates": {key: bucket.rate for key, bucket in self._buckets.items()},
+            }
+
+
+def _isRatelimited(resp) -> bool:
+    """
+    Check if a response means the request was ratelimited.
+    The client API sometimes answers with a 'Too Many Requests' body instead of a 429.
+    """
+    if resp.status_code == 429:
+        return True
+    return resp.status_code >= 400 and resp.text == "Too Many Requests"
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """
+    A requests transport adapter that sends every request through a Throttle and retries 429 responses.
+    If the request is still ratelimited after maxRetries, or the Retry-After header asks for a longer wait than the
+    backoffMax of the throttle, the 429 response is returned as normal.
+    """
+
+    def __init__(self, throttle: Throttle, **kwargs):
+        """
+        Initialise the adapter
+        :param throttle: the throttle to use, can be shared between adapters
+        :param kwargs: passed on to HTTPAdapter
+        """
+        self.throttle = throttle
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        host = urlparse(request.url).hostname
+        proxy = select_proxy(request.url, kwargs.get("proxies") or {})
+
+        attempt = 0
+        while True:
+            self.throttle.acquire(host, proxy)
+            resp = super().send(request, **kwargs)
+            resp.retries = attempt  # read by earnapp.metrics
+            if not _isRatelimited(resp):
+                self.throttle.success(host, proxy)
+                return resp
+
+            retryAfter = resp.headers.get("Retry-After")
+            delay = _parseRetryAfter(retryAfter)
+            retrying = attempt < self.throttle.maxRetries and (delay is None or delay <= self.throttle.backoffMax)
+            self.throttle.ratelimit(host, proxy, retryAfter, retrying=retrying)
+            if not retrying:
+                return resp
+            attempt += 1
+            resp.close()
@@ -0,0 +1,208 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+import threading
+import time
+
+from earnapp.earnapp import getXSRFToken, createSession, _proxyKey
+from earnapp.singleflight import SingleFlight
+
+
+class _Entry:
+    """A cached XSRF token"""
+
+    __slots__ = ("proxy", "token", "fetchedAt", "lastUsed")
+
+    def __init__(self, proxy: dict, token: str, fetchedAt: float):
+        self.proxy = proxy
+        self.token = token
+        self.fetchedAt = fetchedAt
+        self.lastUsed = fetchedAt
+
+
+class XSRFTokenCache:
+    """
+    A cache of XSRF tokens, one per proxy, that can be shared between many User objects.
+    Tokens are refreshed by a background thread shortly before they expire, so requests rarely wait for /sec/rotate_xsrf.
+    If several threads need a token for the same proxy at once, only one request is made and they all share its result.
+    """
+
+    def __init__(
+        self,
+        maxAge: float = 60,
+        refreshAhead: float = 10,
+        timeout: int = 10,
+        session=None,
+        background: bool = True
+    ):
+        """
+        Initialise the cache
+        :param maxAge (optional): seconds a token may be used for, default 60 like User
+        :param refreshAhead (optional): seconds before expiry that a token is refreshed, default 10
+        :param timeout (optional): the amount of time to wait for /sec/rotate_xsrf to respond
+        :param session (optional): the session to fetch tokens with, one is created if not given
+        :param background (optional): whether to refresh tokens in a background thread, default True
+        """
+        if session is None:
+            session = createSession()
+        self.session = session
+        self.maxAge = maxAge
+        self.refreshAhead = refreshAhead
+        self.timeout = timeout
+        self.background = background
+
+        self._entries = {}  # proxy key -> _Entry
+        self._lock = threading.Lock()
+        self._singleFlight = SingleFlight()
+        self._refresher = None
+        self._stopped = threading.Event()
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refreshErrors = 0
+        self.refreshTime = 0.0  # total seconds spent fetching tokens
+        self.maxRefreshTime = 0.0
+
+    def _fetch(self, proxy: dict, key: tuple) -> _Entry:
+        """
+        Fetch a new token for a proxy and store it
+        :param proxy: a dictionary containing the proxy to use
+        :param key: the cache key of the proxy
+        :return: the new cache entry
+        """
+        start = time.perf_counter()
+        try:
+            token = getXSRFToken(self.timeout, proxy=proxy, session=self.session)
+        except Exception:
+            with self._lock:
+                self.refreshErrors += 1
+            raise
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.refreshes += 1
+            self.refreshTime += elapsed
+            self.maxRefreshTime = max(self.maxRefreshTime, elapsed)
+            entry = _Entry(proxy, token, time.time())
+            old = self._entries.get(key)
+            if old is not None:
+                entry.lastUsed = old.lastUsed
+            self._entries[key] = entry
+
+        return entry
+
+    def _fetchIfExpired(self, proxy: dict, key: tuple) -> _Entry:
+        """
+        Fetch a new token for a proxy unless another thread stored a valid one in the meantime
+        :param proxy: a dictionary containing the proxy to use
+        :param key: the cache key of the proxy
+        :return: the valid cache entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.time() - entry.fetchedAt < self.maxAge:
+            return entry
+        return self._fetch(proxy, key)
+
+    def get(self, proxy: dict = None):
+        """
+        Get a valid XSRF token for a proxy, fetching one if there is no valid cached token
+        :param proxy (optional): a dictionary containing the proxy the token will be used through
+        :return: tuple of the token and the time it was fetched
+        """
+        key = _proxyKey(proxy)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.fetchedAt < self.maxAge:
+                self.hits += 1
+                entry.lastUsed = now
+                return entry.token, entry.fetchedAt
+            self.misses += 1
+
+        entry = self._singleFlight.do(key, self._fetchIfExpired, proxy, key)
+        entry.lastUsed = time.time()
+        self._startRefresher()
+        return entry.token, entry.fetchedAt
+
+    def invalidate(self, proxy: dict = None):
+        """
+        Remove the cached token for a proxy, for example after the server rejected it
+        :param proxy (optional): a dictionary containing the proxy
+        """
+        with self._lock:
+            self._entries.pop(_proxyKey(proxy), None)
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters
+        :return: a dictionary of hits, misses, refreshes, refresh errors and refresh latency
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refreshErrors": self.refreshErrors,
+                "refreshTimeTotal": self.refreshTime,
+                "refreshTimeAverage": self.refreshTime / self.refreshes if self.refreshes else 0.0,
+                "refreshTimeMax": self.maxRefreshTime,
+                "tokens": len(self._entries),
+            }
+
+    def _startRefresher(self):
+        """
+        Start the background refresh thread if it is enabled and not running
+        """
+        if not self.background or self._refresher is not None:
+            return
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refreshLoop, name="earnapp-xsrf-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refreshLoop(self):
+        """
+        Refresh tokens that are about to expire.
+        Tokens that have not been used since they were fetched are dropped instead of refreshed.
+        """
+        while not self._stopped.is_set():
+            now = time.time()
+            due = []
+            nextDue = now + self.maxAge - self.refreshAhead
+
+            with self._lock:
+                for key, entry in list(self._entries.items()):
+                    refreshAt = entry.fetchedAt + self.maxAge - self.refreshAhead
+                    if refreshAt > now:
+                        nextDue = min(nextDue, refreshAt)
+                    elif entry.lastUsed > entry.fetchedAt:
+                        due.append((key, entry.proxy))
+                    else:  # idle, let it expire
+                        del self._entries[key]
+
+            for key, proxy in due:
+                try:
+                    self._singleFlight.do(key, self._fetch, proxy, key)
+                except Exception:
+                    pass  # counted in refreshErrors, callers will fetch again when the token expires
+
+            self._stopped.wait(max(0.1, nextDue - time.time()))
+
+    def close(self):
+        """
+        Stop the background refresh thread
+        """
+        self._stopped.set()
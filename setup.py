@@ -22,7 +22,7 @@ README = (HERE / "README.md").read_text()
 
 setup(
     name='earnapp',
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "benchmarks.*", "tests", "tests.*"]),
     version='0.1.9',
     description='A python library to interact with the EarnApp API',
     long_description=README,
@@ -31,4 +31,13 @@ setup(
     author_email="woodie@woodie.cf",
     url='https://github.com/Woodie-07/earnapp.py',
     install_requires=['requests'],
+    extras_require={
+        'async': ['aiohttp'],
+        'numpy': ['numpy'],
+        'orjson': ['orjson'],
+        'opentelemetry': ['opentelemetry-api'],
+    },
+    entry_points={
+        'console_scripts': ['earnapp=earnapp.cli:main'],
+    },
 )
@@ -0,0 +1,74 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.asyncearnapp against the stub server
+# Run with: python -m pytest tests
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from benchmarks.stubserver import StubServer
+from earnapp import asyncearnapp, models
+
+
+def test_user_works_in_several_event_loops():
+    user = asyncearnapp.AsyncUser()  # made outside any event loop
+
+    async def poll():
+        try:
+            await user.login("token")
+            user.xsrfTokenTime = 0  # both calls below need a new token, so one of them waits for the lock
+            return await asyncio.gather(user.money(), user.devices())
+        finally:
+            await user.close()
+
+    with StubServer(checkXSRF=True, devices=2):
+        for _ in range(2):
+            user.xsrfTokenTime = 0
+            money, devices = asyncio.run(poll())
+            assert money["balance"] == 12.34 and len(devices) == 2
+
+
+def test_snapshot_parse():
+    async def snapshot(parse):
+        async with asyncearnapp.AsyncUser() as user:
+            await user.login("token")
+            return await user.snapshot(["money", "devices", "transactions", "counters"], parse=parse)
+
+    with StubServer(devices=3, transactions=2):
+        parsed = asyncio.run(snapshot(True))
+        plain = asyncio.run(snapshot(False))
+    assert parsed.ok and plain.ok
+    assert isinstance(parsed.data["money"], models.MoneyInfo)
+    assert [device.uuid for device in parsed.data["devices"]] == [device["uuid"] for device in plain.data["devices"]]
+    assert all(isinstance(transaction, models.Transaction) for transaction in parsed.data["transactions"])
+    assert parsed.data["counters"] == plain.data["counters"]
+
+
+def test_snapshot_reraises_cancellation():
+    async def snapshot():
+        async with asyncearnapp.AsyncUser() as user:
+            await user.login("token")
+
+            async def cancelled():
+                raise asyncio.CancelledError()
+
+            user.devices = cancelled
+            return await user.snapshot(["money", "devices"])
+
+    with StubServer():
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(snapshot())
@@ -0,0 +1,66 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.bulk
+# Run with: python -m pytest tests
+
+import pytest
+import requests
+
+from earnapp.bulk import runBulk, _neverSent
+from earnapp.earnapp import RatelimitedException, DeadlineExceededException
+
+
+def failing(*errors):
+    """A function that raises each of errors in turn, then returns the item"""
+    errors = list(errors)
+
+    def function(item):
+        if errors:
+            raise errors.pop(0)
+        return item
+    return function
+
+
+@pytest.mark.parametrize("error", [
+    RatelimitedException("429"), ConnectionRefusedError(), TimeoutError(), DeadlineExceededException(),
+    requests.exceptions.ReadTimeout(), requests.exceptions.ConnectionError(),
+])
+def test_idempotent_retries_every_transient_error(error):
+    report = runBulk(failing(error), ["a"], retries=1, backoff=0)
+    assert report.ok and report.results[0].attempts == 2
+
+
+@pytest.mark.parametrize("error", [RatelimitedException("429"), ConnectionRefusedError(), requests.exceptions.ConnectTimeout()])
+def test_not_idempotent_retries_errors_before_sending(error):
+    report = runBulk(failing(error), ["a"], retries=1, backoff=0, idempotent=False)
+    assert report.ok and report.results[0].attempts == 2
+
+
+@pytest.mark.parametrize("error", [TimeoutError(), DeadlineExceededException(), requests.exceptions.ReadTimeout()])
+def test_not_idempotent_does_not_retry_timeouts(error):
+    report = runBulk(failing(error), ["a"], retries=3, backoff=0, idempotent=False)
+    assert not report.ok
+    assert report.results[0].attempts == 1 and report.results[0].error is error
+
+
+def test_refused_connection_is_never_sent():
+    with pytest.raises(requests.exceptions.ConnectionError) as info:
+        requests.get("http://127.0.0.1:9/", timeout=5)
+    assert _neverSent(info.value)
+
+
+def test_report_keeps_order():
+    report = runBulk(lambda item: item * 2, range(20), maxWorkers=4)
+    assert [result.data for result in report] == [item * 2 for item in range(20)]
+    assert len(report.succeeded) == 20 and not report.failed
@@ -0,0 +1,95 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.cache, on its own and revalidating responses from the stub server
+# Run with: python -m pytest tests
+
+import time
+
+from benchmarks.stubserver import StubServer
+from earnapp import earnapp
+from earnapp.cache import ResponseCache
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttls={"counters": 0.05, "downloads": 60})
+    counters = cache.key("counters", scope="account")
+    downloads = cache.key("downloads", scope="account")
+    assert downloads == cache.key("downloads", scope="another account")  # shared endpoint
+    assert cache.key("money") is None  # not cached
+
+    cache.put(counters, {"next_refresh": 1}, '"etag"')
+    cache.put(downloads, {"node": "1.0"})
+    assert cache.get(counters).fresh() and cache.get(downloads).fresh()
+    time.sleep(0.06)
+    entry = cache.get(counters)
+    assert entry.data == {"next_refresh": 1} and not entry.fresh()  # kept for revalidation
+    assert cache.get(downloads).fresh()
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+    assert cache.revalidate(counters, entry) == {"next_refresh": 1}
+    assert cache.get(counters).fresh() and cache.stats()["revalidated"] == 1
+
+
+def test_lru_eviction():
+    cache = ResponseCache(maxSize=2, ttls={"counters": 60})
+    keys = [cache.key("counters", scope=scope) for scope in ("a", "b", "c")]
+    cache.put(keys[0], 0)
+    cache.put(keys[1], 1)
+    assert cache.get(keys[0]).data == 0  # a is now the most recently used
+    cache.put(keys[2], 2)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]).data == 0 and cache.get(keys[2]).data == 2
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_user_revalidates_with_304():
+    cache = ResponseCache(ttls={"counters": 0})  # always expired, so every call asks the server
+    with StubServer() as server:
+        user = earnapp.User(cache=cache)
+        user.login("token")
+        first = user.counters()
+        requests = server.requests
+        assert user.counters() == first
+        assert server.requests == requests + 1
+        assert cache.stats()["revalidated"] == 1
+
+
+def test_client_revalidates_with_304():
+    cache = ResponseCache(ttls={"app_config.json": 0})
+    with StubServer():
+        client = earnapp.Client("sdk-node-0", "1.0", "x64", "node_earnapp.com", cache=cache)
+        assert client.appConfig() == client.appConfig()
+        assert cache.stats()["revalidated"] == 1
+
+
+def test_304_without_a_cache_entry_is_sent_again():
+    cache = ResponseCache(ttls={"counters": 60})
+    with StubServer() as server:
+        user = earnapp.User(cache=cache)
+        user.login("token")
+        first = user.counters()
+        etag = next(iter(cache._entries.values())).etag
+        assert etag
+
+        # the entry is gone, but the request still carries a validator the server matches
+        cache.clear()
+        user.headers = dict(user.headers, **{"If-None-Match": etag})
+        requests = server.requests
+        assert user.counters() == first
+        assert server.requests == requests + 2  # the 304, then the whole response
+        assert cache.get(cache.key("counters", scope="token")).data == first
+
+        # the same without a cache
+        user.cache = None
+        assert user.counters() == first
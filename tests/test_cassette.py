@@ -0,0 +1,72 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.cassette, recording from the stub server in the benchmarks
+# Run with: python -m pytest tests
+
+import gzip
+
+import pytest
+
+from benchmarks.stubserver import StubServer
+from earnapp import earnapp
+from earnapp.cassette import Cassette, ReplayMissException, scrubCookies
+
+
+def test_scrub_cookies():
+    assert scrubCookies("xsrf-token=abc; Path=/") == "xsrf-token=scrubbed; Path=/"
+    assert scrubCookies("a=1; Expires=Wed, 21 Oct 2015 07:28:00 GMT; Path=/, b=2; HttpOnly") == (
+        "a=scrubbed; Expires=Wed, 21 Oct 2015 07:28:00 GMT; Path=/, b=scrubbed; HttpOnly"
+    )
+
+
+def test_record_and_replay_without_tokens(tmp_path):
+    path = str(tmp_path / "account.json.gz")
+    with StubServer() as server:
+        with Cassette(path, mode="record") as cassette:
+            user = earnapp.User(session=cassette)
+            user.login("secret-refresh-token")
+            money = user.money()
+        sent = server.requests
+
+    with gzip.open(path, "rt") as f:
+        saved = f.read()
+    assert "stubtoken" not in saved and "secret-refresh-token" not in saved
+
+    cassette = Cassette(path, mode="replay")
+    user = earnapp.User(session=cassette)
+    user.login("secret-refresh-token")
+    assert user.money() == money
+    assert cassette.hits == sent and cassette.misses == 0
+    with pytest.raises(ReplayMissException):
+        user.devices()
+    assert cassette.misses == 1
+
+
+def test_auto_does_not_record_errors(tmp_path):
+    path = str(tmp_path / "account.json")
+    with StubServer(rateLimit=1):
+        cassette = Cassette(path)
+        assert cassette.get(earnapp.apiURL + "devices").status_code == 200  # uses up the rate limit
+        statuses = [cassette.get(earnapp.apiURL + "money").status_code for _ in range(2)]
+        assert statuses == [429, 429]  # sent again because the first 429 was not recorded
+        assert len(cassette) == 1
+        assert cassette.hits == 0 and cassette.misses == 3
+        cassette.close()
+
+    with StubServer(rateLimit=1):
+        cassette = Cassette(path, mode="record")
+        cassette.get(earnapp.apiURL + "money")
+        cassette.get(earnapp.apiURL + "money")
+        assert len(cassette) == 2  # record mode keeps the 429 too
+        cassette.close()
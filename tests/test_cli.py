@@ -0,0 +1,88 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for the earnapp command line tool, run against the stub server from the benchmarks
+# Run with: python -m pytest tests
+
+import json
+
+from benchmarks.stubserver import StubServer
+from earnapp import cli
+
+
+class _AccountLines:
+    """stdin that makes up its account lines as they are read, counting them"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.read = 0
+
+    def __iter__(self):
+        for number in range(self.count):
+            self.read += 1
+            yield "token%d\n" % number
+
+
+class _Output:
+    """stdout that checks how far reading the accounts is ahead of writing them"""
+
+    def __init__(self, accounts: _AccountLines, limit: int):
+        self.accounts = accounts
+        self.limit = limit
+        self.lines = []
+        self.maxAhead = 0
+
+    def write(self, text: str):
+        self.lines.append(text)
+        self.maxAhead = max(self.maxAhead, self.accounts.read - len(self.lines))
+        assert self.accounts.read - len(self.lines) <= self.limit
+
+    def flush(self):
+        pass
+
+
+def test_export_reads_accounts_lazily(monkeypatch):
+    concurrency = 4
+    accounts = _AccountLines(300)
+    output = _Output(accounts, concurrency * 2 + 1)  # running, waiting for their proxy, and one being read
+    monkeypatch.setattr("sys.stdin", accounts)
+    monkeypatch.setattr("sys.stdout", output)
+    with StubServer():
+        code = cli.main(["export", "-", "-e", "money", "-c", str(concurrency), "-q"])
+    assert code == 0
+    assert len(output.lines) == 300
+    records = [json.loads(line) for line in output.lines]
+    assert sorted(record["line"] for record in records) == list(range(1, 301))
+    assert all(record["ok"] and record["money"]["balance"] == 12.34 for record in records)
+
+
+def test_export_csv(tmp_path):
+    accountsFile = tmp_path / "accounts.txt"
+    accountsFile.write_text("# a comment\ntoken1\n\ntoken2 http://127.0.0.1:9\n")
+    outputFile = tmp_path / "accounts.csv"
+    with StubServer(validTokens={"token1"}):
+        code = cli.main(["export", str(accountsFile), "-o", str(outputFile), "-e", "money,devices", "-q"])
+    assert code == 1  # token2 goes through a proxy that refuses connections
+    rows = outputFile.read_text().splitlines()
+    assert rows[0] == ",".join(cli.csvColumns)
+    byLine = {row.split(",")[0]: row.split(",") for row in rows[1:]}
+    assert byLine["2"][2] == "True" and byLine["2"][4] == "12.34" and byLine["2"][6] == "10"
+    assert byLine["4"][2] == "False"
+
+
+def test_reservoir_keeps_a_fixed_sample():
+    reservoir = cli._Reservoir(100)
+    for value in range(10000):
+        reservoir.add(float(value))
+    assert len(reservoir.values) == 100
+    assert reservoir.count == 10000 and reservoir.max == 9999.0
@@ -0,0 +1,68 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.columnar, checking both backends against the loops in benchmarks.bench_columnar
+# Run with: python -m pytest tests
+
+import pytest
+
+from benchmarks import bench_columnar
+from benchmarks.stubserver import makeUsage
+from earnapp import columnar
+
+backends = [False, True] if columnar.numpy is not None else [False]
+
+
+def makeUneven(emptyStep: bool = False):
+    usage = makeUsage(5, 20)
+    # a device that appears late, a repeated date and steps out of order
+    usage["data"][7]["devices"]["late"] = {"bw": 5, "earned": 1.0}
+    usage["data"].insert(15, {"date": usage["data"][3]["date"], "devices": {"late": {"bw": 7, "earned": 0.5}}})
+    if emptyStep:  # left out of the frame, the loops count it as a step with 0 usage
+        usage["data"].append({"date": "2021-12-31T00:00:00.000Z", "devices": {}})
+    usage["data"][2:6] = reversed(usage["data"][2:6])
+    return usage
+
+
+@pytest.mark.parametrize("useNumpy", backends)
+@pytest.mark.parametrize("name", [query[0] for query in bench_columnar.queries])
+def test_queries_match_loops(name, useNumpy):
+    usage = makeUneven()
+    frame = columnar.UsageFrame.fromUsage(usage, useNumpy)
+    _, loop, onFrame = next(query for query in bench_columnar.queries if query[0] == name)
+    expected, actual = loop(usage), onFrame(frame)
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        expected, actual = sorted(expected.items()), sorted(actual.items())
+    assert [key for key, _ in actual] == [key for key, _ in expected]
+    assert [value for _, value in actual] == pytest.approx([value for _, value in expected])
+
+
+@pytest.mark.parametrize("useNumpy", backends)
+def test_frame_shape(useNumpy):
+    usage = makeUneven(emptyStep=True)
+    frame = columnar.UsageFrame.fromUsage(usage, useNumpy)
+    assert len(frame.timestamps) == 20  # the step without devices is left out, the repeated date is merged
+    assert list(frame.timestamps) == sorted(frame.timestamps)
+    assert frame.devices[-1] == "late" and len(frame.devices) == 6
+    late = frame.device("late", "bw")
+    assert late.count(0.0) == 18 and sum(late) == 12
+    assert frame.total("bw") == sum(point["bw"] for step in usage["data"] for point in step["devices"].values())
+
+
+@pytest.mark.parametrize("useNumpy", backends)
+@pytest.mark.parametrize("usage", [[], {"data": []}, [{"date": "2022-01-01T00:00:00Z", "devices": {}}]])
+def test_empty(usage, useNumpy):
+    frame = columnar.UsageFrame.fromUsage(usage, useNumpy)
+    assert frame.devices == [] and len(frame.timestamps) == 0
+    assert frame.total() == 0 and frame.perTimestamp() == [] and frame.perDevice() == {}
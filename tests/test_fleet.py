@@ -0,0 +1,172 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.fleet
+# Run with: python -m pytest tests
+
+import random
+import threading
+import time
+import weakref
+
+import pytest
+
+from benchmarks.stubserver import StubServer
+from earnapp.earnapp import IncorrectTokenException
+from earnapp.fleet import _dispatch, Fleet, ClientFleet
+from earnapp.sessionstore import FileSessionStore, accountKey
+
+
+class Target:
+    def __init__(self, number: int, proxyKey):
+        self.number = number
+        self.proxyKey = proxyKey
+
+
+def test_dispatch_reads_jobs_lazily():
+    maxConcurrency, maxQueued = 4, 4
+    alive = weakref.WeakSet()
+    pulled = []
+
+    def jobs():
+        for number in range(500):
+            target = Target(number, number % 3)
+            alive.add(target)
+            pulled.append(number)
+            # targets that have been yielded are dropped by the loop below, the rest are running or queued
+            assert len(alive) <= maxConcurrency + maxQueued + 1
+            yield target, "call"
+
+    def call(target, method):
+        time.sleep(random.uniform(0, 0.001))
+        return target.number
+
+    results = []
+    for target, method, data, error, elapsed in _dispatch(jobs(), call, maxConcurrency, 2, maxQueued=maxQueued):
+        assert error is None and data == target.number
+        results.append(data)
+        del target
+    assert sorted(results) == list(range(500))
+    assert pulled == list(range(500))
+
+
+def test_dispatch_limits():
+    lock = threading.Lock()
+    running = {}
+    peaks = {"total": 0}
+
+    def call(target, method):
+        with lock:
+            running[target.proxyKey] = running.get(target.proxyKey, 0) + 1
+            peaks[target.proxyKey] = max(peaks.get(target.proxyKey, 0), running[target.proxyKey])
+            peaks["total"] = max(peaks["total"], sum(running.values()))
+        time.sleep(0.002)
+        with lock:
+            running[target.proxyKey] -= 1
+
+    jobs = ((Target(number, number % 4), "call") for number in range(200))
+    results = list(_dispatch(jobs, call, 6, 2))
+    assert len(results) == 200
+    assert peaks["total"] <= 6
+    assert all(peaks[key] <= 2 for key in range(4))
+
+
+class FakeUser:
+    """Stands in for the User of a fleet account, counting the calls in flight through each proxy"""
+
+    def __init__(self, proxyKey, counter):
+        self.proxyKey = proxyKey
+        self.counter = counter
+
+    def money(self):
+        self.counter.enter(self.proxyKey)
+        time.sleep(0.002)
+        self.counter.leave(self.proxyKey)
+        return {"balance": 1}
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peaks = {}
+
+    def enter(self, key):
+        with self.lock:
+            self.running[key] = self.running.get(key, 0) + 1
+            self.peaks[key] = max(self.peaks.get(key, 0), self.running[key])
+
+    def leave(self, key):
+        with self.lock:
+            self.running[key] -= 1
+
+
+@pytest.mark.parametrize("limits", [(0, 4), (4, 0), (-1, 1)])
+def test_limits_below_one_are_rejected(limits):
+    maxConcurrency, maxPerProxy = limits
+    with pytest.raises(ValueError):
+        Fleet([("token", None)], maxConcurrency=maxConcurrency, maxPerProxy=maxPerProxy, session=object())
+    with pytest.raises(ValueError):
+        ClientFleet([("uuid", "1", "arm", "node")], maxConcurrency=maxConcurrency, maxPerProxy=maxPerProxy, session=object())
+    with pytest.raises(ValueError):
+        list(_dispatch([(Target(0, None), "call")], lambda target, method: None, maxConcurrency, maxPerProxy))
+
+
+def test_fleet_per_proxy_limit():
+    proxies = [{"https": "http://proxy%d:8080" % number} for number in range(3)]
+    fleet = Fleet(
+        [("token%d" % number, proxies[number % 3]) for number in range(30)],
+        methods=("money",), maxConcurrency=8, maxPerProxy=2, session=object()
+    )
+    counter = Counter()
+    for account in fleet.accounts:
+        account.user = FakeUser(account.proxyKey, counter)
+        account.loggedIn = True
+    results = list(fleet.pollOnce())
+    assert len(results) == 30 and all(result.error is None for result in results)
+    assert len(counter.peaks) == 3
+    assert all(peak <= 2 for peak in counter.peaks.values())
+
+
+def test_fleet_restores_sessions_and_logs_in_again_when_expired(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    with StubServer(validTokens={"token1", "token2"}, checkXSRF=True):
+        with Fleet([("token1", None), ("token2", None)], methods=("money",), sessionStore=store) as fleet:
+            results = list(fleet.pollOnce())
+            assert [result.method for result in results].count("login") == 2
+            assert all(result.error is None for result in results)
+
+        # a new fleet restores both logins from the store without logging in
+        with Fleet([("token1", None), ("token2", None)], methods=("money",), sessionStore=store) as fleet:
+            assert all(account.loggedIn and account.restored for account in fleet.accounts)
+            results = list(fleet.pollOnce())
+            assert [result.method for result in results] == ["money", "money"]
+            assert all(result.error is None for result in results)
+
+        # a saved XSRF token the server no longer knows fails once, then the account logs in again
+        state = store.load(accountKey("token1"))
+        state["xsrfToken"] = "expired"
+        store.save(accountKey("token1"), state)
+        with Fleet([("token1", None)], methods=("money",), sessionStore=store) as fleet:
+            results = list(fleet.pollOnce())
+            assert [(result.method, type(result.error)) for result in results] == [
+                ("money", IncorrectTokenException), ("login", type(None)), ("money", type(None))
+            ]
+            assert fleet.accounts[0].loggedIn and not fleet.accounts[0].restored
+        assert store.load(accountKey("token1"))["xsrfToken"] != "expired"
+
+        # an account whose token is not valid is not polled after its login fails
+        with Fleet([("wrong", None)], methods=("money",), sessionStore=store) as fleet:
+            results = list(fleet.pollOnce())
+            assert [result.method for result in results] == ["login"]
+            assert results[0].error is not None and not fleet.accounts[0].loggedIn
@@ -0,0 +1,126 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.hedge and reading responses before a deadline
+# Run with: python -m pytest tests
+
+from collections import deque
+import threading
+import time
+
+import pytest
+
+from benchmarks.stubserver import StubServer
+from earnapp import earnapp
+from earnapp.hedge import HedgePolicy
+
+
+class _Response:
+    def __init__(self, name: str):
+        self.name = name
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+def test_fast_request_is_not_hedged():
+    policy = HedgePolicy(delay=1.0)
+    calls = []
+    assert policy.run("key", lambda: calls.append(1) or "response") == "response"
+    assert calls == [1]
+    assert policy.stats()["hedged"] == 0
+    policy.close()
+
+
+def test_second_copy_wins_and_the_loser_is_closed():
+    policy = HedgePolicy(delay=0.02)
+    responses = []
+    lock = threading.Lock()
+
+    def send():
+        with lock:
+            first = not responses
+            resp = _Response("first" if first else "second")
+            responses.append(resp)
+        time.sleep(0.3 if first else 0.0)
+        return resp
+
+    resp = policy.run("key", send)
+    assert resp.name == "second"
+    assert responses[0].closed.wait(2)  # closed when it arrives, after losing the race
+    assert not resp.closed.is_set()
+    assert policy.stats()["hedged"] == 1 and policy.stats()["hedgeWins"] == 1
+    policy.close()
+
+
+def test_error_of_one_copy_is_ignored_if_the_other_succeeds():
+    policy = HedgePolicy(delay=0.01)
+    calls = []
+
+    def send():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.05)
+            raise ConnectionError("first copy failed")
+        return "second"
+
+    assert policy.run("key", send) == "second"
+
+    def fail():
+        time.sleep(0.02)
+        raise ConnectionError("both failed")
+
+    with pytest.raises(ConnectionError):
+        policy.run("other", fail)
+    policy.close()
+
+
+def test_delay_is_the_percentile_of_recent_latencies():
+    policy = HedgePolicy(percentile=0.9, minSamples=10, defaultDelay=5.0, minDelay=0.001, window=100)
+    assert policy.delayFor("key") == 5.0  # not enough latencies yet
+    with policy._lock:
+        policy._latencies["key"] = deque((i / 1000 for i in range(1, 101)), maxlen=100)
+        policy._counts["key"] = 100
+    assert policy.delayFor("key") == pytest.approx(0.091)
+    assert HedgePolicy(delay=0.25).delayFor("key") == 0.25
+
+
+def test_latencies_are_measured():
+    policy = HedgePolicy(minSamples=5, defaultDelay=5.0, minDelay=0.0)
+    for _ in range(5):
+        policy.run("key", lambda: time.sleep(0.01))
+    assert 0.005 < policy.delayFor("key") < 1.0
+    policy.close()
+
+
+def test_closed_policy_runs_nothing():
+    policy = HedgePolicy()
+    policy.close()
+    with pytest.raises(RuntimeError):
+        policy.run("key", lambda: "response")
+
+
+def test_deadline_response_is_read_without_requests_internals():
+    with StubServer():
+        session = earnapp.createSession()
+        deadlineAt = earnapp._deadlineAt(5)
+        resp = earnapp._makeEarnAppRequest("money", "GET", {}, 10, {}, session=session, deadline=deadlineAt)
+        assert isinstance(resp, earnapp._ReadResponse)
+        assert resp.status_code == 200 and b"balance" in resp.content and "balance" in resp.text
+        assert b"".join(resp.iter_content(7)) == resp.content
+
+        user = earnapp.User(session=session, deadline=5)
+        user.login("token")
+        assert user.money()["balance"] == 12.34
+        session.close()
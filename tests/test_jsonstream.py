@@ -0,0 +1,118 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.jsonstream, feeding documents in small chunks so that chunk boundaries fall
+# inside strings, numbers, literals and multibyte UTF-8 characters
+# Run with: python -m pytest tests
+
+import json
+
+import pytest
+
+from earnapp.earnapp import JSONDecodeErrorException
+from earnapp.jsonstream import iterArrayItems
+
+chunkSizes = (1, 2, 7)
+
+documents = {
+    "empty": "[]",
+    "empty with whitespace": " \n[ \t]\n",
+    "numbers": "[0, -1, 12345678901234567890, 3.25, -0.5e-3, 1E+10, 6.02e23]",
+    "literals": "[true, false, null, true]",
+    "strings": '["", "plain", "escaped \\"quote\\" and \\\\ backslash", "\\u00e9\\n\\t", "ends with a number 12"]',
+    "multibyte": '["café", "日本語", "\U0001f600 emoji", {"title": "üñîçødé"}]',
+    "nested": '[{"uuid": "sdk-node-1", "earned_total": 1.5, "ips": ["1.2.3.4"], "meta": {"a": [1, {"b": null}]}}, [[], {}]]',
+    "numbers as items": "[1,22,333,4444,55555]",
+}
+
+keyedDocuments = {
+    "key first": ('{"devices": [{"uuid": "a"}, {"uuid": "b"}], "total": 2}', "devices"),
+    "key after others": ('{"total": 2, "meta": {"devices": [9]}, "list": ["x"], "devices": [1.5, 25, "é"]}', "devices"),
+    "empty array": ('{"other": 1, "devices": []}', "devices"),
+}
+
+
+def chunked(data: bytes, size: int) -> list:
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", chunkSizes)
+@pytest.mark.parametrize("name", documents)
+def test_array(name, size):
+    document = documents[name]
+    assert list(iterArrayItems(chunked(document.encode(), size))) == json.loads(document)
+
+
+@pytest.mark.parametrize("size", chunkSizes)
+@pytest.mark.parametrize("name", keyedDocuments)
+def test_array_in_object(name, size):
+    document, key = keyedDocuments[name]
+    assert list(iterArrayItems(chunked(document.encode(), size), key)) == json.loads(document)[key]
+
+
+@pytest.mark.parametrize("size", chunkSizes)
+def test_every_multibyte_split(size):
+    # every character is 2, 3 or 4 bytes long, so each chunk size splits some of them
+    document = json.dumps(["éé", "€日", "\U0001f600\U0001f4b0", "aé€\U0001f600"], ensure_ascii=False)
+    for offset in range(size):
+        data = document.encode()
+        chunks = [data[:offset]] + chunked(data[offset:], size)
+        assert list(iterArrayItems(chunks)) == json.loads(document)
+
+
+def test_empty_chunks_are_skipped():
+    assert list(iterArrayItems([b"", b"[1", b"", b"", b"2, ", b"", b"3]", b""])) == [12, 3]
+
+
+@pytest.mark.parametrize("size", chunkSizes)
+def test_missing_key(size):
+    with pytest.raises(JSONDecodeErrorException):
+        list(iterArrayItems(chunked(b'{"total": 2, "list": [1, 2]}', size), "devices"))
+
+
+@pytest.mark.parametrize("document", [b"{}", b'{"devices": []}'])
+def test_object_without_key(document):
+    with pytest.raises(JSONDecodeErrorException):
+        list(iterArrayItems([document]))
+
+
+@pytest.mark.parametrize("size", chunkSizes)
+@pytest.mark.parametrize("document", [
+    b"",
+    b"[",
+    b"[1, 2",
+    b"[1, 2,",
+    b'[{"uuid": "a"}, {"uuid": "b"',
+    b'["unterminated',
+    b"[tru",
+    b'{"devices": [1, 2',
+    b'{"devices"',
+    b'{"other": [1, 2], "devi',
+])
+def test_truncated(document, size):
+    with pytest.raises(JSONDecodeErrorException):
+        list(iterArrayItems(chunked(document, size), "devices"))
+
+
+def test_truncated_yields_complete_items_first():
+    items = iterArrayItems(chunked(b'[{"uuid": "a"}, {"uuid": "b"}, {"uu', 3))
+    assert next(items) == {"uuid": "a"}
+    assert next(items) == {"uuid": "b"}
+    with pytest.raises(JSONDecodeErrorException):
+        next(items)
+
+
+@pytest.mark.parametrize("document", [b"[1 2]", b"[1,,2]", b'{"devices" [1]}', b"42"])
+def test_invalid(document):
+    with pytest.raises(JSONDecodeErrorException):
+        list(iterArrayItems([document], "devices"))
@@ -0,0 +1,49 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.models
+# Run with: python -m pytest tests
+
+from benchmarks.stubserver import makeDevices, makeTransactions
+from earnapp.models import Device, MoneyInfo, Transaction, UsageSeries, toTimestamp
+
+
+def test_models_are_hashable():
+    devices = [Device.fromJSON(device) for device in makeDevices(3)]
+    copies = [Device.fromJSON(device) for device in makeDevices(3)]
+    assert devices == copies
+    assert set(devices) == set(copies) and len(set(devices + copies)) == 3
+    assert {device: device.title for device in devices}[copies[1]] == "device 1"
+
+    renamed = Device.fromJSON(dict(makeDevices(1)[0], title="renamed"))
+    assert renamed != devices[0] and renamed not in set(devices)
+
+    transactions = {Transaction.fromJSON(transaction) for transaction in makeTransactions(2) * 2}
+    assert len(transactions) == 2
+    money = MoneyInfo.fromJSON({"balance": 1.5, "redeem_details": {"email": "user@example.com"}})
+    assert money in {MoneyInfo.fromJSON({"balance": 1.5, "redeem_details": {"email": "user@example.com"}})}
+    assert hash(Device.fromJSON({"uuid": ["not", "hashable"]})) == hash(Device.fromJSON({"uuid": ["not", "hashable"]}))
+
+
+def test_usage_series_are_sorted_by_time():
+    usage = {"data": [
+        {"date": "2022-06-03T00:00:00.000Z", "devices": {"a": {"bw": 3, "earned": 0.3}, "b": {"bw": 30, "earned": 3.0}}},
+        {"date": "2022-06-01T00:00:00.000Z", "devices": {"a": {"bw": 1, "earned": 0.1}}},
+        {"date": "2022-06-02T00:00:00.000Z", "devices": {"a": {"bw": 2, "earned": 0.2}, "b": {"bw": 20, "earned": 2.0}}},
+    ]}
+    a, b = UsageSeries.fromUsage(usage)
+    assert a.uuid == "a" and b.uuid == "b"
+    assert list(a.timestamps) == [toTimestamp("2022-06-0%dT00:00:00Z" % day) for day in (1, 2, 3)]
+    assert list(a.bw) == [1, 2, 3] and list(a.earned) == [0.1, 0.2, 0.3]
+    assert list(b.bw) == [20, 30] and list(b.earned) == [2.0, 3.0]
+    assert a.totalBW() == 6 and b.totalBW() == 50
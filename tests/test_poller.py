@@ -0,0 +1,125 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.poller with a fake user whose responses are changed between polls
+# Run with: python -m pytest tests
+
+import itertools
+
+import pytest
+
+from earnapp import poller
+from earnapp.poller import ChangePoller
+
+
+class FakeUser:
+    """Returns copies of its data, and raises the exception in fail from the method named by failing"""
+
+    def __init__(self):
+        self.deviceList = [{"uuid": "a", "title": "laptop", "earned_total": 1.0}]
+        self.statuses = {"a": {"online": True}}
+        self.balance = {"balance": 1.0, "earnings_total": 5.0}
+        self.transactionList = [{"uuid": "t1", "status": "approved"}]
+        self.failing = None
+
+    def _answer(self, name, data):
+        if self.failing == name:
+            raise ConnectionError(name)
+        return [dict(item) for item in data] if isinstance(data, list) else dict(data)
+
+    def devices(self):
+        return self._answer("devices", self.deviceList)
+
+    def onlineStatus(self):
+        return self._answer("onlineStatus", {"statuses": self.statuses})
+
+    def money(self):
+        return self._answer("money", self.balance)
+
+    def transactions(self):
+        return self._answer("transactions", self.transactionList)
+
+
+def kinds(events) -> list:
+    return sorted((event.kind, event.uuid) for event in events)
+
+
+def test_first_poll_is_a_snapshot_then_changes_are_reported():
+    user = FakeUser()
+    changes = ChangePoller(user)
+    assert changes.poll() == []
+    assert changes.poll() == []
+
+    user.deviceList = [
+        {"uuid": "a", "title": "desktop", "earned_total": 1.25},
+        {"uuid": "b", "title": "phone", "earned_total": 0.0},
+    ]
+    user.statuses = {"a": {"online": False}, "b": {"online": True}}
+    user.balance = {"balance": 1.25, "earnings_total": 5.25}
+    user.transactionList = [{"uuid": "t1", "status": "paid"}, {"uuid": "t2", "status": "pending"}]
+    events = changes.poll()
+    assert kinds(events) == sorted([
+        (poller.DEVICE_RENAMED, "a"), (poller.DEVICE_EARNINGS, "a"), (poller.DEVICE_ADDED, "b"),
+        (poller.DEVICE_OFFLINE, "a"),
+        (poller.BALANCE_CHANGED, None), (poller.EARNINGS_TOTAL_CHANGED, None),
+        (poller.TRANSACTION_STATUS, "t1"), (poller.TRANSACTION_ADDED, "t2"),
+    ])
+    earnings = next(event for event in events if event.kind == poller.DEVICE_EARNINGS)
+    assert (earnings.old, earnings.new, earnings.delta) == (1.0, 1.25, 0.25)
+    renamed = next(event for event in events if event.kind == poller.DEVICE_RENAMED)
+    assert (renamed.old, renamed.new, renamed.delta) == ("laptop", "desktop", None)
+
+    user.deviceList = user.deviceList[:1]
+    user.statuses = {"a": {"online": True}}
+    assert kinds(changes.poll()) == sorted([
+        (poller.DEVICE_REMOVED, "b"), (poller.DEVICE_ONLINE, "a"), (poller.DEVICE_OFFLINE, "b")
+    ])
+    assert changes.poll() == []
+
+
+def test_failed_poll_keeps_the_changes_for_the_next_one():
+    user = FakeUser()
+    changes = ChangePoller(user)
+    changes.poll()
+
+    user.deviceList = [{"uuid": "a", "title": "desktop", "earned_total": 1.0}]
+    user.balance = {"balance": 2.0, "earnings_total": 5.0}
+    user.failing = "money"  # devices was fetched before money failed
+    with pytest.raises(ConnectionError):
+        changes.poll()
+    assert changes.devices["a"]["title"] == "laptop"
+
+    user.failing = None
+    assert kinds(changes.poll()) == [(poller.BALANCE_CHANGED, None), (poller.DEVICE_RENAMED, "a")]
+
+
+def test_watch_reports_errors_and_carries_on():
+    user = FakeUser()
+    changes = ChangePoller(user, onlineStatus=False, transactions=False)
+    errors = []
+    polls = {"count": 0}
+    devices = user.devices
+
+    def failOnce():
+        polls["count"] += 1
+        if polls["count"] == 2:
+            user.balance = {"balance": 3.0, "earnings_total": 5.0}
+            raise ConnectionError("down")
+        return devices()
+
+    user.devices = failOnce
+    events = list(itertools.islice(changes.watch(interval=0, onError=errors.append), 1))
+    assert [event.kind for event in events] == [poller.BALANCE_CHANGED]
+    assert events[0].delta == 2.0
+    assert len(errors) == 1 and isinstance(errors[0], ConnectionError)
+    assert polls["count"] == 3
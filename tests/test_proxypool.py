@@ -0,0 +1,215 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.proxypool: health scoring, cooldowns, failover and pinning User requests to the proxy
+# their XSRF token was fetched through
+# Run with: python -m pytest tests
+
+import time
+
+import pytest
+import requests
+
+from benchmarks.stubserver import StubServer
+from earnapp import earnapp
+from earnapp.proxypool import ProxyPool, NoProxyAvailableException
+from earnapp.xsrf import XSRFTokenCache
+
+proxyA = {"https": "http://proxy-a:8080"}
+proxyB = {"https": "http://proxy-b:8080"}
+proxyC = {"https": "http://proxy-c:8080"}
+
+
+class Response:
+    def __init__(self, status: int = 200, headers: dict = None):
+        self.status_code = status
+        self.headers = headers or {}
+        self.text = ""
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Answers every request with the next outcome given for its proxy, a status code or an exception"""
+
+    def __init__(self, outcomes: dict = None):
+        self.outcomes = outcomes or {}
+        self.sent = []  # proxy URL of every request
+
+    def request(self, method, url, proxies=None, **kwargs):
+        proxy = proxies["https"]
+        self.sent.append(proxy)
+        outcome = self.outcomes.get(proxy, [200])
+        outcome = outcome.pop(0) if len(outcome) > 1 else outcome[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, tuple):
+            return Response(*outcome)
+        return Response(outcome)
+
+    def close(self):
+        pass
+
+
+def health(pool, proxy):
+    return next(health for health in pool._proxies if health.proxy == proxy)
+
+
+def test_choose_prefers_low_latency_per_success():
+    pool = ProxyPool([proxyA, proxyB], session=FakeSession(), maxFailures=10)
+    pool._report(pool._choose([]), 0.1, True)
+    pool._report(pool._choose([]), 0.5, True)
+    assert health(pool, proxyA).latency == 0.1 and health(pool, proxyB).latency == 0.5
+
+    chosen = [pool._choose([]) for _ in range(5)]
+    # A is five times faster, so it takes requests until the ones in flight make it as costly as B
+    assert [h.proxy for h in chosen] == [proxyA] * 4 + [proxyB]
+    assert health(pool, proxyA).inFlight == 4
+    for h in chosen:
+        pool._report(h, 0.0, None)  # interrupted, says nothing about the proxy
+    assert health(pool, proxyA).inFlight == 0 and health(pool, proxyA).latency == 0.1
+
+    # failures lower the success rate until the slower proxy is the better deal
+    for _ in range(8):
+        pool._report(pool._choose([health(pool, proxyB)]), 0.1, False)
+    assert health(pool, proxyA).successRate < 0.2 and not health(pool, proxyA).cooldownUntil
+    assert pool._choose([]).proxy == proxyB
+
+
+def test_consecutive_failures_cool_a_proxy_down():
+    pool = ProxyPool([proxyA, proxyB], session=FakeSession(), maxFailures=2, cooldown=30)
+    a = health(pool, proxyA)
+    for _ in range(2):
+        pool._choose([health(pool, proxyB)])
+        pool._report(a, 0.1, False)
+    assert a.cooldowns == 1 and a.cooldownUntil > time.monotonic() + 29
+    assert {pool._choose([]).proxy["https"] for _ in range(3)} == {proxyB["https"]}
+
+    # after the cooldown the proxy gets a trial with its record partly forgiven
+    a.cooldownUntil = time.monotonic() - 1
+    b = health(pool, proxyB)
+    b.latency, b.inFlight = 10.0, 0
+    assert pool._choose([]) is a
+    assert a.cooldownUntil == 0.0 and a.consecutiveFailures == 0 and a.successRate >= 0.5
+
+
+def test_ratelimited_proxy_cools_down_for_retry_after():
+    session = FakeSession({proxyA["https"]: [(429, {"Retry-After": "20"}), 200]})
+    pool = ProxyPool([proxyA, proxyB], session=session)
+    assert pool.get("https://earnapp.com/").status_code == 200
+    assert session.sent == [proxyA["https"], proxyB["https"]]
+    a = health(pool, proxyA)
+    assert a.ratelimited == 1 and 19 < a.cooldownUntil - time.monotonic() <= 20
+    assert pool.get("https://earnapp.com/").status_code == 200
+    assert session.sent[-1] == proxyB["https"]
+
+
+def test_no_proxy_available():
+    pool = ProxyPool([proxyA, proxyB], session=FakeSession())
+    for _ in range(2):
+        pool._report(pool._choose([]), 0.1, False, 30)
+    with pytest.raises(NoProxyAvailableException) as info:
+        pool.get("https://earnapp.com/")
+    assert 29 < info.value.retryAfter <= 30
+    assert isinstance(info.value, requests.exceptions.ConnectionError)
+    with pytest.raises(NoProxyAvailableException):
+        pool.pick()
+
+    # a request pinned to one proxy is not sent through another one when its proxy is cooling down
+    pool = ProxyPool([proxyA, proxyB], session=FakeSession())
+    pool._report(pool._choose([health(pool, proxyB)]), 0.1, False, 30)
+    with pytest.raises(NoProxyAvailableException):
+        pool.get("https://earnapp.com/", proxies=proxyA)
+    assert pool.get("https://earnapp.com/").status_code == 200
+
+
+def test_pinned_request_is_not_failed_over():
+    session = FakeSession({proxyA["https"]: [200, requests.exceptions.ProxyError("down")]})
+    pool = ProxyPool([proxyA, proxyB, proxyC], session=session)
+    assert pool.get("https://earnapp.com/", proxies=pool.pick(proxyA)).status_code == 200
+    assert pool.pick(proxyA) == proxyA  # preferred while it works, although B and C have not been tried
+    with pytest.raises(requests.exceptions.ProxyError):
+        pool.get("https://earnapp.com/", proxies=pool.pick(proxyA))
+    assert session.sent == [proxyA["https"]] * 2
+    # the proxy that failed is no longer preferred
+    assert pool.pick(proxyA) != proxyA
+
+
+def test_other_errors_are_counted_and_not_retried():
+    session = FakeSession({
+        proxyA["https"]: [requests.exceptions.ChunkedEncodingError("broken")],
+        proxyB["https"]: [ValueError("unsupported proxy")],
+    })
+    pool = ProxyPool([proxyA, proxyB], session=session)
+    for _ in range(3):
+        with pytest.raises((requests.exceptions.ChunkedEncodingError, ValueError)):
+            pool.get("https://earnapp.com/")
+    assert len(session.sent) == 3
+    assert all(h.inFlight == 0 for h in pool._proxies)
+    assert sum(h.failures for h in pool._proxies) == 3
+
+
+class RoutingSession:
+    """Sends every request straight to the stub server, recording the proxy it was meant to go through"""
+
+    def __init__(self):
+        self.session = earnapp.createSession()
+        self.failing = set()
+        self.tokens = {}  # XSRF token -> proxy URL it was fetched through
+        self.sent = []  # (proxy URL, XSRF token) of every dashboard request
+
+    def request(self, method, url, proxies=None, **kwargs):
+        proxy = proxies["https"]
+        if proxy in self.failing:
+            raise requests.exceptions.ProxyError("down")
+        resp = self.session.request(method, url, **kwargs)
+        if "rotate_xsrf" in url:
+            self.tokens[resp.cookies["xsrf-token"]] = proxy
+        else:
+            self.sent.append((proxy, kwargs["headers"]["xsrf-token"]))
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+@pytest.mark.parametrize("shareTokens", [False, True])
+def test_user_sends_token_through_the_proxy_it_was_fetched_through(shareTokens):
+    with StubServer(checkXSRF=True):
+        routing = RoutingSession()
+        pool = ProxyPool([proxyA, proxyB, proxyC], session=routing)
+        xsrfCache = XSRFTokenCache(session=pool, background=False) if shareTokens else None
+        user = earnapp.User(session=pool, xsrfCache=xsrfCache)
+        assert user.login("token")
+        user.money()
+        first = routing.sent[-1][0]
+
+        # with its own token the user sticks to one proxy and moves on after one failure,
+        # with a shared cache every call goes to the best proxy that has a token or can fetch one
+        routing.failing.add(first)
+        errors = 0
+        for _ in range(5):
+            try:
+                user.money()
+            except requests.exceptions.ProxyError:
+                errors += 1
+        assert errors == 1 if not shareTokens else errors <= 3
+        assert routing.sent[-1][0] != first
+
+        assert all(routing.tokens[token] == proxy for proxy, token in routing.sent)
+        pool.close()
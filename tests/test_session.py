@@ -0,0 +1,73 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for the sessions owned by User, Client, Fleet and ClientFleet
+# Run with: python -m pytest tests
+
+from earnapp import earnapp
+from earnapp.fleet import Fleet, ClientFleet
+
+
+class _Session:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+def test_user_closes_only_its_own_session(monkeypatch):
+    created = []
+
+    def createSession(*args):
+        created.append(_Session())
+        return created[-1]
+
+    monkeypatch.setattr(earnapp, "createSession", createSession)
+    with earnapp.User() as user:
+        assert user.session is created[0]
+    assert created[0].closed == 1
+    user.close()
+    assert created[0].closed == 1  # closing twice does nothing
+
+    shared = _Session()
+    with earnapp.User(session=shared), earnapp.Client("uuid", "1", "arm", "node", session=shared):
+        pass
+    assert shared.closed == 0
+
+    client = earnapp.Client("uuid", "1", "arm", "node")
+    client.close()  # no session was created, nothing to close
+    assert len(created) == 1
+    client.session = shared
+    client.close()
+    assert shared.closed == 0
+
+
+def test_fleets_close_only_their_own_session(monkeypatch):
+    created = []
+
+    def createSession(*args, **kwargs):
+        created.append(_Session())
+        return created[-1]
+
+    monkeypatch.setattr("earnapp.fleet.createSession", createSession)
+    with Fleet([("token", None)]) as fleet:
+        assert fleet.accounts[0].user.session is created[0]
+    with ClientFleet([("uuid", "1", "arm", "node")]):
+        pass
+    assert [session.closed for session in created] == [1, 1]
+
+    shared = _Session()
+    with Fleet([("token", None)], session=shared), ClientFleet([("uuid", "1", "arm", "node")], session=shared):
+        pass
+    assert shared.closed == 0
@@ -0,0 +1,110 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.singleflight with many threads asking for the same key
+# Run with: python -m pytest tests
+
+import threading
+import time
+
+from earnapp.singleflight import SingleFlight
+
+THREADS = 16
+
+
+class BlockingCall:
+    """A function that blocks until released, counting how often it was called"""
+
+    def __init__(self, result=None, error: Exception = None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run(singleFlight, key, function) -> list:
+    """
+    Call singleFlight.do from many threads while the first call is blocked
+    :return: what every thread got, its result or its exception
+    """
+    outcomes = [None] * THREADS
+
+    def worker(i):
+        try:
+            outcomes[i] = singleFlight.do(key, function)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=worker, args=(0,))]
+    threads[0].start()
+    assert function.entered.wait(5)
+    for i in range(1, THREADS):
+        threads.append(threading.Thread(target=worker, args=(i,)))
+        threads[-1].start()
+    time.sleep(0.05)  # let the other threads reach the wait
+    assert singleFlight.inFlight() == 1
+    function.release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def test_concurrent_callers_share_one_call():
+    singleFlight = SingleFlight()
+    result = {"balance": 1.5}
+    function = BlockingCall(result)
+    outcomes = run(singleFlight, "money", function)
+    assert function.calls == 1
+    assert all(outcome is result for outcome in outcomes)
+    assert singleFlight.inFlight() == 0
+
+    # the call is over, so the next caller makes a new one
+    again = BlockingCall({"balance": 2.0})
+    again.release.set()
+    assert singleFlight.do("money", again) == {"balance": 2.0} and again.calls == 1
+
+
+def test_exception_reaches_every_waiter():
+    singleFlight = SingleFlight()
+    error = ValueError("ratelimited")
+    function = BlockingCall(error=error)
+    outcomes = run(singleFlight, "money", function)
+    assert function.calls == 1
+    assert all(outcome is error for outcome in outcomes)
+    assert singleFlight.inFlight() == 0
+
+    retry = BlockingCall("ok")
+    retry.release.set()
+    assert singleFlight.do("money", retry) == "ok"
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    singleFlight = SingleFlight()
+    slow = BlockingCall("slow")
+    thread = threading.Thread(target=singleFlight.do, args=("devices", slow))
+    thread.start()
+    assert slow.entered.wait(5)
+    assert singleFlight.do("money", lambda: "fast") == "fast"
+    assert singleFlight.inFlight() == 1
+    slow.release.set()
+    thread.join(5)
+    assert singleFlight.inFlight() == 0
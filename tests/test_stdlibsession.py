@@ -0,0 +1,193 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.stdlibsession against a small local HTTP server
+# Run with: python -m pytest tests
+
+import base64
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+import pytest
+
+from earnapp.stdlibsession import StdlibSession
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.requests = 0  # requests on this connection
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _send(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond(self):
+        self.requests += 1
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        path = self.path.split("?")[0]
+
+        if path.endswith("/drop-second") and self.requests >= 2:
+            self.close_connection = True  # hang up without answering, like a server closing an idle connection
+            return
+        if path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for part in (b'{"items": [', b"1, 2, ", b"3]}"):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if path == "/gzip":
+            self._send(200, gzip.compress(b'{"compressed": true}'), {"Content-Encoding": "gzip"})
+            return
+        if path == "/close-after":
+            self.close_connection = True  # close the connection once idle, without telling the client
+            self._send(200, b"{}")
+            return
+        if path == "/set-cookie":
+            self._send(200, b"{}", {"Set-Cookie": "xsrf-token=abc; Path=/"})
+            return
+
+        echo = {
+            "method": self.command,
+            "path": self.path,
+            "cookie": self.headers.get("Cookie"),
+            "proxyAuthorization": self.headers.get("Proxy-Authorization"),
+            "contentType": self.headers.get("Content-Type"),
+            "body": body.decode(),
+            "connection": id(self),
+        }
+        self._send(200, json.dumps(echo).encode(), {"Content-Type": "application/json; charset=utf-8"})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+    def do_CONNECT(self):
+        self.server.tunnels.append((self.path, self.headers.get("Proxy-Authorization")))
+        self._send(407, b"", {"Proxy-Authenticate": "Basic"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.connections = 0
+    httpd.tunnels = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = "http://127.0.0.1:%d" % httpd.server_address[1]
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_get_and_keep_alive(server):
+    session = StdlibSession()
+    first = json.loads(session.get(server.url + "/echo?a=1").content)
+    second = json.loads(session.get(server.url + "/echo").content)
+    assert first["method"] == "GET" and first["path"] == "/echo?a=1"
+    assert first["connection"] == second["connection"]  # the connection was kept alive and reused
+    assert server.connections == 1
+    session.close()
+
+
+def test_post_json_and_cookies(server):
+    session = StdlibSession()
+    resp = session.request("POST", server.url + "/echo", json={"id": "sdk-node-1"}, cookies={"auth": "x", "unset": None})
+    echo = json.loads(resp.text)
+    assert resp.status_code == 200 and resp.encoding == "utf-8"
+    assert echo["method"] == "POST" and json.loads(echo["body"]) == {"id": "sdk-node-1"}
+    assert echo["contentType"] == "application/json"
+    assert echo["cookie"] == "auth=x"
+
+    session.get(server.url + "/set-cookie")
+    echo = json.loads(session.get(server.url + "/echo").content)
+    assert echo["cookie"] is None  # cookies set by the server are not kept
+    session.close()
+
+
+def test_chunked_and_gzip_bodies(server):
+    session = StdlibSession()
+    assert json.loads(session.get(server.url + "/chunked").content) == {"items": [1, 2, 3]}
+    resp = session.get(server.url + "/chunked", stream=True)
+    assert b"".join(resp.iter_content(2)) == b'{"items": [1, 2, 3]}'
+    assert json.loads(session.get(server.url + "/gzip").content) == {"compressed": True}
+    session.get(server.url + "/echo")
+    assert server.connections == 1  # chunked and streamed bodies read to the end leave the connection reusable
+    session.close()
+
+
+def test_stale_connection_is_retried_for_get(server):
+    session = StdlibSession()
+    assert session.get(server.url + "/drop-second").status_code == 200
+    assert session.get(server.url + "/drop-second").status_code == 200  # sent again on a new connection
+    assert server.connections == 2
+    session.close()
+
+
+def test_stale_connection_is_not_retried_for_post(server):
+    session = StdlibSession()
+    assert session.request("POST", server.url + "/drop-second").status_code == 200
+    with pytest.raises(ConnectionError):
+        session.request("POST", server.url + "/drop-second")
+    assert server.connections == 1
+    session.close()
+
+
+def test_closed_idle_connection_is_not_used(server):
+    session = StdlibSession()
+    session.get(server.url + "/close-after")
+    time.sleep(0.05)  # let the server close its end
+    # without the check, the POST would be sent on the closed connection and raise
+    assert session.request("POST", server.url + "/echo").status_code == 200
+    assert server.connections == 2
+    session.close()
+
+
+def test_http_proxy(server):
+    session = StdlibSession()
+    proxy = server.url.replace("http://", "http://user:p%40ss@")
+    echo = json.loads(session.get("http://example.invalid/echo", proxies={"http": proxy}).content)
+    assert echo["path"] == "http://example.invalid/echo"  # the whole URL is sent to the proxy
+    assert echo["proxyAuthorization"] == "Basic " + base64.b64encode(b"user:p@ss").decode()
+    session.close()
+
+
+def test_https_proxy_uses_connect(server):
+    session = StdlibSession()
+    proxy = server.url.replace("http://", "http://user:pass@")
+    with pytest.raises(OSError, match="407"):
+        session.get("https://example.invalid/echo", proxies={"https": proxy})
+    assert server.tunnels == [("example.invalid:443", "Basic " + base64.b64encode(b"user:pass").decode())]
+    session.close()
+
+
+def test_socks_proxy_is_rejected():
+    with pytest.raises(ValueError):
+        StdlibSession().get("http://example.invalid/", proxies={"http": "socks5://127.0.0.1:1080"})
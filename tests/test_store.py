@@ -0,0 +1,74 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.store: skipping unchanged values, reloading them from disk and replacing overlapping usage
+# Run with: python -m pytest tests
+
+from earnapp.store import HistoryStore
+
+money = {"balance": 1.5, "earnings_total": 10.0, "ref_bonuses": 0, "ref_bonuses_total": 0,
+         "promo_bonuses": 0, "promo_bonuses_total": 0, "redeem_details": None}
+
+
+def usage(days: dict) -> list:
+    """A usage response with one step per day timestamp, for the device a"""
+    return [{"date": day, "devices": {"a": {"bw": bw, "earned": earned}}} for day, (bw, earned) in days.items()]
+
+
+def test_unchanged_values_are_skipped():
+    store = HistoryStore()
+    assert store.recordMoney("account", money, timestamp=100) == 6  # redeem_details is not a number
+    assert store.recordMoney("account", money, timestamp=200) == 0
+    assert store.recordMoney("account", dict(money, balance=2.0), timestamp=300) == 1
+
+    devices = [{"uuid": "a", "earned_total": 1.0, "bw": 5}, {"uuid": "b", "earned_total": 2.0, "bw": 5}]
+    assert store.recordDevices("account", devices, timestamp=100) == 4
+    devices[1] = dict(devices[1], earned_total=2.5)
+    assert store.recordDevices("account", devices, timestamp=200) == 1
+    # the same values for another account are not skipped
+    assert store.recordDevices("other", devices, timestamp=200) == 4
+
+    assert store.series("account", "balance") == [(100, 1.5), (300, 2.0)]
+    assert store.series("account", "balance", start=150, end=250) == [(150, 1.5)]
+    assert store.valueAt("account", "balance", 250) == 1.5 and store.valueAt("account", "balance", 50) is None
+    assert store.change("account", "earned_total", 50, 250, device="b") == 0.5
+    assert store.devices("account") == ["a", "b"]
+    store.close()
+
+
+def test_reopened_store_remembers_the_last_values(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    store.recordMoney("account", money, timestamp=100)
+    store.recordMoney("account", dict(money, balance=2.0), timestamp=200)
+    store.close()
+
+    store = HistoryStore(path)
+    assert store._last[("account", "", "balance")] == 2.0  # the latest value, not the first one
+    assert store.recordMoney("account", dict(money, balance=2.0), timestamp=300) == 0
+    assert store.recordMoney("account", money, timestamp=400) == 1
+    assert store.series("account", "balance") == [(100, 1.5), (200, 2.0), (400, 1.5)]
+    store.close()
+
+
+def test_overlapping_usage_replaces_points():
+    store = HistoryStore()
+    assert store.recordUsage("account", usage({86400: (10, 0.1), 2 * 86400: (20, 0.2), 3 * 86400: (5, 0.05)})) == 3
+    # the last day was still being counted, and is now complete
+    assert store.recordUsage("account", usage({3 * 86400: (30, 0.3), 4 * 86400: (40, 0.4)})) == 2
+    assert store.usageRange("account", "a") == [
+        (86400, 10, 0.1), (2 * 86400, 20, 0.2), (3 * 86400, 30, 0.3), (4 * 86400, 40, 0.4)
+    ]
+    assert store.usageRange("account", "a", start=2 * 86400, end=3 * 86400) == [(2 * 86400, 20, 0.2), (3 * 86400, 30, 0.3)]
+    assert store.devices("account") == ["a"]
+    store.close()
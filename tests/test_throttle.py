@@ -0,0 +1,118 @@
+"""
+EarnApp.py - A Python library to interact with the EarnApp API
+Copyright (C) 2022  Woodie
+
+This file is part of EarnApp.py.
+
+EarnApp.py is free software: you can redistribute it and/or modify it under the terms of the GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+
+EarnApp.py is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with EarnApp.py. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Tests for earnapp.throttle and the statuses User.login raises for
+# Run with: python -m pytest tests
+
+from email.utils import formatdate
+import time
+
+import pytest
+
+from benchmarks.stubserver import StubServer
+from earnapp import earnapp
+from earnapp.throttle import Throttle, _parseRetryAfter
+
+
+def test_parse_retry_after():
+    assert _parseRetryAfter(None) is None
+    assert _parseRetryAfter("") is None
+    assert _parseRetryAfter("soon") is None
+    assert _parseRetryAfter("120") == 120.0
+    assert _parseRetryAfter("1.5") == 1.5
+    assert _parseRetryAfter("-3") == 0.0
+    assert 25 <= _parseRetryAfter(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert _parseRetryAfter(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_ratelimit_is_capped_at_backoff_max():
+    throttle = Throttle(backoffMax=5)
+    assert throttle.ratelimit("host", retryAfter="3600") == 5
+    assert throttle.ratelimit("host", retryAfter="2") == 2
+    for _ in range(10):  # exponential backoff without a Retry-After
+        assert throttle.ratelimit("other") <= 5
+    assert throttle.stats()["ratelimited"] == 12
+
+
+def test_rate_grows_quickly_and_recovers_after_429s():
+    throttle = Throttle(rate=2, minRate=0.05, maxRate=20, increase=0.05, growth=1.5)
+    for _ in range(6):
+        throttle.success("host")
+    assert throttle.currentRate("host") == 20  # slow start until the first 429
+
+    for _ in range(10):
+        throttle.ratelimit("host", retryAfter="0")
+    assert throttle.currentRate("host") == 0.05
+    for _ in range(10):
+        throttle.success("host")
+    assert throttle.currentRate("host") == 2  # back at the starting rate after a few successes
+    throttle.success("host")
+    assert throttle.currentRate("host") == pytest.approx(2.05)  # then additive
+
+
+def test_adapter_retries_and_counts():
+    with StubServer(rateLimit=2):
+        throttle = Throttle(rate=100, burst=100, backoffBase=0.05, backoffMax=1.5)
+        session = earnapp.createSession(throttle=throttle)
+        resp = None
+        for _ in range(3):
+            resp = session.get(earnapp.apiURL + "money")
+        assert resp.status_code == 200
+        assert resp.retries == 1  # the third request got a 429, waited for Retry-After: 1 and was sent again
+        assert throttle.stats()["retries"] == 1
+
+        throttle.backoffMax = 0.5  # Retry-After: 1 is now too long to wait for
+        statuses = []
+        for _ in range(3):
+            resp = session.get(earnapp.apiURL + "money")
+            statuses.append(resp.status_code)
+            assert resp.retries == 0
+        assert 429 in statuses and throttle.stats()["retries"] == 1
+        session.close()
+
+
+class _Response:
+    def __init__(self, status: int, headers: dict = None, body: bytes = b"{}"):
+        self.status_code = status
+        self.headers = headers or {}
+        self.content = body
+        self.text = body.decode()
+
+
+class _LoginSession:
+    """Answers rotate_xsrf with a token and user_data with the given status"""
+
+    def __init__(self, status: int):
+        self.status = status
+
+    def request(self, method, url, **kwargs):
+        return _Response(self.status)
+
+    def get(self, url, **kwargs):
+        return _Response(200, {"Set-Cookie": "xsrf-token=token; Path=/"})
+
+
+@pytest.mark.parametrize("status, exception", [
+    (429, earnapp.RatelimitedException),
+    (403, earnapp.IncorrectTokenException),
+    (500, earnapp.LoginFailedException),
+    (502, earnapp.LoginFailedException),
+])
+def test_login_errors(status, exception):
+    user = earnapp.User(session=_LoginSession(status))
+    with pytest.raises(exception):
+        user.login("token")
+
+
+def test_login():
+    assert earnapp.User(session=_LoginSession(200)).login("token") is True